@@ -48,17 +48,31 @@ def generate_heights(w, hmin, hmax):
         heights = [h for h in heights if (h / w) <= hw_max]
     return heights
 
-# --- Ensure output root exists ---
-if not os.path.exists(output_root):
-    os.makedirs(output_root)
-
-# --- Loop through all JSON files ---
-all_files = [f for f in os.listdir(input_folder) if f.endswith(".json")]
-total_generated = 0
-
-for file in all_files:
-    input_path = os.path.join(input_folder, file)
+def height_combinations(width):
+    hmin, hmax = height_ranges[width]
+    height_vals = generate_heights(width, hmin, hmax)
 
+    # All (min, max) height combinations
+    combinations = []
+    for i in range(len(height_vals)):
+        for j in range(i, len(height_vals)):
+            combinations.append((height_vals[i], height_vals[j]))
+    return combinations
+
+def write_if_changed(path, data):
+    # Leave identical files untouched so their mtime does not invalidate later stages
+    text = json.dumps(data, indent=2)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            if f.read() == text:
+                return False
+    with open(path, "w") as out_file:
+        out_file.write(text)
+    return True
+
+def generate_file(input_path, output_root):
+    """Write one street_geo.json per height combination; returns the folders."""
+    file = os.path.basename(input_path)
     with open(input_path, "r") as f:
         base_data = json.load(f)
 
@@ -68,24 +82,17 @@ for file in all_files:
         buildings = base_data["buildings"]
     except KeyError:
         print(f"⚠️ Skipping {file}: missing required fields.")
-        continue
+        return []
 
     if width not in height_ranges:
         print(f"⚠️ Skipping {file}: width {width} not in height_ranges.")
-        continue
-
-    hmin, hmax = height_ranges[width]
-    height_vals = generate_heights(width, hmin, hmax)
-
-    # All (min, max) height combinations
-    height_combinations = []
-    for i in range(len(height_vals)):
-        for j in range(i, len(height_vals)):
-            height_combinations.append((height_vals[i], height_vals[j]))
+        return []
 
     # Process each height combination
-    for min_h, max_h in height_combinations:
+    folders = []
+    for min_h, max_h in height_combinations(width):
         new_data = base_data.copy()
+        new_data["street_attributes"] = dict(base_data["street_attributes"])
         new_data["buildings"] = []
 
         for i, b in enumerate(buildings):
@@ -103,14 +110,25 @@ for file in all_files:
         # Create output subfolder
         folder_name = f"width{width}_deg{rotation:03d}_h{min_h}to{max_h}"
         out_dir = os.path.join(output_root, folder_name)
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
 
         # Save JSON as street_geo.json
-        out_path = os.path.join(out_dir, "street_geo.json")
-        with open(out_path, "w") as out_file:
-            json.dump(new_data, out_file, indent=2)
+        write_if_changed(os.path.join(out_dir, "street_geo.json"), new_data)
+        folders.append(out_dir)
+
+    return folders
+
+def main(input_folder=input_folder, output_root=output_root):
+    # --- Ensure output root exists ---
+    os.makedirs(output_root, exist_ok=True)
+
+    # --- Loop through all JSON files ---
+    all_files = [f for f in os.listdir(input_folder) if f.endswith(".json")]
+    total_generated = 0
+    for file in all_files:
+        total_generated += len(generate_file(os.path.join(input_folder, file), output_root))
 
-        total_generated += 1
+    print(f"✅ Done. {total_generated} JSON files created in '{output_root}'.")
 
-print(f"✅ Done. {total_generated} JSON files created in '{output_root}'.")
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,10 @@ import matplotlib.pyplot as plt
 import fiona
 from fiona.crs import from_epsg
 
-# --- Optional: Set GDAL_DATA for projection definitions ---
+# --- Optional: Set GDAL_DATA for projection definitions (Windows QGIS install) ---
 QGIS_PATH = r"C:\Program Files\QGIS 3.34.12"
-os.environ['GDAL_DATA'] = os.path.join(QGIS_PATH, 'share', 'gdal')
+if os.name == "nt" and os.path.isdir(QGIS_PATH):
+    os.environ['GDAL_DATA'] = os.path.join(QGIS_PATH, 'share', 'gdal')
 
 # --- CONFIG ---
 input_root = "C:/Users/Ardo/Desktop/thesis/processed"
@@ -19,16 +20,15 @@ utm_x_origin = 430000
 utm_y_origin = 4580000
 CRS = "EPSG:25831"
 
-# --- MAIN LOOP ---
-for subfolder in os.listdir(input_root):
-    folder_path = os.path.join(input_root, subfolder)
+# --- PER FOLDER ---
+def process_folder(folder_path, utm_x_origin=utm_x_origin, utm_y_origin=utm_y_origin, crs=CRS):
+    subfolder = os.path.basename(os.path.normpath(folder_path))
     json_path = os.path.join(folder_path, "street_geo.json")
+    if not os.path.isdir(folder_path) or not os.path.exists(json_path):
+        return
     geojson_folder = os.path.join(folder_path, "geojson_export")
     os.makedirs(geojson_folder, exist_ok=True)
 
-    if not os.path.isdir(folder_path) or not os.path.exists(json_path):
-        continue
-
     print(f"\n📂 Processing: {subfolder}")
 
     with open(json_path, "r") as f:
@@ -84,13 +84,13 @@ for subfolder in os.listdir(input_root):
 
     with rasterio.open(
         dsm_path, "w", driver="GTiff", height=rows, width=cols,
-        count=1, dtype=dsm.dtype, crs=CRS, transform=world_transform
+        count=1, dtype=dsm.dtype, crs=crs, transform=world_transform
     ) as dst:
         dst.write(dsm, 1)
 
     with rasterio.open(
         dem_path, "w", driver="GTiff", height=rows, width=cols,
-        count=1, dtype=np.float32, crs=CRS, transform=world_transform
+        count=1, dtype=np.float32, crs=crs, transform=world_transform
     ) as dst:
         dst.write(np.zeros_like(dsm, dtype=np.float32), 1)
 
@@ -172,7 +172,7 @@ for subfolder in os.listdir(input_root):
 
     print(f"✅ Exported GeoJSONs for {subfolder}")
 
-"""    # --- Optional Visualization ---
+    """    # --- Optional Visualization ---
     plt.figure(figsize=(8, 8))
     plt.imshow(dsm, cmap='gray', origin='upper')
     plt.title(f"DSM: {subfolder}")
@@ -198,5 +198,15 @@ for subfolder in os.listdir(input_root):
     plt.legend()
     plt.tight_layout()
     plt.show()
-"""
-print("\n🎉 All folders processed successfully!")
\ No newline at end of file
+    """
+
+
+# --- MAIN LOOP ---
+def main(input_root=input_root):
+    for subfolder in os.listdir(input_root):
+        process_folder(os.path.join(input_root, subfolder))
+    print("\n🎉 All folders processed successfully!")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
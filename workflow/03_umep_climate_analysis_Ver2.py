@@ -1,190 +1,240 @@
 import os
 import sys
+from contextlib import nullcontext
 from pathlib import Path
 
 # ----------------------------------------------------------------------------------
-# 🔧 Patch os.add_dll_directory to skip invalid paths like '.' or ''
-# ----------------------------------------------------------------------------------
-original_add_dll_directory = os.add_dll_directory
-
-def safe_add_dll_directory(p):
-    if os.path.isabs(p) and os.path.isdir(p):
-        return original_add_dll_directory(p)
-    return None
-
-os.add_dll_directory = safe_add_dll_directory
-
-# ----------------------------------------------------------------------------------
-# 📁 Define your QGIS install location
+# 📁 Define your QGIS install location (Windows) and UMEP plugin folder
 # ----------------------------------------------------------------------------------
 QGIS_PATH = r"C:\Program Files\QGIS 3.34.12"
-
-# ----------------------------------------------------------------------------------
-# 🧪 Construct safe DLL search paths
-# ----------------------------------------------------------------------------------
-dll_paths = [
-    os.path.join(QGIS_PATH, 'bin'),
-    os.path.join(QGIS_PATH, 'apps', 'qgis-ltr', 'bin'),
-    os.path.join(QGIS_PATH, 'apps', 'Qt5', 'bin')
-]
-
-# Filter existing PATH for valid absolute directories only
-original_path = os.environ.get('PATH', '')
-valid_paths = [p for p in original_path.split(';') if os.path.isabs(p) and os.path.isdir(p)]
-os.environ['PATH'] = ';'.join(dll_paths + valid_paths)
-
-# (Optional) Set GDAL data path to suppress some errors
-os.environ['GDAL_DATA'] = os.path.join(QGIS_PATH, 'share', 'gdal')
-
-# ----------------------------------------------------------------------------------
-# 📚 Add QGIS Python modules to sys.path
-# ----------------------------------------------------------------------------------
-sys.path.append(os.path.join(QGIS_PATH, 'apps', 'qgis-ltr', 'python'))
-sys.path.append(os.path.join(QGIS_PATH, 'apps', 'qgis-ltr', 'python', 'plugins'))
-sys.path.append(os.path.join(QGIS_PATH, 'apps', 'Python312', 'Lib', 'site-packages'))
-
-# Add UMEP plugin path
-sys.path.append(r"C:\Users\Ardo\AppData\Roaming\QGIS\QGIS3\profiles\default\python\plugins")
-
-# ----------------------------------------------------------------------------------
-# ⚙️ Set QGIS environment variables
-# ----------------------------------------------------------------------------------
-os.environ['QGIS_PREFIX_PATH'] = os.path.join(QGIS_PATH, 'apps', 'qgis-ltr')
-os.environ['QT_QPA_PLATFORM_PLUGIN_PATH'] = os.path.join(QGIS_PATH, 'apps', 'Qt5', 'plugins')
-
-# ----------------------------------------------------------------------------------
-# 🚀 Initialize QGIS
-# ----------------------------------------------------------------------------------
-from qgis.core import QgsApplication
-qgs = QgsApplication([], False)
-qgs.initQgis()
-print("✅ QGIS initialized successfully with Python 3.12!")
-
-# ----------------------------------------------------------------------------------
-# 🧠 Initialize Processing + UMEP
-# ----------------------------------------------------------------------------------
-from processing.core.Processing import Processing
-Processing.initialize()
-
-from processing_umep.processing_umep_provider import ProcessingUMEPProvider
-umep_provider = ProcessingUMEPProvider()
-QgsApplication.processingRegistry().addProvider(umep_provider)
-
-import processing
-
-# ----------------------------------------------------------------------------------
-# 🔁 Loop through folders and run tools
-# ----------------------------------------------------------------------------------
-base_dir = Path(r'C:/Users/Ardo/Desktop/thesis/processed')
-
-try:
-    for folder in base_dir.iterdir():
-        if folder.is_dir():
-            dsm_path = folder / 'dsm.tif'
-            dem_path = folder / 'dem.tif'
-            svf_output_path = folder / 'svf.tif'
-            wall_height_path = folder / 'wall_height.tif'
-            wall_aspect_path = folder / 'wall_aspect.tif'
-
-            if not dsm_path.exists():
-                print(f"⚠️ Skipped {folder.name}: dsm.tif not found")
-                continue
-
-            print(f"\n▶️ Processing folder: {folder.name}")
-
-            try:
-                # 1️⃣ Sky View Factor
-                svf_output = processing.run("umep:Urban Geometry: Sky View Factor", {
-                    'INPUT_DSM': str(dsm_path),
-                    'INPUT_CDSM': None,
-                    'TRANS_VEG': 3,
-                    'INPUT_TDSM': None,
-                    'INPUT_THEIGHT': 25,
-                    'ANISO': True,
-                    'WALL_SCHEME': False,
-                    'KMEANS': True,
-                    'CLUSTERS': 5,
-                    'INPUT_DEM': None,
-                    'INPUT_SVFHEIGHT': 1,
-                    'OUTPUT_DIR': str(folder),
-                    'OUTPUT_FILE': str(svf_output_path)
-                })
-                print(f"✅ SVF created: {svf_output_path.name}")
-
-                # 2️⃣ Wall Height & Aspect
-                wall_outputs = processing.run("umep:Urban Geometry: Wall Height and Aspect", {
-                    'INPUT': str(dsm_path),
-                    'INPUT_LIMIT': 3,
-                    'OUTPUT_HEIGHT': str(wall_height_path),
-                    'OUTPUT_ASPECT': str(wall_aspect_path)
-                })
-                print("✅ Wall height and aspect done")
-
-                # 3️⃣ MRT (SOLWEIG)
-                if dem_path.exists():
-                    mrt_output = processing.run("umep:Outdoor Thermal Comfort: SOLWEIG", {
-                        'INPUT_DSM': str(dsm_path),
-                        'INPUT_SVF': str(folder / 'svfs.zip'),
-                        'INPUT_HEIGHT': str(wall_height_path),
-                        'INPUT_ASPECT': str(wall_aspect_path),
-                        'INPUT_CDSM': None,
-                        'TRANS_VEG': 3,
-                        'LEAF_START': 97,
-                        'LEAF_END': 300,
-                        'CONIFER_TREES': False,
-                        'INPUT_TDSM': None,
-                        'INPUT_THEIGHT': 25,
-                        'INPUT_LC': None,
-                        'USE_LC_BUILD': False,
-                        'INPUT_DEM': str(dem_path),
-                        'SAVE_BUILD': True,
-                        'INPUT_ANISO': '',
-                        'INPUT_WALLSCHEME': '',
-                        'WALLTEMP_NETCDF': False,
-                        'WALL_TYPE': 0,
-                        'ALBEDO_WALLS': 0.2,
-                        'ALBEDO_GROUND': 0.15,
-                        'EMIS_WALLS': 0.9,
-                        'EMIS_GROUND': 0.95,
-                        'ABS_S': 0.7,
-                        'ABS_L': 0.95,
-                        'POSTURE': 0,
-                        'CYL': True,
-                        'INPUTMET': r'C:\Users\Ardo\Documents\GitHub\Thesis_UrbanComfort\Climate\climate_BCN_17Jul.txt',
-                        'ONLYGLOBAL': False,
-                        'UTC': 1,
-                        'WOI_FILE': None,
-                        'WOI_FIELD': '',
-                        'POI_FILE': None,
-                        'POI_FIELD': '',
-                        'AGE': 35,
-                        'ACTIVITY': 80,
-                        'CLO': 0.9,
-                        'WEIGHT': 75,
-                        'HEIGHT': 180,
-                        'SEX': 0,
-                        'SENSOR_HEIGHT': 10,
-                        'OUTPUT_TMRT': True,
-                        'OUTPUT_KDOWN': False,
-                        'OUTPUT_KUP': False,
-                        'OUTPUT_LDOWN': False,
-                        'OUTPUT_LUP': False,
-                        'OUTPUT_SH': False,
-                        'OUTPUT_TREEPLANTER': False,
-                        'OUTPUT_DIR': str(folder)
-                    })
-                    print("✅ MRT (SOLWEIG) completed")
-                else:
-                    print(f"⚠️ Skipping MRT: No dem.tif found in {folder.name}")
-
-            except Exception as e:
-                print(f"❌ Error processing {folder.name}: {e}")
-
-except KeyboardInterrupt:
-    print("🛑 Interrupted by user")
-
-# ----------------------------------------------------------------------------------
-# 🧹 Clean exit
-# ----------------------------------------------------------------------------------
-qgs.exitQgis()
-print("👋 QGIS session closed.")
+UMEP_PLUGINS = r"C:\Users\Ardo\AppData\Roaming\QGIS\QGIS3\profiles\default\python\plugins"
+BASE_DIR = Path(r'C:/Users/Ardo/Desktop/thesis/processed')
+MET_FILE = Path(__file__).resolve().parent.parent / 'Climate' / 'climate_BCN_17Jul.txt'
+WALL_LIMIT = 3  # m, was INPUT_LIMIT of the UMEP wall tool
+
+# Wall height / aspect are computed in NumPy (no QGIS processing round-trip)
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'workflow_Ver3'))
+import wall_geometry
+import tmrt_aggregation
+
+qgs = None
+processing = None
+
+
+def setup_windows_paths(qgis_path):
+    # ----------------------------------------------------------------------------------
+    # 🔧 Patch os.add_dll_directory to skip invalid paths like '.' or ''
+    # ----------------------------------------------------------------------------------
+    original_add_dll_directory = os.add_dll_directory
+
+    def safe_add_dll_directory(p):
+        if os.path.isabs(p) and os.path.isdir(p):
+            return original_add_dll_directory(p)
+        return None
+
+    os.add_dll_directory = safe_add_dll_directory
+
+    # ----------------------------------------------------------------------------------
+    # 🧪 Construct safe DLL search paths
+    # ----------------------------------------------------------------------------------
+    dll_paths = [
+        os.path.join(qgis_path, 'bin'),
+        os.path.join(qgis_path, 'apps', 'qgis-ltr', 'bin'),
+        os.path.join(qgis_path, 'apps', 'Qt5', 'bin')
+    ]
+
+    # Filter existing PATH for valid absolute directories only
+    original_path = os.environ.get('PATH', '')
+    valid_paths = [p for p in original_path.split(';') if os.path.isabs(p) and os.path.isdir(p)]
+    os.environ['PATH'] = ';'.join(dll_paths + valid_paths)
+
+    # (Optional) Set GDAL data path to suppress some errors
+    os.environ['GDAL_DATA'] = os.path.join(qgis_path, 'share', 'gdal')
+
+    # ----------------------------------------------------------------------------------
+    # 📚 Add QGIS Python modules to sys.path
+    # ----------------------------------------------------------------------------------
+    sys.path.append(os.path.join(qgis_path, 'apps', 'qgis-ltr', 'python'))
+    sys.path.append(os.path.join(qgis_path, 'apps', 'qgis-ltr', 'python', 'plugins'))
+    sys.path.append(os.path.join(qgis_path, 'apps', 'Python312', 'Lib', 'site-packages'))
+
+    # ----------------------------------------------------------------------------------
+    # ⚙️ Set QGIS environment variables
+    # ----------------------------------------------------------------------------------
+    os.environ['QGIS_PREFIX_PATH'] = os.path.join(qgis_path, 'apps', 'qgis-ltr')
+    os.environ['QT_QPA_PLATFORM_PLUGIN_PATH'] = os.path.join(qgis_path, 'apps', 'Qt5', 'plugins')
+
+
+def init_qgis(qgis_path=QGIS_PATH, umep_plugins=UMEP_PLUGINS):
+    """Start QGIS + Processing + UMEP once per process (also used as pool initializer)."""
+    global qgs, processing
+    if qgs is not None:
+        return
+
+    # On Linux QGIS comes from the system packages; only Windows needs the DLL / PATH setup
+    if os.name == "nt":
+        setup_windows_paths(qgis_path)
+
+    # Add UMEP plugin path
+    if umep_plugins:
+        sys.path.append(str(umep_plugins))
+
+    # ----------------------------------------------------------------------------------
+    # 🚀 Initialize QGIS
+    # ----------------------------------------------------------------------------------
+    from qgis.core import QgsApplication
+    qgs = QgsApplication([], False)
+    qgs.initQgis()
+    print("✅ QGIS initialized successfully!")
+
+    # ----------------------------------------------------------------------------------
+    # 🧠 Initialize Processing + UMEP
+    # ----------------------------------------------------------------------------------
+    from processing.core.Processing import Processing
+    Processing.initialize()
+
+    from processing_umep.processing_umep_provider import ProcessingUMEPProvider
+    umep_provider = ProcessingUMEPProvider()
+    QgsApplication.processingRegistry().addProvider(umep_provider)
+
+    import processing as qgis_processing
+    processing = qgis_processing
+
+
+def exit_qgis():
+    global qgs
+    if qgs is not None:
+        qgs.exitQgis()
+        qgs = None
+        print("👋 QGIS session closed.")
+
+
+# ----------------------------------------------------------------------------------
+# 🔁 One folder: SVF → wall height / aspect → SOLWEIG → Tmrt summary
+# ----------------------------------------------------------------------------------
+def process_folder(folder, met_file=MET_FILE, timer=None, delete_hourly=False):
+    # timer(name, unit) → context manager timing one tool (see run_pipeline.py)
+    timer = timer or (lambda name, unit: nullcontext())
+    init_qgis()
+    folder = Path(folder)
+    dsm_path = folder / 'dsm.tif'
+    dem_path = folder / 'dem.tif'
+    svf_output_path = folder / 'svf.tif'
+    wall_height_path = folder / 'wall_height.tif'
+    wall_aspect_path = folder / 'wall_aspect.tif'
+
+    if not dsm_path.exists():
+        print(f"⚠️ Skipped {folder.name}: dsm.tif not found")
+        return
+
+    print(f"\n▶️ Processing folder: {folder.name}")
+
+    # 1️⃣ Sky View Factor
+    with timer("svf", folder.name):
+        svf_output = processing.run("umep:Urban Geometry: Sky View Factor", {
+            'INPUT_DSM': str(dsm_path),
+            'INPUT_CDSM': None,
+            'TRANS_VEG': 3,
+            'INPUT_TDSM': None,
+            'INPUT_THEIGHT': 25,
+            'ANISO': True,
+            'WALL_SCHEME': False,
+            'KMEANS': True,
+            'CLUSTERS': 5,
+            'INPUT_DEM': None,
+            'INPUT_SVFHEIGHT': 1,
+            'OUTPUT_DIR': str(folder),
+            'OUTPUT_FILE': str(svf_output_path)
+        })
+    print(f"✅ SVF created: {svf_output_path.name}")
+
+    # 2️⃣ Wall Height & Aspect
+    with timer("walls", folder.name):
+        wall_geometry.write_walls(dsm_path, wall_height_path, wall_aspect_path, limit=WALL_LIMIT)
+    print("✅ Wall height and aspect done")
+
+    # 3️⃣ MRT (SOLWEIG)
+    if dem_path.exists():
+        with timer("solweig", folder.name):
+            mrt_output = processing.run("umep:Outdoor Thermal Comfort: SOLWEIG", {
+                'INPUT_DSM': str(dsm_path),
+                'INPUT_SVF': str(folder / 'svfs.zip'),
+                'INPUT_HEIGHT': str(wall_height_path),
+                'INPUT_ASPECT': str(wall_aspect_path),
+                'INPUT_CDSM': None,
+                'TRANS_VEG': 3,
+                'LEAF_START': 97,
+                'LEAF_END': 300,
+                'CONIFER_TREES': False,
+                'INPUT_TDSM': None,
+                'INPUT_THEIGHT': 25,
+                'INPUT_LC': None,
+                'USE_LC_BUILD': False,
+                'INPUT_DEM': str(dem_path),
+                'SAVE_BUILD': True,
+                'INPUT_ANISO': '',
+                'INPUT_WALLSCHEME': '',
+                'WALLTEMP_NETCDF': False,
+                'WALL_TYPE': 0,
+                'ALBEDO_WALLS': 0.2,
+                'ALBEDO_GROUND': 0.15,
+                'EMIS_WALLS': 0.9,
+                'EMIS_GROUND': 0.95,
+                'ABS_S': 0.7,
+                'ABS_L': 0.95,
+                'POSTURE': 0,
+                'CYL': True,
+                'INPUTMET': str(met_file),
+                'ONLYGLOBAL': False,
+                'UTC': 1,
+                'WOI_FILE': None,
+                'WOI_FIELD': '',
+                'POI_FILE': None,
+                'POI_FIELD': '',
+                'AGE': 35,
+                'ACTIVITY': 80,
+                'CLO': 0.9,
+                'WEIGHT': 75,
+                'HEIGHT': 180,
+                'SEX': 0,
+                'SENSOR_HEIGHT': 10,
+                'OUTPUT_TMRT': True,
+                'OUTPUT_KDOWN': False,
+                'OUTPUT_KUP': False,
+                'OUTPUT_LDOWN': False,
+                'OUTPUT_LUP': False,
+                'OUTPUT_SH': False,
+                'OUTPUT_TREEPLANTER': False,
+                'OUTPUT_DIR': str(folder)
+            })
+        print("✅ MRT (SOLWEIG) completed")
+
+        # 4️⃣ Hourly Tmrt → Tmrt_summary.tif (mean / min / max / percentiles / hours above 55 °C)
+        with timer("aggregate", folder.name):
+            n_hours = tmrt_aggregation.summarize_folder(folder, delete_hourly=delete_hourly)
+        print(f"✅ Tmrt summary over {n_hours} timesteps" + (" (hourly files removed)" if delete_hourly else ""))
+    else:
+        print(f"⚠️ Skipping MRT: No dem.tif found in {folder.name}")
+
+
+def main(base_dir=BASE_DIR, met_file=MET_FILE):
+    init_qgis()
+    try:
+        for folder in Path(base_dir).iterdir():
+            if folder.is_dir():
+                try:
+                    process_folder(folder, met_file)
+                except Exception as e:
+                    print(f"❌ Error processing {folder.name}: {e}")
+
+    except KeyboardInterrupt:
+        print("🛑 Interrupted by user")
+
+    # ----------------------------------------------------------------------------------
+    # 🧹 Clean exit
+    # ----------------------------------------------------------------------------------
+    exit_qgis()
+
+
+if __name__ == "__main__":
+    main()
@@ -68,17 +68,26 @@ def process_files(geojson_path, tif_path, rotated_json_path):
     print(f"  dir_sin : {rotated['street_attributes']['dir_sin']:.4f}")
     print(f"  dir_cos : {rotated['street_attributes']['dir_cos']:.4f}")
 
-# === Walk through all folders
-for root, dirs, files in os.walk(base_dir):
-    geojson_path = os.path.join(root, "total.geojson")
-    rotated_json_path = os.path.join(root, "street_geo.json")
-    tif_path = os.path.join(root, "Tmrt_average.tif")
+# === One folder (needs total.geojson, street_geo.json and Tmrt_average.tif)
+def process_folder(folder):
+    geojson_path = os.path.join(folder, "total.geojson")
+    rotated_json_path = os.path.join(folder, "street_geo.json")
+    tif_path = os.path.join(folder, "Tmrt_average.tif")
 
     # Process only if all required files exist
     if os.path.exists(geojson_path) and os.path.exists(rotated_json_path) and os.path.exists(tif_path):
+        process_files(geojson_path, tif_path, rotated_json_path)
+        return True
+    print(f"⚠️ Skipped folder (missing required files): {folder}")
+    return False
+
+# === Walk through all folders
+def main(base_dir=base_dir):
+    for root, dirs, files in os.walk(base_dir):
         try:
-            process_files(geojson_path, tif_path, rotated_json_path)
+            process_folder(root)
         except Exception as e:
             print(f"❌ Error processing in {root}:\n   {e}")
-    else:
-        print(f"⚠️ Skipped folder (missing required files): {root}")
+
+if __name__ == "__main__":
+    main()
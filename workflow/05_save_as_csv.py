@@ -23,27 +23,31 @@ fields = [
     "dir_cos"
 ]
 
-# === Prepare data list
-rows = []
+def main(base_dir=base_dir, output_csv=output_csv):
+    # === Prepare data list
+    rows = []
 
-# === Walk through folders
-for root, dirs, files in os.walk(base_dir):
-    if "street_geo_with_mrt.json" in files:
-        json_path = os.path.join(root, "street_geo_with_mrt.json")
-        try:
-            with open(json_path, "r") as f:
-                data = json.load(f)
-                attrs = data.get("street_attributes", {})
-                row = {key: attrs.get(key, None) for key in fields if key != "folder_name"}
-                row["folder_name"] = os.path.basename(root)
-                rows.append(row)
-        except Exception as e:
-            print(f"❌ Failed to process {json_path}:\n   {e}")
+    # === Walk through folders
+    for root, dirs, files in os.walk(base_dir):
+        if "street_geo_with_mrt.json" in files:
+            json_path = os.path.join(root, "street_geo_with_mrt.json")
+            try:
+                with open(json_path, "r") as f:
+                    data = json.load(f)
+                    attrs = data.get("street_attributes", {})
+                    row = {key: attrs.get(key, None) for key in fields if key != "folder_name"}
+                    row["folder_name"] = os.path.basename(root)
+                    rows.append(row)
+            except Exception as e:
+                print(f"❌ Failed to process {json_path}:\n   {e}")
 
-# === Write to CSV
-with open(output_csv, "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=fields)
-    writer.writeheader()
-    writer.writerows(rows)
+    # === Write to CSV
+    with open(output_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
 
-print(f"✅ Exported street attributes to CSV:\n{output_csv}")
+    print(f"✅ Exported street attributes to CSV:\n{output_csv}")
+
+if __name__ == "__main__":
+    main()
@@ -6,37 +6,42 @@ import csv
 # === Configuration
 base_dir = r"C:\Users\Ardo\Desktop\thesis\processed"
 output_dir = os.path.join(base_dir, "exported_grids_local")
-os.makedirs(output_dir, exist_ok=True)
 
-for root, dirs, files in os.walk(base_dir):
-    tif_path = os.path.join(root, "Tmrt_average.tif")
+def export_grid(folder, output_dir=output_dir):
+    tif_path = os.path.join(folder, "Tmrt_average.tif")
+    if not os.path.exists(tif_path):
+        return None
 
-    if os.path.exists(tif_path):
-        folder_name = os.path.basename(root)
-        output_csv = os.path.join(output_dir, f"{folder_name}_Tmrt_local.csv")
+    os.makedirs(output_dir, exist_ok=True)
+    folder_name = os.path.basename(os.path.normpath(folder))
+    output_csv = os.path.join(output_dir, f"{folder_name}_Tmrt_local.csv")
 
-        with rasterio.open(tif_path) as src:
-            data = src.read(1)
-            height, width = data.shape
+    with rasterio.open(tif_path) as src:
+        data = src.read(1)
+        height, width = data.shape
 
-            # Expected: width = height = 150
-            cell_size = 1.0  # meter
-            x_min = -width / 2 * cell_size + cell_size / 2  # center at 0
-            y_max = height / 2 * cell_size - cell_size / 2  # center at 0
+    # Expected: width = height = 150
+    cell_size = 1.0  # meter
+    x_min = -width / 2 * cell_size + cell_size / 2  # center at 0
+    y_max = height / 2 * cell_size - cell_size / 2  # center at 0
 
-            with open(output_csv, "w", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(["x", "y", "value"])
+    # Local x, y centered at (0,0); row 0 is top
+    rows, cols = np.nonzero(~np.isnan(data))
+    x = np.round(x_min + cols * cell_size, 2)
+    y = np.round(y_max - rows * cell_size, 2)
+    values = np.round(data[rows, cols].astype(np.float64), 2)
 
-                for row in range(height):
-                    for col in range(width):
-                        value = data[row, col]
-                        if np.isnan(value):
-                            continue
+    with open(output_csv, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["x", "y", "value"])
+        writer.writerows(zip(x.tolist(), y.tolist(), values.tolist()))
 
-                        # Compute local x, y centered at (0,0)
-                        x = x_min + col * cell_size
-                        y = y_max - row * cell_size  # because row 0 is top
-                        writer.writerow([round(x, 2), round(y, 2), round(float(value), 2)])
+    print(f"✅ Exported local grid: {output_csv}")
+    return output_csv
 
-        print(f"✅ Exported local grid: {output_csv}")
+def main(base_dir=base_dir, output_dir=output_dir):
+    for root, dirs, files in os.walk(base_dir):
+        export_grid(root, output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,30 @@ source_root = r"C:\Users\Ardo\Desktop\thesis\processed"
 destination_root = r"C:\Users\Ardo\Desktop\thesis\post_processed"
 target_filename = "street_geo_with_mrt.json"
 
-# Create destination folder if it doesn't exist
-os.makedirs(destination_root, exist_ok=True)
+def copy_folder(folder_path, destination_root=destination_root):
+    folder_name = os.path.basename(os.path.normpath(folder_path))
+    source_file = os.path.join(folder_path, target_filename)
 
-# Loop through all items in the source directory
-for folder_name in os.listdir(source_root):
-    folder_path = os.path.join(source_root, folder_name)
-    
-    # Only process directories
-    if os.path.isdir(folder_path):
-        source_file = os.path.join(folder_path, target_filename)
-        
-        if os.path.isfile(source_file):
-            destination_file = os.path.join(destination_root, f"{folder_name}.json")
-            shutil.copy2(source_file, destination_file)
-            print(f"Copied: {source_file} -> {destination_file}")
-        else:
-            print(f"File not found in {folder_path}: {target_filename}")
+    if os.path.isfile(source_file):
+        os.makedirs(destination_root, exist_ok=True)
+        destination_file = os.path.join(destination_root, f"{folder_name}.json")
+        shutil.copy2(source_file, destination_file)
+        print(f"Copied: {source_file} -> {destination_file}")
+        return destination_file
+    print(f"File not found in {folder_path}: {target_filename}")
+    return None
+
+def main(source_root=source_root, destination_root=destination_root):
+    # Create destination folder if it doesn't exist
+    os.makedirs(destination_root, exist_ok=True)
+
+    # Loop through all items in the source directory
+    for folder_name in os.listdir(source_root):
+        folder_path = os.path.join(source_root, folder_name)
+
+        # Only process directories
+        if os.path.isdir(folder_path):
+            copy_folder(folder_path, destination_root)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import glob
+import hashlib
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# ----------------------------------------------------------------------------------
+# 🔗 Stage runner for 01 → 08 with per-folder dependency tracking
+# ----------------------------------------------------------------------------------
+# Every stage declares its inputs and outputs per unit (an input JSON, a processed
+# folder, or the whole set). A unit reruns only when an output is missing or the
+# signature of its inputs changed: file mtime+size (or content hash with
+# "signature": "hash"), the stage params from the config and the stage script
+# itself. Signatures are kept in <processed>/.pipeline_state.json.
+# Each unit is profiled (wall / CPU / peak RSS / IO, see workflow_Ver3/profiling.py)
+# into <processed>/pipeline_profile.jsonl, UMEP also per SVF / walls / SOLWEIG:
+#   python ../workflow_Ver3/profiling.py summary <processed>/pipeline_profile.jsonl
+# Paths, params and workers per stage come from one config file (relative paths
+# are resolved against it).
+# Usage:
+#   python run_pipeline.py --config pipeline_config.json
+#   python run_pipeline.py --config pipeline_config.json --stages rasterize umep --dry-run
+#   python run_pipeline.py --config pipeline_config.json --force umep --workers umep=1
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "..", "workflow_Ver3"))
+import profiling
+
+STATE_FILE = ".pipeline_state.json"
+PROFILE_FILE = "pipeline_profile.jsonl"
+
+# units: "inputs" = each *.json in input_folder, "folders" = processed subfolders holding
+# the first input, "global" = one unit over everything. Paths use {folder}, {name}
+# and the config paths.
+STAGES = [
+    {
+        "name": "generate", "module": "01_generate_folder", "func": "generate_file",
+        "units": "inputs", "inputs": ["{unit}"], "outputs": None,
+        "call": lambda unit, p, params: ((unit, p["processed"]), params),
+    },
+    {
+        "name": "rasterize", "module": "02_json_to_tif_Ver3", "func": "process_folder",
+        "units": "folders", "inputs": ["{folder}/street_geo.json"],
+        "outputs": ["{folder}/dsm.tif", "{folder}/dem.tif", "{folder}/total.geojson"],
+        "call": lambda unit, p, params: ((unit,), params),
+    },
+    {
+        "name": "umep", "module": "03_umep_climate_analysis_Ver2", "func": "process_folder",
+        "units": "folders", "inputs": ["{folder}/dsm.tif", "{folder}/dem.tif", "{met_file}"],
+        "outputs": ["{folder}/svf.tif", "{folder}/wall_height.tif", "{folder}/wall_aspect.tif",
+                    "{folder}/Tmrt_average.tif", "{folder}/Tmrt_summary.tif"],
+        "call": lambda unit, p, params: ((unit, p["met_file"]), {"timer": profiling.stage_timer(p["profile_log"]), **params}),
+        "init": lambda module, p: module.init_qgis(p.get("qgis_path"), p.get("umep_plugins")),
+    },
+    {
+        "name": "mrt_attributes", "module": "04_tif_to_data_Ver2", "func": "process_folder",
+        "units": "folders",
+        "inputs": ["{folder}/Tmrt_average.tif", "{folder}/total.geojson", "{folder}/street_geo.json"],
+        "outputs": ["{folder}/street_geo_with_mrt.json"],
+        "call": lambda unit, p, params: ((unit,), params),
+    },
+    {
+        "name": "grid_export", "module": "07_data_to_grid_Ver2", "func": "export_grid",
+        "units": "folders", "inputs": ["{folder}/Tmrt_average.tif"],
+        "outputs": ["{processed}/exported_grids_local/{name}_Tmrt_local.csv"],
+        "call": lambda unit, p, params: ((unit, os.path.join(p["processed"], "exported_grids_local")), params),
+    },
+    {
+        "name": "summary_csv", "module": "05_save_as_csv", "func": "main",
+        "units": "global", "inputs": ["{processed}/*/street_geo_with_mrt.json"],
+        "outputs": ["{processed}/street_attributes_summary.csv"],
+        "call": lambda unit, p, params: ((p["processed"], os.path.join(p["processed"], "street_attributes_summary.csv")), params),
+    },
+    {
+        "name": "post_process", "module": "08_extract_json_to_folder", "func": "copy_folder",
+        "units": "folders", "inputs": ["{folder}/street_geo_with_mrt.json"],
+        "outputs": ["{post_processed}/{name}.json"],
+        "call": lambda unit, p, params: ((unit, p["post_processed"]), params),
+    },
+]
+STAGE_BY_NAME = {s["name"]: s for s in STAGES}
+
+
+# === Config
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    config["paths"] = {
+        k: os.path.normpath(os.path.join(base, v)) if v and not os.path.isabs(v) else v
+        for k, v in config.get("paths", {}).items()
+    }
+    config["paths"].setdefault("profile_log", os.path.join(config["paths"]["processed"], PROFILE_FILE))
+    config.setdefault("signature", "mtime")
+    config.setdefault("stages", {})
+    return config
+
+
+def stage_settings(config, name):
+    settings = config["stages"].get(name, {})
+    return int(settings.get("workers", 1)), dict(settings.get("params", {}))
+
+
+# === Units and signatures
+def expand(template, paths, unit):
+    name = os.path.basename(os.path.normpath(unit)) if unit else ""
+    return template.format(unit=unit, folder=unit, name=name, **paths)
+
+
+def discover_units(stage, paths):
+    if stage["units"] == "inputs":
+        return sorted(glob.glob(os.path.join(paths["input_folder"], "*.json")))
+    if stage["units"] == "global":
+        return ["all"]
+    root = paths["processed"]
+    if not os.path.isdir(root):
+        return []
+    first = stage["inputs"][0]
+    folders = [os.path.join(root, d) for d in sorted(os.listdir(root)) if os.path.isdir(os.path.join(root, d))]
+    return [f for f in folders if os.path.exists(expand(first, paths, f))]
+
+
+def input_files(stage, paths, unit):
+    files = []
+    for template in stage["inputs"]:
+        pattern = expand(template, paths, unit)
+        files.extend(sorted(glob.glob(pattern)) if any(c in pattern for c in "*?[") else [pattern])
+    return files
+
+
+def file_signature(path, mode):
+    if not os.path.exists(path):
+        return "missing"
+    if mode == "hash":
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def unit_signature(stage, paths, unit, params, mode):
+    h = hashlib.sha1()
+    h.update(json.dumps(params, sort_keys=True).encode())
+    h.update(file_signature(os.path.join(HERE, stage["module"] + ".py"), "hash").encode())
+    for path in input_files(stage, paths, unit):
+        h.update(f"{path}|{file_signature(path, mode)}".encode())
+    return h.hexdigest()
+
+
+def expected_outputs(stage, paths, unit, record):
+    if stage["outputs"] is None:
+        return record.get("outputs", []) if record else []
+    return [expand(t, paths, unit) for t in stage["outputs"]]
+
+
+def is_stale(stage, paths, unit, signature, record):
+    if not record or record.get("signature") != signature:
+        return True
+    outputs = expected_outputs(stage, paths, unit, record)
+    return not all(os.path.exists(p) for p in outputs)
+
+
+# === State
+def load_state(paths):
+    path = os.path.join(paths["processed"], STATE_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(paths, state):
+    os.makedirs(paths["processed"], exist_ok=True)
+    path = os.path.join(paths["processed"], STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+
+# === Execution
+_modules = {}
+
+
+def stage_module(stage):
+    if stage["module"] not in _modules:
+        if HERE not in sys.path:
+            sys.path.insert(0, HERE)
+        _modules[stage["module"]] = importlib.import_module(stage["module"])
+    return _modules[stage["module"]]
+
+
+def init_worker(stage_name, paths):
+    stage = STAGE_BY_NAME[stage_name]
+    module = stage_module(stage)
+    if "init" in stage:
+        stage["init"](module, paths)
+
+
+def run_unit(stage_name, unit, paths, params):
+    stage = STAGE_BY_NAME[stage_name]
+    module = stage_module(stage)
+    args, kwargs = stage["call"](unit, paths, params)
+    with profiling.stage(stage_name, unit=os.path.basename(os.path.normpath(unit)), log=paths["profile_log"]):
+        result = getattr(module, stage["func"])(*args, **kwargs)
+    if stage["outputs"] is None:
+        # Stages without declared outputs return the folders they wrote
+        return [os.path.join(f, "street_geo.json") for f in (result or [])]
+    return None
+
+
+def run_stage(stage, config, state, force=False, dry_run=False, workers=None):
+    paths = config["paths"]
+    stage_workers, params = stage_settings(config, stage["name"])
+    workers = workers or stage_workers
+    records = state.setdefault(stage["name"], {})
+
+    todo = []
+    for unit in discover_units(stage, paths):
+        signature = unit_signature(stage, paths, unit, params, config["signature"])
+        if force or is_stale(stage, paths, unit, signature, records.get(unit)):
+            todo.append((unit, signature))
+
+    print(f"\n▶️ {stage['name']}: {len(todo)} stale unit(s)" + (f" on {workers} worker(s)" if todo else ""))
+    if dry_run or not todo:
+        for unit, _ in todo[:20]:
+            print(f"  · {unit}")
+        return 0
+
+    failed = 0
+
+    def done(unit, signature, outputs):
+        records[unit] = {"signature": signature}
+        if outputs is not None:
+            records[unit]["outputs"] = outputs
+
+    if workers <= 1:
+        init_worker(stage["name"], paths)
+        for unit, signature in todo:
+            try:
+                done(unit, signature, run_unit(stage["name"], unit, paths, params))
+            except Exception as e:
+                failed += 1
+                print(f"❌ {stage['name']} failed on {unit}: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(stage["name"], paths)) as pool:
+            futures = {pool.submit(run_unit, stage["name"], unit, paths, params): (unit, signature) for unit, signature in todo}
+            for future in as_completed(futures):
+                unit, signature = futures[future]
+                try:
+                    done(unit, signature, future.result())
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ {stage['name']} failed on {unit}: {e}")
+
+    save_state(paths, state)
+    print(f"✅ {stage['name']}: {len(todo) - failed} done, {failed} failed")
+    return failed
+
+
+def parse_workers(values):
+    out = {}
+    for value in values:
+        name, _, n = value.partition("=")
+        out[name] = int(n)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the 01–08 workflow, rerunning only stale work")
+    parser.add_argument("--config", default=os.path.join(HERE, "pipeline_config.json"))
+    parser.add_argument("--stages", nargs="+", choices=list(STAGE_BY_NAME), help="Subset to run (in pipeline order)")
+    parser.add_argument("--force", nargs="*", help="Rerun every unit of these stages (no names = all selected)")
+    parser.add_argument("--workers", nargs="*", default=[], help="Override as stage=N")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    state = load_state(config["paths"])
+    workers = parse_workers(args.workers)
+    selected = [s for s in STAGES if not args.stages or s["name"] in args.stages]
+    forced = set(s["name"] for s in selected) if args.force == [] else set(args.force or [])
+
+    failed = 0
+    for stage in selected:
+        failed += run_stage(stage, config, state, stage["name"] in forced, args.dry_run, workers.get(stage["name"]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import os
 import sys
 from pathlib import Path
+import pandas as pd
 
 # ----------------------------------------------------------------------------------
 # 🔧 Patch os.add_dll_directory to skip invalid paths like '.' or ''
@@ -72,10 +73,23 @@ QgsApplication.processingRegistry().addProvider(umep_provider)
 
 import processing
 
+# Wall height / aspect in NumPy instead of the UMEP tool (same 3 m limit)
+import wall_geometry
+WALL_LIMIT = 3
+
+# Hourly Tmrt rasters are folded into Tmrt_summary.tif right after SOLWEIG
+import tmrt_aggregation
+DELETE_HOURLY = True
+
+# SOLWEIG Analyzer replacement → one Parquet row per patch
+import solweig_analyzer
+TMRT_THRESHOLD = 55
+
 # ----------------------------------------------------------------------------------
 # 🔁 Loop through folders and run tools
 # ----------------------------------------------------------------------------------
 base_dir = Path(r'C:/Users/Ardo/Desktop/thesis2/patches_combined')
+analyzer_rows = []
 
 try:
     for folder in base_dir.iterdir():
@@ -116,12 +130,7 @@ try:
                 print(f"✅ SVF created: {svf_output_path.name}")
 
                 # 2️⃣ Wall Height & Aspect
-                wall_outputs = processing.run("umep:Urban Geometry: Wall Height and Aspect", {
-                    'INPUT': str(dsm_path),
-                    'INPUT_LIMIT': 3,
-                    'OUTPUT_HEIGHT': str(wall_height_path),
-                    'OUTPUT_ASPECT': str(wall_aspect_path)
-                })
+                wall_geometry.write_walls(dsm_path, wall_height_path, wall_aspect_path, limit=WALL_LIMIT)
                 print("✅ Wall height and aspect done")
 
                 # 3️⃣ MRT (SOLWEIG)
@@ -167,7 +176,7 @@ try:
                     'HEIGHT': 180,
                     'SEX': 0,
                     'SENSOR_HEIGHT': 10,
-                    'OUTPUT_TMRT': False,
+                    'OUTPUT_TMRT': True,  # hourly Tmrt, streamed into Tmrt_summary.tif below
                     'OUTPUT_KDOWN': False,
                     'OUTPUT_KUP': False,
                     'OUTPUT_LDOWN': False,
@@ -178,18 +187,15 @@ try:
                 })
                 print("✅ MRT (SOLWEIG) completed")
 
-                
-                """tmrt_output = processing.run("umep:Outdoor Thermal Comfort: SOLWEIG Analyzer",{
-                    'SOLWEIG_DIR': str(folder),
-                    'BUILDINGS':'C:/Users/Ardo/Desktop/thesis2/mrt/buildings.tif',
-                    'VARIA_IN':0,
-                    'STAT_TYPE':1,
-                    'THRES_TYPE':0,
-                    'TMRT_THRES_NUM':55,
-                    'STAT_OUT':'TEMPORARY_OUTPUT',
-                    'TMRT_STAT_OUT':'TEMPORARY_OUTPUT'
-                    })
-                print("MeanRadiantTemperature completed")"""
+                # 4️⃣ Hourly Tmrt → Tmrt_summary.tif (hourly files removed once summarized)
+                n_hours = tmrt_aggregation.summarize_folder(folder, delete_hourly=DELETE_HOURLY)
+                print(f"✅ Tmrt summary over {n_hours} timesteps")
+
+                # 5️⃣ SOLWEIG Analyzer (native): buildings masked, % of time above 55 °C
+                metrics = solweig_analyzer.analyze_folder(folder, threshold=TMRT_THRESHOLD)
+                if metrics:
+                    analyzer_rows.append(metrics)
+                print("✅ MeanRadiantTemperature metrics computed")
 
             except Exception as e:
                 print(f"❌ Error processing {folder.name}: {e}")
@@ -197,6 +203,10 @@ try:
 except KeyboardInterrupt:
     print("🛑 Interrupted by user")
 
+if analyzer_rows:
+    _, table_path = solweig_analyzer.update_table(base_dir / solweig_analyzer.TABLE_NAME, pd.DataFrame(analyzer_rows))
+    print(f"✅ {len(analyzer_rows)} patch metrics saved to: {table_path}")
+
 # ----------------------------------------------------------------------------------
 # 🧹 Clean exit
 # ----------------------------------------------------------------------------------
@@ -1,44 +1,219 @@
 import os
 import json
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import flask
 import ghhops_server as hs
-from shapely.geometry import shape, Point
 from rasterio.transform import from_origin
 from rasterio.features import rasterize
 import rasterio
-import tensorflow as tf
-import matplotlib.pyplot as plt
-import torch
-import torch.nn.functional as F
-from torch.nn import Linear
-from torch_geometric.nn import GATConv
-from torch_geometric.data import Data
-from PIL import Image
-
-# === Load CNN model (SVF) ===
-cnn_model = tf.keras.models.load_model("cnn_svf_model.h5", compile=False)
-
-# === Load GNN model (Tmrt) ===
-class TmrtGAT(torch.nn.Module):
-    def __init__(self, in_channels=8, hidden_channels=32):
-        super().__init__()
-        self.gat1 = GATConv(in_channels, hidden_channels, heads=4, concat=True)
-        self.gat2 = GATConv(hidden_channels * 4, hidden_channels, heads=4, concat=False)
-        self.lin = Linear(hidden_channels, 1)
-
-    def forward(self, x, edge_index):
-        x = self.gat1(x, edge_index)
-        x = F.relu(x)
-        x = F.dropout(x, p=0.2, training=self.training)
-        x = self.gat2(x, edge_index)
-        x = F.relu(x)
-        x = self.lin(x)
-        return x.view(-1)
-
-gnn_model = TmrtGAT(in_channels=8, hidden_channels=32)
-gnn_model.load_state_dict(torch.load("gnn_tmrt_model.pth", map_location="cpu"))
-gnn_model.eval()
+import tiled_inference
+import inference_backends
+import incremental
+import street_predictor
+import canopy
+import profiling
+import render
+import geojson_ingest
+import jobs
+import results_store
+import routing
+import design_optimizer
+
+# === Load CNN (SVF) + GNN (Tmrt) through the selected backend ===
+# TMRT_BACKEND=native   → TensorFlow + PyTorch Geometric (original models)
+# TMRT_BACKEND=portable → ONNX Runtime + TorchScript (see export_models.py)
+# TMRT_BACKEND=dense    → ONNX Runtime + dense stencil GAT (fastest on CPU)
+# TMRT_QUANTIZE=int8    → dense only: int8 CNN (svf_cnn_int8.onnx, see quantize_models.py) + dynamic
+#                         int8 GAT Linear layers; native and portable refuse to start with it
+INFERENCE_BACKEND = os.environ.get("TMRT_BACKEND", "native")
+MODEL_DIR = os.environ.get("TMRT_MODEL_DIR", ".")
+QUANTIZE = os.environ.get("TMRT_QUANTIZE") or None
+backend = inference_backends.load_backend(INFERENCE_BACKEND, model_dir=MODEL_DIR, quantize=QUANTIZE)
+print(f"✅ Inference backend: {backend.name}" + (f" ({QUANTIZE})" if QUANTIZE else ""))
+
+# === Tiled inference settings (override via environment at server start) ===
+TILE_OVERLAP = int(os.environ.get("TMRT_TILE_OVERLAP", tiled_inference.TILE_OVERLAP))
+MAX_TILES = int(os.environ.get("TMRT_MAX_TILES", tiled_inference.MAX_TILES))
+MEMORY_LIMIT_MB = int(os.environ.get("TMRT_MEMORY_LIMIT_MB", tiled_inference.MEMORY_LIMIT_MB))
+TILE_SIZE = tiled_inference.TILE_SIZE
+
+# === Per-request phase timings (JSON lines; TMRT_PROFILE_LOG="" disables) ===
+# parse / rasterize / cnn / features / gat (incl. graph construction) / write;
+# report with: python profiling.py summary tmrt_profile.jsonl
+PROFILE_LOG = os.environ.get("TMRT_PROFILE_LOG", "tmrt_profile.jsonl")
+
+# === Background jobs (SQLite store; TMRT_JOB_WORKERS > 1 runs jobs concurrently on the same models) ===
+JOB_DB = os.environ.get("TMRT_JOB_DB", "tmrt_jobs.sqlite")
+JOB_WORKERS = int(os.environ.get("TMRT_JOB_WORKERS", 1))
+# Progress reported when a phase starts
+JOB_PHASES = {"parse": 0.02, "rasterize": 0.1, "write": 0.2, "tiled": 0.25, "cnn": 0.3, "gat": 0.6}
+job_runner = jobs.JobRunner(JOB_DB, workers=JOB_WORKERS)
+
+# === Predicted Tmrt kept in the results store (query with results_store.py; TMRT_RESULTS_DB="" disables) ===
+RESULTS_DB = os.environ.get("TMRT_RESULTS_DB", "tmrt_results.sqlite")
+SCENARIO = os.environ.get("TMRT_SCENARIO", "BCN_17Jul")
+MODEL_VERSION = backend.name + (f"-{QUANTIZE}" if QUANTIZE else "")
+results_db = results_store.ResultsStore(RESULTS_DB) if RESULTS_DB else None
+# Written off the request thread, one at a time; a rewritten OutPath replaces its old result
+results_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tmrt-results") if results_db else None
+
+
+def store_prediction(tmrt, transform, name, path):
+    try:
+        results_db.add(tmrt, transform, results_store.PREDICTED, name=name, crs='EPSG:25831',
+                       model_version=MODEL_VERSION, scenario=SCENARIO, path=path, replace=True)
+    except Exception as e:
+        print(f"⚠️ Results store: {path} not stored ({e})")
+
+# === Tree crown radius when a tree has no radius / circumference / species property ===
+TREE_RADIUS = float(os.environ.get("TMRT_TREE_RADIUS", 1.5))
+
+# === Street-level XGBoost model (loaded on first use) ===
+STREET_MODEL = os.environ.get("TMRT_STREET_MODEL", os.path.join(MODEL_DIR, "xgboost_tmrt_model_test.joblib"))
+street_models = {}
+
+def get_street_predictor(path):
+    if path not in street_models:
+        street_models[path] = street_predictor.StreetTmrtPredictor.load(path)
+    return street_models[path]
+
+# === Street graph for Tmrt-aware routing (built with: python routing.py build; loaded on first use) ===
+ROUTING_GRAPH = os.environ.get("TMRT_ROUTING_GRAPH", os.path.join(MODEL_DIR, "bcn_routing.npz"))
+street_graphs = {}
+
+def get_street_graph(path):
+    if path not in street_graphs:
+        street_graphs[path] = routing.StreetGraph.load(path)
+    return street_graphs[path]
+
+# === Rasterization shared by the pipelines ===
+# GeoJSON is read in bulk (geojson_ingest.py); unusable features are skipped and
+# returned as issues for the status message instead of failing the request.
+def rasterize_inputs(footprints_str, trees_str, extent_str, pixel_size, green, pavement, timer=None):
+    phase = timer.phase if timer else (lambda name: nullcontext())
+    with phase("parse"):
+        extent_geom, issues = geojson_ingest.read_extent(extent_str)
+        minx, miny, maxx, maxy = extent_geom.bounds
+        rows, cols = tiled_inference.grid_shape(extent_geom.bounds, pixel_size, TILE_SIZE)
+        transform = from_origin(minx, maxy, pixel_size, pixel_size)
+
+        # === Parse buildings ===
+        footprints = geojson_ingest.read_layer(footprints_str, "footprints", kind="polygon")
+        building_heights = geojson_ingest.numeric_property(footprints.properties, "height", 0)
+        building_shapes = list(zip(footprints.geometries, building_heights))
+
+        # === Parse trees (points; radius from properties, circumference or species) ===
+        trees = geojson_ingest.read_layer(trees_str, "trees", kind="point")
+        tree_xy = geojson_ingest.point_coords(trees)
+        tree_heights = geojson_ingest.numeric_property(trees.properties, "height", 5)
+        tree_radii = canopy.radii_from_properties(trees.properties, default=TREE_RADIUS)
+
+    # === Rasterize ===
+    with phase("rasterize"):
+        dsm = rasterize(building_shapes, out_shape=(rows, cols), transform=transform, fill=0, dtype='float32') \
+            if building_shapes else np.zeros((rows, cols), dtype=np.float32)
+        cdsm = canopy.stamp_canopy(tree_xy[:, 0], tree_xy[:, 1], tree_heights, tree_radii, transform, (rows, cols))
+        building_mask = rasterize(footprints.geometries, out_shape=(rows, cols), transform=transform,
+                                   fill=1, default_value=0, dtype='uint8') \
+            if building_shapes else np.ones((rows, cols), dtype=np.uint8)
+
+    # === Parse Green and Pavement GeoJSONs ===
+    with phase("parse"):
+        green_areas = geojson_ingest.read_layer(green, "green", kind="polygon")
+        pavement_areas = geojson_ingest.read_layer(pavement, "pavement", kind="polygon")
+
+        green_shapes = list(green_areas.geometries)
+        pavement_shapes = list(pavement_areas.geometries)
+        for layer in (footprints, trees, green_areas, pavement_areas):
+            issues += layer.issues
+
+    with phase("rasterize"):
+        landuse = rasterize_landuse(rows, cols, transform, building_shapes, green_shapes, pavement_shapes)
+
+    return transform, dsm, cdsm, building_mask, landuse, issues
+
+
+def rasterize_landuse(rows, cols, transform, building_shapes, green_shapes, pavement_shapes):
+    # === Initialize landuse array
+    landuse = np.zeros((rows, cols), dtype=np.uint8)
+
+    # Step 1: Pavement
+    if pavement_shapes:
+        pavement_mask = rasterize(
+            [(g, 1) for g in pavement_shapes],
+            out_shape=(rows, cols),
+            transform=transform,
+            fill=0,
+            dtype='uint8'
+        )
+        landuse[pavement_mask == 1] = 1
+
+    # Step 2: Green 
+    if green_shapes:
+        green_mask = rasterize(
+            [(g, 5) for g in green_shapes],
+            out_shape=(rows, cols),
+            transform=transform,
+            fill=0,
+            dtype='uint8'
+        )
+        landuse[green_mask == 5] = 5
+
+    # Step 3: Buildings
+    if building_shapes:
+        building_geom = [g[0] for g in building_shapes]
+        building_mask = rasterize(
+            [(g, 2) for g in building_geom],
+            out_shape=(rows, cols),
+            transform=transform,
+            fill=0,
+            dtype='uint8'
+        )
+        landuse[building_mask == 2] = 2
+
+    return landuse
+
+
+def save_raster(path, array, dtype, transform):
+    rows, cols = array.shape
+    with rasterio.open(
+        path, 'w', driver='GTiff', height=rows, width=cols, count=1,
+        dtype=dtype, crs='EPSG:25831', transform=transform
+    ) as dst:
+        dst.write(array, 1)
+
+
+def save_png(path, array, building_mask, preset):
+    # LUT colormap + fast PNG (render.py); buildings (mask 0) in white
+    render.save_png(path, array, preset=preset, mask=building_mask == 0)
+
+
+def save_inputs(out_path, transform, dsm, cdsm, building_mask, landuse):
+    os.makedirs(out_path, exist_ok=True)
+    save_raster(os.path.join(out_path, "dsm.tif"), dsm, 'float32', transform)
+    save_raster(os.path.join(out_path, "cdsm.tif"), cdsm, 'float32', transform)
+    save_raster(os.path.join(out_path, "buildings.tif"), building_mask, 'uint8', transform)
+    save_raster(os.path.join(out_path, "combined_landuse.tif"), landuse, 'uint8', transform)
+
+
+def save_predictions(out_path, transform, svf_pred, pred_tmrt, building_mask):
+    save_raster(os.path.join(out_path, "predicted_svf.tif"), svf_pred, 'float32', transform)
+    save_png(os.path.join(out_path, "predicted_svf.png"), svf_pred, building_mask, "svf")
+
+    tmrt_tif_path = os.path.join(out_path, "predicted_tmrt.tif")
+    tmrt_png_path = os.path.join(out_path, "predicted_tmrt.png")
+    save_raster(tmrt_tif_path, pred_tmrt, 'float32', transform)
+    save_png(tmrt_png_path, pred_tmrt, building_mask, "tmrt")
+
+    if results_db is not None:
+        # Buildings out, as in the simulated rasters
+        ground_tmrt = np.where(building_mask == 0, np.nan, pred_tmrt)
+        results_writer.submit(store_prediction, ground_tmrt, transform,
+                              os.path.basename(os.path.normpath(out_path)), os.path.abspath(tmrt_tif_path))
+    return tmrt_png_path
+
 
 # === Flask + Hops Setup ===
 app = flask.Flask(__name__)
@@ -64,180 +239,366 @@ hops = hs.Hops(app)
     ]
 )
 def full_pipeline(footprints_str, trees_str, extent_str, pixel_size, out_path, green, pavement):
+    timer = profiling.PhaseTimer("full_svf_pipeline", backend=backend.name)
     try:
-        extent = json.loads(extent_str)
-        extent_geom = shape(extent["geometry"] if "geometry" in extent else extent["features"][0]["geometry"])
-        minx, miny, maxx, maxy = extent_geom.bounds
-        cols = rows = 128
-        transform = from_origin(minx, maxy, pixel_size, pixel_size)
+        result = run_full_pipeline(footprints_str, trees_str, extent_str, pixel_size, out_path, green, pavement, timer)
+        timer.finish(PROFILE_LOG)
+        return result
 
-        # === Parse buildings ===
-        footprints = json.loads(footprints_str)
-        building_shapes = [
-            (shape(f["geometry"]), float(f.get("properties", {}).get("height", 0)))
-            for f in footprints.get("features", [])
-        ]
-
-        # === Parse trees ===
-        trees = json.loads(trees_str)
-        tree_shapes = []
-        for f in trees.get("features", []):
-            props = f.get("properties", {})
-            height = float(props.get("height", 5))
-            radius = float(props.get("radius", 1.5))
-            geom = shape(f["geometry"])
-            if isinstance(geom, Point):
-                tree_shapes.append((geom.buffer(radius), height))
-
-        # === Rasterize ===
-        dsm = rasterize(building_shapes, out_shape=(rows, cols), transform=transform, fill=0, dtype='float32')
-        cdsm = rasterize(tree_shapes, out_shape=(rows, cols), transform=transform, fill=0, dtype='float32')
-        building_mask = rasterize([s[0] for s in building_shapes], out_shape=(rows, cols), transform=transform,
-                                   fill=1, default_value=0, dtype='uint8')
-
-        os.makedirs(out_path, exist_ok=True)
-
-        # === Parse Green and Pavement GeoJSONs ===
-        green_areas = json.loads(green)
-        pavement_areas = json.loads(pavement)
-
-        green_shapes = [shape(f["geometry"]) for f in green_areas.get("features", [])]
-        pavement_shapes = [shape(f["geometry"]) for f in pavement_areas.get("features", [])]
-
-        # === Initialize landuse array
-        landuse = np.zeros((rows, cols), dtype=np.uint8)
-
-        # Step 1: Pavement
-        if pavement_shapes:
-            pavement_mask = rasterize(
-                [(g, 1) for g in pavement_shapes],
-                out_shape=(rows, cols),
-                transform=transform,
-                fill=0,
-                dtype='uint8'
-            )
-            landuse[pavement_mask == 1] = 1
-
-        # Step 2: Green 
-        if green_shapes:
-            green_mask = rasterize(
-                [(g, 5) for g in green_shapes],
-                out_shape=(rows, cols),
-                transform=transform,
-                fill=0,
-                dtype='uint8'
-            )
-            landuse[green_mask == 5] = 5
-
-        # Step 3: Buildings
-        if building_shapes:
-            building_geom = [g[0] for g in building_shapes]
-            building_mask = rasterize(
-                [(g, 2) for g in building_geom],
-                out_shape=(rows, cols),
-                transform=transform,
-                fill=0,
-                dtype='uint8'
-            )
-            landuse[building_mask == 2] = 2
-
-
-        def save_raster(path, array, dtype):
-            with rasterio.open(
-                path, 'w', driver='GTiff', height=rows, width=cols, count=1,
-                dtype=dtype, crs='EPSG:25831', transform=transform
-            ) as dst:
-                dst.write(array, 1)
-
-        def save_png(path, array, cmap="Spectral_r", vmin=15, vmax=40):
-            cmap_func = plt.get_cmap(cmap)
-            norm = np.clip((array - vmin) / (vmax - vmin), 0, 1)
-            rgba = cmap_func(norm)[..., :3]
-            img = (rgba * 255).astype(np.uint8)
-            with rasterio.open(os.path.join(out_path, "buildings.tif")) as src:
-                mask_data = src.read(1)
-                img[mask_data == 0] = 255
-            Image.fromarray(img).save(path)
-
-        save_raster(os.path.join(out_path, "dsm.tif"), dsm, 'float32')
-        save_raster(os.path.join(out_path, "cdsm.tif"), cdsm, 'float32')
-        save_raster(os.path.join(out_path, "buildings.tif"), building_mask, 'uint8')
-        save_raster(os.path.join(out_path, "combined_landuse.tif"), landuse, 'uint8')
-
-        # === Predict SVF ===
-        dsm = np.nan_to_num(dsm)
-        cdsm = np.nan_to_num(cdsm)
-        dsm /= np.max(dsm) if np.max(dsm) > 0 else 1
-        cdsm /= np.max(cdsm) if np.max(cdsm) > 0 else 1
-
-        input_stack = np.stack([dsm, cdsm], axis=-1)
-        input_stack = np.expand_dims(input_stack, axis=0)
-        svf_pred = cnn_model.predict(input_stack, verbose=0)[0, ..., 0]
-
-        save_raster(os.path.join(out_path, "predicted_svf.tif"), svf_pred, 'float32')
-        save_png(os.path.join(out_path, "predicted_svf.png"), svf_pred, cmap="Spectral_r", vmin=15, vmax=40)
-
-        # === Contextual Features ===
-        def compute_contextual_features(dsm, buildings, patch_size=8):
-            h, w = dsm.shape
-            density_map = np.zeros_like(dsm, dtype=np.float32)
-            mean_height_map = np.zeros_like(dsm, dtype=np.float32)
-            for row in range(0, h, patch_size):
-                for col in range(0, w, patch_size):
-                    r_end = min(row + patch_size, h)
-                    c_end = min(col + patch_size, w)
-                    block_dsm = dsm[row:r_end, col:c_end]
-                    block_bld = buildings[row:r_end, col:c_end]
-                    area = block_dsm.size
-                    bld_area = np.sum(block_bld > 0)
-                    mean_h = np.mean(block_dsm)
-                    density = bld_area / area
-                    density_map[row:r_end, col:c_end] = density
-                    mean_height_map[row:r_end, col:c_end] = mean_h
-            return density_map, mean_height_map
-
-        svf = np.nan_to_num(svf_pred)
-        svf = np.clip(svf, 0, 1)
+    except Exception as e:
+        timer.finish(PROFILE_LOG, ok=False)
+        return f"❌ Error: {str(e)}", "", "[]"
+
+
+def run_full_pipeline(footprints_str, trees_str, extent_str, pixel_size, out_path, green, pavement, timer):
+    # Shared by /full_svf_pipeline and the job API; raises on failure
+    transform, dsm, cdsm, building_mask, landuse, issues = rasterize_inputs(
+        footprints_str, trees_str, extent_str, pixel_size, green, pavement, timer=timer
+    )
+    with timer.phase("write"):
+        save_inputs(out_path, transform, dsm, cdsm, building_mask, landuse)
+
+    # === Predict SVF + Tmrt over overlapping 128×128 tiles ===
+    # "features" = tiling, normalisation, tile batching and blending (everything but the models)
+    with timer.phase("tiled"):
+        dsm, cdsm = tiled_inference.normalise_heights(dsm, cdsm)
         buildings = np.clip(np.nan_to_num(building_mask), 0, 1)
-        density_map, mean_height_map = compute_contextual_features(dsm, buildings)
-        h, w = dsm.shape
-        xx, yy = np.meshgrid(np.arange(w), np.arange(h))
-        x_coord = xx / w
-        y_coord = yy / h
-
-        features = [
-            dsm, cdsm, svf, x_coord, y_coord, buildings,
-            density_map, mean_height_map
-        ]
-        x = np.stack(features, axis=-1).reshape(-1, len(features))
-        edge_index = []
-        for row in range(h):
-            for col in range(w):
-                idx = row * w + col
-                if col < w - 1:
-                    edge_index.append([idx, idx + 1])
-                if row < h - 1:
-                    edge_index.append([idx, idx + w])
-        edge_index = np.array(edge_index).T
-
-        graph = Data(
-            x=torch.tensor(x, dtype=torch.float),
-            edge_index=torch.tensor(edge_index, dtype=torch.long)
+
+        svf_pred, pred_tmrt = tiled_inference.predict_tiled(
+            dsm, cdsm, buildings, timer.wrap("cnn", backend.predict_svf), timer.wrap("gat", backend.predict_tmrt),
+            tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+            max_tiles=MAX_TILES, memory_limit_mb=MEMORY_LIMIT_MB
         )
+    timer.residual("tiled", ["cnn", "gat"], "features")
+
+    with timer.phase("write"):
+        tmrt_png_path = save_predictions(out_path, transform, svf_pred, pred_tmrt, building_mask)
+        matrix = json.dumps(pred_tmrt.tolist())
 
-        with torch.no_grad():
-            pred_tmrt = gnn_model(graph.x, graph.edge_index).cpu().numpy().reshape(h, w)
+    status = f"✅ Saved DSM, CDSM, SVF and Tmrt to {out_path}"
+    if issues:
+        status += f" ⚠️ {geojson_ingest.issues_summary(issues)}"
+    return status, tmrt_png_path, matrix
 
-        tmrt_tif_path = os.path.join(out_path, "predicted_tmrt.tif")
-        tmrt_png_path = os.path.join(out_path, "predicted_tmrt.png")
-        save_raster(tmrt_tif_path, pred_tmrt, 'float32')
-        save_png(tmrt_png_path, pred_tmrt, cmap="Spectral_r", vmin=15, vmax=40)
 
+@hops.component(
+    "/incremental_svf_pipeline",
+    name="Incremental SVF + Tmrt Pipeline",
+    description="Same as Full SVF + Tmrt Pipeline, but re-infers only the tiles touched by edits since the last call of the session",
+    inputs=[
+        hs.HopsString("Session", "Session", "Session id (one per Grasshopper definition)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Footprints", "Footprints", "Building footprints GeoJSON", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Trees", "Trees", "Tree GeoJSON with height and radius", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Extent", "Extent", "GeoJSON defining the bounds", access=hs.HopsParamAccess.ITEM),
+        hs.HopsNumber("PixelSize", "PixelSize", "Pixel size (in meters)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("OutPath", "PathFolder", "Folder to save all output files", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Green","Green","Green Area", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Pavement","Pavement","Pavement Area", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("Status", "Status", "Success or failure message"),
+        hs.HopsString("TmrtPNGPath", "Tmrt PNG", "Path to predicted_tmrt.png"),
+        hs.HopsString("TmrtMatrix", "Tmrt Matrix", "2D JSON array of Tmrt values")
+    ]
+)
+def incremental_pipeline(session_id, footprints_str, trees_str, extent_str, pixel_size, out_path, green, pavement):
+    timer = profiling.PhaseTimer("incremental_svf_pipeline", backend=backend.name)
+    try:
+        transform, dsm, cdsm, building_mask, landuse, issues = rasterize_inputs(
+            footprints_str, trees_str, extent_str, pixel_size, green, pavement, timer=timer
+        )
+        with timer.phase("write"):
+            save_inputs(out_path, transform, dsm, cdsm, building_mask, landuse)
+
+        with timer.phase("tiled"):
+            buildings = np.clip(np.nan_to_num(building_mask), 0, 1)
+            svf_pred, pred_tmrt, info = incremental.predict_incremental(
+                session_id, np.nan_to_num(dsm), np.nan_to_num(cdsm), buildings,
+                timer.wrap("cnn", backend.predict_svf), timer.wrap("gat", backend.predict_tmrt),
+                tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                max_tiles=MAX_TILES, memory_limit_mb=MEMORY_LIMIT_MB
+            )
+        timer.residual("tiled", ["cnn", "gat"], "features")
+        timer.extra.update(info)
+
+        with timer.phase("write"):
+            tmrt_png_path = save_predictions(out_path, transform, svf_pred, pred_tmrt, building_mask)
+            matrix = json.dumps(pred_tmrt.tolist())
+        timer.finish(PROFILE_LOG)
 
-        return f"✅ Saved DSM, CDSM, SVF and Tmrt to {out_path}", tmrt_png_path, json.dumps(pred_tmrt.tolist())
+        status = (
+            f"✅ {info['mode']}: re-inferred {info['svf_tiles']}/{info['tiles']} SVF and "
+            f"{info['tmrt_tiles']}/{info['tiles']} Tmrt tiles ({info['changed_px']} px changed) → {out_path}"
+        )
+        if issues:
+            status += f" ⚠️ {geojson_ingest.issues_summary(issues)}"
+        return status, tmrt_png_path, matrix
 
     except Exception as e:
+        timer.finish(PROFILE_LOG, ok=False)
         return f"❌ Error: {str(e)}", "", "[]"
 
+
+# === Job API: submit → poll status → fetch result (avoids Hops timeouts on large runs) ===
+@hops.component(
+    "/submit_svf_pipeline",
+    name="Submit SVF + Tmrt Job",
+    description="Starts the Full SVF + Tmrt Pipeline in the background and returns a job id; a new job cancels older ones of the same session",
+    inputs=[
+        hs.HopsString("Session", "Session", "Session id; older jobs of this session are cancelled (empty = keep them)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Footprints", "Footprints", "Building footprints GeoJSON", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Trees", "Trees", "Tree GeoJSON with height and radius", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Extent", "Extent", "GeoJSON defining the bounds", access=hs.HopsParamAccess.ITEM),
+        hs.HopsNumber("PixelSize", "PixelSize", "Pixel size (in meters)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("OutPath", "PathFolder", "Folder to save all output files", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Green","Green","Green Area", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Pavement","Pavement","Pavement Area", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("JobId", "JobId", "Id to poll with Job Status / Job Result"),
+        hs.HopsString("Status", "Status", "Success or failure message"),
+    ]
+)
+def submit_svf_pipeline(session_id, footprints_str, trees_str, extent_str, pixel_size, out_path, green, pavement):
+    def work(job):
+        timer = profiling.PhaseTimer("job_svf_pipeline", on_phase=job.progress, backend=backend.name, job=job.id)
+        try:
+            status, png_path, matrix = run_full_pipeline(
+                footprints_str, trees_str, extent_str, pixel_size, out_path, green, pavement, timer
+            )
+        except Exception:
+            timer.finish(PROFILE_LOG, ok=False)
+            raise
+        timer.finish(PROFILE_LOG)
+        return {"status": status, "png": png_path, "matrix": matrix}
+
+    try:
+        job_id = job_runner.submit("full_svf_pipeline", work, session=session_id or None, phases=JOB_PHASES)
+        return job_id, f"✅ Job {job_id} queued"
+    except Exception as e:
+        return "", f"❌ Error: {str(e)}"
+
+
+@hops.component(
+    "/job_status",
+    name="Job Status",
+    description="Status, current phase and progress (0–1) of a submitted job",
+    inputs=[
+        hs.HopsString("JobId", "JobId", "Id returned by a Submit … component (SVF + Tmrt Job or Design Optimization)", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("Status", "Status", "queued / running / done / failed / cancelled"),
+        hs.HopsString("Phase", "Phase", "Current phase and message"),
+        hs.HopsNumber("Progress", "Progress", "Fraction done (0–1)"),
+    ]
+)
+def job_status(job_id):
+    job = job_runner.store.get(job_id)
+    if job is None:
+        return f"❌ Error: unknown job {job_id}", "", 0.0
+    return job["status"], job["message"] or job["phase"] or "", float(job["progress"] or 0)
+
+
+@hops.component(
+    "/job_result",
+    name="Job Result",
+    description="Outputs of a finished SVF + Tmrt job (same as Full SVF + Tmrt Pipeline); design jobs: Design Result",
+    inputs=[
+        hs.HopsString("JobId", "JobId", "Id returned by a Submit … component (SVF + Tmrt Job or Design Optimization)", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("Status", "Status", "Success or failure message"),
+        hs.HopsString("TmrtPNGPath", "Tmrt PNG", "Path to predicted_tmrt.png"),
+        hs.HopsString("TmrtMatrix", "Tmrt Matrix", "2D JSON array of Tmrt values")
+    ]
+)
+def job_result(job_id):
+    job = job_runner.store.get(job_id)
+    if job is None:
+        return f"❌ Error: unknown job {job_id}", "", "[]"
+    if job["kind"] != "full_svf_pipeline":
+        return f"❌ Error: job {job_id} is a {job['kind']} job, use Design Result", "", "[]"
+    if job["status"] == jobs.DONE:
+        result = job["result"]
+        return result["status"], result["png"], result["matrix"]
+    if job["status"] in jobs.ACTIVE:
+        return f"⏳ {job['status']}: {job['message'] or job['phase'] or ''} ({100 * (job['progress'] or 0):.0f} %)", "", "[]"
+    return f"❌ Error: job {job['status']} ({job['message']})", "", "[]"
+
+
+# === Design optimization: NSGA-II over candidate trees + footprint heights, run as a job ===
+@hops.component(
+    "/submit_design_optimization",
+    name="Submit Design Optimization",
+    description="Searches tree placements and building heights for the Pareto set of mean Tmrt vs cost (background job)",
+    inputs=[
+        hs.HopsString("Session", "Session", "Session id; older jobs of this session are cancelled (empty = keep them)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Footprints", "Footprints", "Footprints GeoJSON: height, optional min_height / max_height / cost_per_m3", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Trees", "Trees", "Existing trees GeoJSON (kept)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Candidates", "Candidates", "Candidate tree points GeoJSON (height, radius, optional cost)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Extent", "Extent", "GeoJSON defining the bounds", access=hs.HopsParamAccess.ITEM),
+        hs.HopsNumber("PixelSize", "PixelSize", "Pixel size (in meters)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsNumber("Budget", "Budget", "Max cost (0 = unlimited)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsInteger("Population", "Population", "Designs per generation", access=hs.HopsParamAccess.ITEM),
+        hs.HopsInteger("Generations", "Generations", "Max generations", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("JobId", "JobId", "Id to poll with Job Status / Design Result"),
+        hs.HopsString("Status", "Status", "Success or failure message"),
+    ]
+)
+def submit_design_optimization(session_id, footprints_str, trees_str, candidates_str, extent_str, pixel_size,
+                               budget, population, generations):
+    population = int(population or design_optimizer.POPULATION)
+    generations = int(generations or design_optimizer.GENERATIONS)
+
+    def work(job):
+        timer = profiling.PhaseTimer("job_design_optimization", on_phase=job.progress, backend=backend.name, job=job.id)
+        try:
+            with timer.phase("parse"):
+                space = design_optimizer.DesignSpace(footprints_str, trees_str, candidates_str, extent_str,
+                                                     pixel_size, budget, tree_radius=TREE_RADIUS)
+            with timer.phase("search"):
+                front, stats = design_optimizer.optimize(
+                    space, backend, population, generations,
+                    log=lambda gen, hv, f: job.progress("search", 0.05 + 0.95 * gen / generations,
+                                                        f"generation {gen}/{generations}, {len(f)} on front")
+                )
+        except Exception:
+            timer.finish(PROFILE_LOG, ok=False)
+            raise
+        timer.extra.update({k: v for k, v in stats.items() if k != "hypervolume"})
+        timer.finish(PROFILE_LOG)
+        status = (f"✅ {len(front)} Pareto designs after {stats['generations']} generations "
+                  f"({stats['evaluated']} evaluated, {stats['cache_hits']} cached, stopped: {stats['stopped']})")
+        if space.issues:
+            status += f" ⚠️ {geojson_ingest.issues_summary(space.issues)}"
+        coolest = design_optimizer.trees_geojson(space, front[0]) if front else {}
+        return {"status": status, "pareto": front, "trees": coolest, "stats": stats}
+
+    try:
+        job_id = job_runner.submit("design_optimization", work, session=session_id or None,
+                                   phases={"parse": 0.01, "search": 0.05})
+        return job_id, f"✅ Job {job_id} queued"
+    except Exception as e:
+        return "", f"❌ Error: {str(e)}"
+
+
+@hops.component(
+    "/design_result",
+    name="Design Result",
+    description="Pareto set of a finished design optimization",
+    inputs=[
+        hs.HopsString("JobId", "JobId", "Id returned by Submit Design Optimization", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("Status", "Status", "Success or failure message"),
+        hs.HopsString("Pareto", "Pareto", "JSON list of designs (tmrt_mean, cost, trees, heights), coolest first"),
+        hs.HopsString("CoolestTrees", "Coolest Trees", "GeoJSON of the trees planted in the coolest design"),
+    ]
+)
+def design_result(job_id):
+    job = job_runner.store.get(job_id)
+    if job is None:
+        return f"❌ Error: unknown job {job_id}", "[]", "{}"
+    if job["kind"] != "design_optimization":
+        return f"❌ Error: job {job_id} is a {job['kind']} job, use Job Result", "[]", "{}"
+    if job["status"] == jobs.DONE:
+        result = job["result"]
+        return result["status"], json.dumps(result["pareto"]), json.dumps(result["trees"])
+    if job["status"] in jobs.ACTIVE:
+        return f"⏳ {job['status']}: {job['message'] or job['phase'] or ''} ({100 * (job['progress'] or 0):.0f} %)", "[]", "{}"
+    return f"❌ Error: job {job['status']} ({job['message']})", "[]", "{}"
+
+
+@hops.component(
+    "/cancel_job",
+    name="Cancel Job",
+    description="Cancels a queued or running job (it stops at its next phase)",
+    inputs=[
+        hs.HopsString("JobId", "JobId", "Id returned by a Submit … component (SVF + Tmrt Job or Design Optimization)", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("Status", "Status", "Success or failure message"),
+    ]
+)
+def cancel_job(job_id):
+    if job_runner.cancel(job_id):
+        return f"✅ Job {job_id} cancelled"
+    job = job_runner.store.get(job_id)
+    return f"⚠️ Job {job_id} not active ({job['status']})" if job else f"❌ Error: unknown job {job_id}"
+
+
+@hops.component(
+    "/street_tmrt",
+    name="Street Tmrt Predictor",
+    description="Scores every street segment with the XGBoost Tmrt model",
+    inputs=[
+        hs.HopsString("Streets", "Streets", "CSV or Parquet with street features (C_Tram, heights, buffer, trees, angle)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("OutPath", "OutPath", "CSV or Parquet file to write (leave empty to skip)", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("Status", "Status", "Success or failure message"),
+        hs.HopsString("TmrtByStreet", "Tmrt By Street", "JSON object C_Tram → predicted Tmrt"),
+    ]
+)
+def street_tmrt(streets_path, out_path):
+    try:
+        result = street_predictor.score_streets(
+            STREET_MODEL, streets_path, out_path or None, predictor=get_street_predictor(STREET_MODEL)
+        )
+        scored = result[["C_Tram", street_predictor.PREDICTION]].dropna()
+        values = dict(zip(scored["C_Tram"].astype(str), scored[street_predictor.PREDICTION].round(2).astype(float)))
+        return f"✅ Scored {len(values)}/{len(result)} streets", json.dumps(values)
+
+    except Exception as e:
+        return f"❌ Error: {str(e)}", "{}"
+
+def point_input(text, name):
+    # GeoJSON point or "x,y"
+    if text and text.strip()[:1] not in "{[":
+        x, y = (float(v) for v in text.replace(";", ",").split(",")[:2])
+        return x, y
+    xy = geojson_ingest.point_coords(geojson_ingest.read_layer(text, name, kind="point"))
+    if not len(xy):
+        raise ValueError(f"{name} needs a GeoJSON point or 'x,y'")
+    return float(xy[0, 0]), float(xy[0, 1])
+
+
+@hops.component(
+    "/cool_route",
+    name="Cool Route",
+    description="Shortest, coolest or exposure-limited walking route over the street graph, weighted by Tmrt",
+    inputs=[
+        hs.HopsString("Start", "Start", "GeoJSON point or 'x,y' (EPSG:25831)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("End", "End", "GeoJSON point or 'x,y' (EPSG:25831)", access=hs.HopsParamAccess.ITEM),
+        hs.HopsString("Mode", "Mode", "shortest, coolest or limit", access=hs.HopsParamAccess.ITEM),
+        hs.HopsNumber("Alpha", "Alpha", "coolest: metres of detour per °C·m of exposure avoided", access=hs.HopsParamAccess.ITEM),
+        hs.HopsNumber("ExposureLimit", "ExposureLimit", "limit: max exposure in °C·m above the comfort Tmrt", access=hs.HopsParamAccess.ITEM),
+    ],
+    outputs=[
+        hs.HopsString("Status", "Status", "Success or failure message"),
+        hs.HopsString("Route", "Route", "GeoJSON LineString feature of the route"),
+        hs.HopsString("Stats", "Stats", "JSON: length, exposure, mean / max Tmrt, query time"),
+    ]
+)
+def cool_route(start, end, mode, alpha, exposure_limit):
+    try:
+        graph = get_street_graph(ROUTING_GRAPH)
+        mode = (mode or "coolest").strip().lower()
+        edges, stats = graph.route(
+            point_input(start, "Start"), point_input(end, "End"), mode,
+            alpha=routing.ALPHA if alpha is None else float(alpha),
+            limit=None if exposure_limit is None else float(exposure_limit)
+        )
+        status = (f"✅ {mode}: {stats['length_m']} m, mean Tmrt {stats['tmrt_mean']} °C, "
+                  f"{stats['exposure_Cm']} °C·m exposure ({stats['query_ms']} ms)")
+        if not stats["feasible"]:
+            status += " ⚠️ no route meets the exposure limit, coolest route returned"
+        return status, json.dumps(graph.geojson(edges, stats)), json.dumps(stats)
+
+    except Exception as e:
+        return f"❌ Error: {str(e)}", "{}", "{}"
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,457 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import importlib
+import subprocess
+import contextlib
+import numpy as np
+
+import tiled_inference
+import canopy
+
+# ----------------------------------------------------------------------------------
+# 📊 Benchmarks for the inference and preprocessing hot paths
+# ----------------------------------------------------------------------------------
+# Synthetic scenes (footprints / trees / green / pavement GeoJSON, same schema as the
+# Hops inputs) at several grid sizes and densities, fixed seed → same scene on every
+# machine. Cases:
+#   full_pipeline     app.full_pipeline end-to-end, phases from its profiling record
+#                     (needs the models of TMRT_BACKEND; skipped when they do not load)
+#   patch_rasterize   building / canopy / landuse rasterization of the patch notebook
+#   contextual        tiled_inference.compute_contextual_features
+#   edge_index        grid + batched edge index of the GAT, graph_builder.graph_arrays
+#   zonal             process_files of workflow/04_tif_to_data_Ver2 (mask + stats + JSON)
+# Every run is appended to a JSON history; "compare" reports the median ratio per case
+# and flags regressions above a threshold.
+# Usage:
+#   python benchmark_suite.py run --label baseline
+#   python benchmark_suite.py run --sizes 128 256 --cases contextual zonal --label after-fix
+#   python benchmark_suite.py compare --base baseline --head after-fix --fail-on-regression
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORKFLOW_DIR = os.path.join(HERE, "..", "workflow")
+
+SIZES = [128, 256, 512]  # px per side, 1 m pixels
+DENSITIES = {
+    # share of 16 m blocks holding a building, trees per hectare
+    "sparse": {"built": 0.25, "trees": 20},
+    "medium": {"built": 0.5, "trees": 60},
+    "dense": {"built": 0.8, "trees": 150},
+}
+BLOCK = 16.0  # m
+CASES = ["full_pipeline", "patch_rasterize", "contextual", "edge_index", "zonal"]
+HISTORY_PATH = "benchmark_history.json"
+REPEAT = 5
+WARMUP = 1
+THRESHOLD = 0.10  # relative slowdown flagged as a regression
+MIN_DELTA = 0.001  # s, below this a slowdown is noise
+
+
+# === Synthetic scenes
+def feature_collection(features):
+    return {"type": "FeatureCollection", "features": features}
+
+
+def polygon_feature(minx, miny, maxx, maxy, **properties):
+    ring = [[minx, miny], [maxx, miny], [maxx, maxy], [minx, maxy], [minx, miny]]
+    return {"type": "Feature", "properties": properties, "geometry": {"type": "Polygon", "coordinates": [ring]}}
+
+
+def make_scene(size, density="medium", seed=42, pixel_size=1.0, origin=(430000.0, 4580000.0)):
+    """Block layout: buildings on a 16 m lattice, streets between the block rows, trees off the buildings."""
+    rng = np.random.default_rng(seed)
+    settings = DENSITIES[density]
+    x0, y0 = origin
+    extent_m = size * pixel_size
+
+    starts = np.arange(0, extent_m - BLOCK + 1e-6, BLOCK)
+    bx, by = [a.ravel() for a in np.meshgrid(starts, starts)]
+    street_rows = (np.round(by / BLOCK) % 4) == 3  # every fourth block row is a street
+    built = (rng.random(len(bx)) < settings["built"]) & ~street_rows
+    w = rng.uniform(8, 15, len(bx))
+    h = rng.uniform(8, 15, len(bx))
+    heights = np.round(rng.uniform(6, 40, len(bx)), 1)
+    buildings = [
+        polygon_feature(x0 + bx[i] + 0.5, y0 + by[i] + 0.5, x0 + bx[i] + 0.5 + w[i], y0 + by[i] + 0.5 + h[i],
+                        height=float(heights[i]))
+        for i in np.flatnonzero(built)
+    ]
+
+    n_trees = int(round(settings["trees"] * extent_m * extent_m / 10000))
+    tx, ty = rng.uniform(0, extent_m, n_trees), rng.uniform(0, extent_m, n_trees)
+    ix = np.minimum((tx // BLOCK).astype(np.int64), len(starts) - 1)
+    iy = np.minimum((ty // BLOCK).astype(np.int64), len(starts) - 1)
+    free = ~built[iy * len(starts) + ix]
+    trees = [
+        {"type": "Feature",
+         "properties": {"height": float(np.round(rng.uniform(4, 15), 1)), "radius": float(np.round(rng.uniform(1.5, 4), 1))},
+         "geometry": {"type": "Point", "coordinates": [x0 + float(tx[i]), y0 + float(ty[i])]}}
+        for i in np.flatnonzero(free)
+    ]
+
+    green = [
+        polygon_feature(x0 + bx[i], y0 + by[i], x0 + bx[i] + BLOCK, y0 + by[i] + BLOCK)
+        for i in np.flatnonzero(~built & ~street_rows & (rng.random(len(bx)) < 0.3))
+    ]
+    pavement = [
+        polygon_feature(x0, y0 + r, x0 + extent_m, y0 + r + BLOCK)
+        for r in np.unique(by[street_rows])
+    ]
+    extent = polygon_feature(x0, y0, x0 + extent_m, y0 + extent_m)
+
+    return {
+        "size": size, "density": density, "pixel_size": pixel_size, "origin": origin,
+        "footprints": json.dumps(feature_collection(buildings)),
+        "trees": json.dumps(feature_collection(trees)),
+        "green": json.dumps(feature_collection(green)),
+        "pavement": json.dumps(feature_collection(pavement)),
+        "extent": json.dumps(extent),
+        "n_buildings": len(buildings), "n_trees": len(trees),
+    }
+
+
+# === Timing
+def time_calls(fn, repeat=REPEAT, warmup=WARMUP):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def summarize_times(times):
+    times = np.asarray(times, dtype=np.float64)
+    return {
+        "median_s": round(float(np.median(times)), 6),
+        "min_s": round(float(times.min()), 6),
+        "mean_s": round(float(times.mean()), 6),
+        "std_s": round(float(times.std()), 6),
+        "repeat": int(len(times)),
+    }
+
+
+# === Cases (each returns the timed callable and the app profile log, if any, for one scene)
+def case_full_pipeline(scene, workdir):
+    app = load_app()
+    log = os.path.join(workdir, "app_profile.jsonl")
+    out = os.path.join(workdir, "app_out")
+    app.PROFILE_LOG = log
+
+    def run():
+        status, _, _ = app.full_pipeline(scene["footprints"], scene["trees"], scene["extent"],
+                                         scene["pixel_size"], out, scene["green"], scene["pavement"])
+        if status.startswith("❌"):
+            raise RuntimeError(status)
+    return run, log
+
+
+def notebook_rasterize(buildings, heights, trees, tree_heights, tree_radii, landuse_shapes, transform, shape):
+    # Loops of 01_get_urban_notebook_Ver5 cell 6, without the file writes
+    from rasterio import features
+
+    dsm = np.zeros(shape, dtype=np.float32)
+    tree_dsm = np.zeros(shape, dtype=np.float32)
+    for geom, height in zip(buildings, heights):
+        if height > 0:
+            mask = features.geometry_mask([geom], transform=transform, invert=True, out_shape=shape)
+            dsm[mask] = np.maximum(dsm[mask], height)
+    canopy.stamp_canopy(trees[:, 0], trees[:, 1], tree_heights, tree_radii, transform, shape, out=tree_dsm)
+    landuse = features.rasterize(landuse_shapes, out_shape=shape, transform=transform, fill=0, dtype="uint8") \
+        if landuse_shapes else np.zeros(shape, dtype=np.uint8)
+    building_mask = np.zeros(shape, dtype=np.uint8)
+    for geom in buildings:
+        mask = features.geometry_mask([geom], transform=transform, invert=True, out_shape=shape)
+        building_mask[mask] = 1
+    combined = np.full_like(landuse, 1)
+    combined[landuse == 2] = 5
+    combined[building_mask == 1] = 2
+    return dsm, tree_dsm * (dsm == 0), combined
+
+
+def case_patch_rasterize(scene, workdir):
+    from shapely.geometry import shape
+    from rasterio.transform import from_origin
+
+    footprints = json.loads(scene["footprints"])["features"]
+    buildings = [shape(f["geometry"]) for f in footprints]
+    heights = [f["properties"]["height"] for f in footprints]
+    trees = json.loads(scene["trees"])["features"]
+    tree_xy = np.array([f["geometry"]["coordinates"] for f in trees], dtype=np.float64).reshape(-1, 2)
+    tree_heights = np.array([f["properties"]["height"] for f in trees], dtype=np.float64)
+    tree_radii = canopy.radii_from_properties([f["properties"] for f in trees])
+    landuse_shapes = [(shape(f["geometry"]), 2) for f in json.loads(scene["green"])["features"]]
+    x0, y0 = scene["origin"]
+    size, px = scene["size"], scene["pixel_size"]
+    transform = from_origin(x0, y0 + size * px, px, px)
+
+    def run():
+        notebook_rasterize(buildings, heights, tree_xy, tree_heights, tree_radii, landuse_shapes,
+                           transform, (size, size))
+    return run, None
+
+
+def synthetic_rasters(size, density, seed=42):
+    rng = np.random.default_rng(seed)
+    built = rng.random((size, size)) < DENSITIES[density]["built"] * 0.6
+    dsm = np.where(built, rng.uniform(6, 40, (size, size)), 0).astype(np.float32)
+    return dsm, built.astype(np.float32)
+
+
+def case_contextual(scene, workdir):
+    dsm, buildings = synthetic_rasters(scene["size"], scene["density"])
+
+    def run():
+        tiled_inference.compute_contextual_features(dsm, buildings)
+    return run, None
+
+
+def patch_json(scene, path):
+    # street_geo_with_mrt.json layout read by graph_builder.graph_arrays
+    x0, y0 = scene["origin"]
+    footprints = json.loads(scene["footprints"])["features"]
+    buildings = [
+        {"footprint": [[x - x0, y - y0] for x, y in f["geometry"]["coordinates"][0]], "height": f["properties"]["height"]}
+        for f in footprints
+    ]
+    extent_m = scene["size"] * scene["pixel_size"]
+    street = [[0, 3 * BLOCK], [extent_m, 3 * BLOCK], [extent_m, 4 * BLOCK], [0, 4 * BLOCK]]
+    data = {"street": street, "buildings": buildings,
+            "street_attributes": {"area": extent_m * BLOCK, "width": BLOCK, "mrt_mean": 40.0}}
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def case_edge_index(scene, workdir):
+    import graph_builder
+
+    size = scene["size"]
+    tile = tiled_inference.TILE_SIZE
+    n_tiles = len(tiled_inference.plan_tiles(size, size, max_tiles=None))
+    path = os.path.join(workdir, "street_geo_with_mrt.json")
+    patch_json(scene, path)
+
+    def run():
+        edge_index = tiled_inference.grid_edge_index(tile, tile)
+        tiled_inference.batch_edge_index(edge_index, tile * tile, n_tiles)
+        graph_builder.graph_arrays(path)
+    return run, None
+
+
+def load_workflow_module(name):
+    if WORKFLOW_DIR not in sys.path:
+        sys.path.insert(0, WORKFLOW_DIR)
+    return importlib.import_module(name)
+
+
+def case_zonal(scene, workdir):
+    import rasterio
+    from rasterio.transform import from_origin
+
+    module = load_workflow_module("04_tif_to_data_Ver2")
+    size, px = scene["size"], scene["pixel_size"]
+    x0, y0 = scene["origin"]
+    transform = from_origin(x0, y0 + size * px, px, px)
+    rng = np.random.default_rng(0)
+    tmrt = rng.uniform(25, 65, (size, size)).astype(np.float32)
+    tif_path = os.path.join(workdir, "Tmrt_average.tif")
+    with rasterio.open(tif_path, "w", driver="GTiff", height=size, width=size, count=1,
+                       dtype="float32", crs="EPSG:25831", transform=transform) as dst:
+        dst.write(tmrt, 1)
+
+    extent_m = size * px
+    street = polygon_feature(x0, y0 + 3 * BLOCK, x0 + extent_m, y0 + 4 * BLOCK, type="street")
+    total = feature_collection([street] + json.loads(scene["footprints"])["features"])
+    geojson_path = os.path.join(workdir, "total.geojson")
+    with open(geojson_path, "w") as f:
+        json.dump(total, f)
+    rotated_path = os.path.join(workdir, "street_geo.json")
+    patch_json(scene, rotated_path)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            module.process_files(geojson_path, tif_path, rotated_path)
+    return run, None
+
+
+CASE_FUNCS = {
+    "full_pipeline": case_full_pipeline,
+    "patch_rasterize": case_patch_rasterize,
+    "contextual": case_contextual,
+    "edge_index": case_edge_index,
+    "zonal": case_zonal,
+}
+# Cases whose input does not depend on the scene density run once per size
+DENSITY_FREE = {"edge_index"}
+
+_app = None
+
+
+def load_app():
+    global _app
+    if _app is None:
+        os.environ.setdefault("TMRT_MAX_TILES", "0")
+        # Repeats must not fill the results store (nor time its writes)
+        os.environ["TMRT_RESULTS_DB"] = ""
+        _app = importlib.import_module("app")
+    return _app
+
+
+def phase_medians(log):
+    # Median per phase over the timed runs (warmup records dropped)
+    if not log or not os.path.exists(log):
+        return None
+    import profiling
+
+    records = [r for r in profiling.read_records(log) if r.get("kind") == "request"]
+    records = records[WARMUP:] if len(records) > WARMUP else records
+    names = sorted({p for r in records for p in r["phases"]})
+    return {p: round(float(np.median([r["phases"].get(p, 0.0) for r in records])), 6) for p in names}
+
+
+# === Run / history
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "backend": os.environ.get("TMRT_BACKEND", "native"),
+    }
+
+
+def run_suite(cases=CASES, sizes=SIZES, densities=tuple(DENSITIES), repeat=REPEAT, seed=42):
+    results = {}
+    for size in sizes:
+        for density in densities:
+            scene = make_scene(size, density, seed)
+            for case in cases:
+                if case in DENSITY_FREE and density != densities[0]:
+                    continue
+                key = f"{case}/{size}" if case in DENSITY_FREE else f"{case}/{size}/{density}"
+                workdir = tempfile.mkdtemp(prefix="tmrt_bench_")
+                try:
+                    fn, log = CASE_FUNCS[case](scene, workdir)
+                    result = summarize_times(time_calls(fn, repeat))
+                    phases = phase_medians(log)
+                    if phases:
+                        result["phases"] = phases
+                    result.update(n_buildings=scene["n_buildings"], n_trees=scene["n_trees"])
+                    print(f"✅ {key:<32}{1000 * result['median_s']:>10.1f} ms")
+                except Exception as e:
+                    result = {"skipped": f"{type(e).__name__}: {e}"}
+                    print(f"⚠️ {key:<32} skipped ({result['skipped']})")
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+                results[key] = result
+    return results
+
+
+def load_history(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"runs": []}
+
+
+def save_history(path, history):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def find_run(history, ref):
+    # ref = label, commit or index into the history (-1 = latest)
+    runs = history["runs"]
+    if not runs:
+        raise ValueError("Benchmark history is empty")
+    if ref is None:
+        return runs[-1]
+    matches = [r for r in runs if ref in (r.get("label"), r["env"].get("commit"))]
+    if matches:
+        return matches[-1]
+    try:
+        return runs[int(ref)]
+    except (ValueError, IndexError):
+        raise ValueError(f"No run labelled {ref!r} in the benchmark history")
+
+
+def compare_runs(base, head, threshold=THRESHOLD, min_delta=MIN_DELTA):
+    rows, regressions = [], []
+    for key in sorted(set(base["results"]) & set(head["results"])):
+        b, h = base["results"][key], head["results"][key]
+        if "median_s" not in b or "median_s" not in h:
+            continue
+        ratio = h["median_s"] / max(b["median_s"], 1e-12)
+        regressed = ratio > 1 + threshold and h["median_s"] - b["median_s"] > min_delta
+        rows.append((key, b["median_s"], h["median_s"], ratio, regressed))
+        if regressed:
+            regressions.append(key)
+    return rows, regressions
+
+
+def format_comparison(base, head, rows, threshold=THRESHOLD):
+    lines = [f"base: {base.get('label') or base['env'].get('commit')}   head: {head.get('label') or head['env'].get('commit')}",
+             f"{'case':<34}{'base ms':>10}{'head ms':>10}{'ratio':>8}"]
+    for key, b, h, ratio, regressed in rows:
+        flag = "  ❌ regression" if regressed else ("  ✅" if ratio < 1 - threshold else "")
+        lines.append(f"{key:<34}{1000 * b:>10.1f}{1000 * h:>10.1f}{ratio:>8.2f}{flag}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inference and preprocessing hot paths")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run")
+    run.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    run.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    run.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    run.add_argument("--repeat", type=int, default=REPEAT)
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--label", default="")
+    run.add_argument("--history", default=HISTORY_PATH)
+    run.add_argument("--no-save", action="store_true")
+    compare = sub.add_parser("compare")
+    compare.add_argument("--history", default=HISTORY_PATH)
+    compare.add_argument("--base", default="-2", help="Label, commit or index (default: previous run)")
+    compare.add_argument("--head", default="-1", help="Label, commit or index (default: latest run)")
+    compare.add_argument("--threshold", type=float, default=THRESHOLD)
+    compare.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    if args.command == "run":
+        env = environment()
+        print(f"▶️ {len(args.cases)} case(s) × sizes {args.sizes} × {args.densities} ({args.repeat} repeats, commit {env['commit'] or '?'})")
+        results = run_suite(args.cases, args.sizes, tuple(args.densities), args.repeat, args.seed)
+        if not args.no_save:
+            history["runs"].append({"ts": time.time(), "label": args.label, "env": env, "seed": args.seed, "results": results})
+            save_history(args.history, history)
+            print(f"✅ Run appended to: {args.history}")
+        return 0
+
+    base, head = find_run(history, args.base), find_run(history, args.head)
+    rows, regressions = compare_runs(base, head, args.threshold)
+    print(format_comparison(base, head, rows, args.threshold))
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------------------------------
+# 🌳 Canopy rasterization shared by the patch notebook, the Hops server and the
+#    street feature table
+# ----------------------------------------------------------------------------------
+# Crown radius per tree, first match wins:
+#   1. explicit "radius" property (m)
+#   2. trunk circumference (cm) → DBH → crown radius (linear urban allometry)
+#   3. species lookup (most common Barcelona street trees)
+#   4. default radius of the caller
+# Radii are limited to MIN_RADIUS–MAX_RADIUS (0.5–8 m); clipped values are reported.
+# All trees are stamped at once: radii are rounded up to RADIUS_STEP classes that
+# only pick a precomputed window of pixel offsets, and the exact in-crown test
+# against each tree's own radius (pixel centre within the radius, as rasterio does
+# for a buffered point) runs over a (trees × offsets) array per class. Overlaps
+# keep the tallest crown.
+
+DEFAULT_RADIUS = 3.0  # m, radius used by the patch notebook
+RADIUS_STEP = 0.5  # m, radius class width for the offset windows
+MIN_RADIUS, MAX_RADIUS = 0.5, 8.0  # m, crown radii outside are clipped
+CHUNK_ELEMENTS = 4_000_000  # trees × offsets per stamping step
+
+RADIUS_KEYS = ("radius",)
+CIRCUMFERENCE_KEYS = ("circumfere", "circumference", "perimetre")
+SPECIES_KEYS = ("species", "nom_cientific", "cat_especie", "especie")
+
+# Mature crown radius (m) of common Barcelona street trees
+SPECIES_RADIUS = {
+    "platanus": 5.0,
+    "celtis": 4.0,
+    "tipuana": 5.0,
+    "styphnolobium": 3.5,
+    "sophora": 3.5,
+    "jacaranda": 3.5,
+    "ulmus": 3.5,
+    "populus": 3.5,
+    "pinus": 4.0,
+    "melia": 3.0,
+    "ligustrum": 2.5,
+    "robinia": 3.0,
+    "tilia": 3.5,
+    "acer": 3.0,
+    "morus": 3.0,
+    "lagunaria": 2.0,
+    "brachychiton": 2.5,
+    "koelreuteria": 2.5,
+    "prunus": 2.0,
+    "citrus": 1.5,
+    "washingtonia": 2.0,
+    "phoenix": 3.0,
+}
+
+
+# === Radius
+def radius_from_circumference(circumference_cm):
+    # DBH (cm) = C / π; crown radius ≈ 0.5 m + 0.05 m per cm DBH
+    dbh = np.asarray(circumference_cm, dtype=np.float64) / np.pi
+    return 0.5 + 0.05 * dbh
+
+
+def radius_from_species(species):
+    genus = pd.Series(species, dtype="object").astype(str).str.strip().str.split().str[0].str.lower()
+    return genus.map(SPECIES_RADIUS).to_numpy(dtype=np.float64)
+
+
+def crown_radius(radius=None, circumference=None, species=None, default=DEFAULT_RADIUS, n=None):
+    # Any argument may be None or an array with NaN where unknown
+    sizes = [len(a) for a in (radius, circumference, species) if a is not None]
+    n = n if n is not None else (sizes[0] if sizes else 0)
+    out = np.full(n, np.nan)
+    if radius is not None:
+        out = np.asarray(pd.to_numeric(pd.Series(radius), errors="coerce"), dtype=np.float64)
+    if circumference is not None:
+        c = np.asarray(pd.to_numeric(pd.Series(circumference), errors="coerce"), dtype=np.float64)
+        c = np.where(c > 0, c, np.nan)
+        out = np.where(np.isfinite(out), out, radius_from_circumference(c))
+    if species is not None:
+        out = np.where(np.isfinite(out), out, radius_from_species(species))
+    out = np.where(np.isfinite(out) & (out > 0), out, default)
+    clipped = (out < MIN_RADIUS) | (out > MAX_RADIUS)
+    if clipped.any():
+        print(f"⚠️ {int(clipped.sum())} crown radii outside {MIN_RADIUS:g}–{MAX_RADIUS:g} m were clipped")
+    return np.clip(out, MIN_RADIUS, MAX_RADIUS)
+
+
+def _first_column(columns, keys):
+    return next((k for k in keys if k in columns), None)
+
+
+def radii_from_frame(df, default=DEFAULT_RADIUS):
+    # GeoDataFrame / DataFrame of trees (bcn_trees.geojson, Street_Trees_*.csv)
+    cols = {kind: _first_column(df.columns, keys)
+            for kind, keys in (("radius", RADIUS_KEYS), ("circumference", CIRCUMFERENCE_KEYS), ("species", SPECIES_KEYS))}
+    return crown_radius(
+        *(df[cols[k]].to_numpy() if cols[k] else None for k in ("radius", "circumference", "species")),
+        default=default, n=len(df)
+    )
+
+
+def radii_from_properties(properties, default=DEFAULT_RADIUS):
+    # List of GeoJSON feature property dicts (Hops input)
+    return radii_from_frame(pd.DataFrame.from_records(properties, index=range(len(properties))), default)
+
+
+# === Stamping
+_windows = {}
+
+
+def offset_window(radius_px):
+    # Pixel offsets that can hold a crown centre within radius_px of a point in pixel (0, 0)
+    key = round(float(radius_px), 6)
+    if key not in _windows:
+        half = int(np.ceil(radius_px)) + 1
+        dy, dx = np.mgrid[-half:half + 1, -half:half + 1]
+        gap_y, gap_x = np.maximum(np.abs(dy) - 0.5, 0), np.maximum(np.abs(dx) - 0.5, 0)
+        keep = np.hypot(gap_y, gap_x) <= radius_px
+        _windows[key] = (dy[keep].ravel(), dx[keep].ravel())
+    return _windows[key]
+
+
+def stamp_canopy(xs, ys, heights, radii, transform, shape, profile="disk", crown_base=0.5, out=None):
+    """Rasterize all tree crowns into a canopy height grid.
+
+    xs, ys, heights and radii are per-tree arrays in map units. transform is a
+    north-up rasterio Affine. profile="disk" gives a flat crown at tree height
+    (same as rasterizing point.buffer(radius)); profile="dome" drops to
+    crown_base × height at the crown edge. Trees with height <= 0 are skipped.
+    """
+    rows, cols = shape
+    out = np.zeros(shape, dtype=np.float32) if out is None else out
+    xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), xs.shape)
+    keep = np.isfinite(xs) & np.isfinite(ys) & np.isfinite(heights) & (heights > 0)
+    if not keep.any():
+        return out
+    xs, ys, heights, radii = xs[keep], ys[keep], heights[keep], radii[keep]
+
+    # Fractional pixel coordinates (pixel centres at +0.5)
+    px, py = transform.a, -transform.e
+    col_f = (xs - transform.c) / px
+    row_f = (transform.f - ys) / py
+    row0, col0 = np.floor(row_f).astype(np.int64), np.floor(col_f).astype(np.int64)
+
+    # The class only picks the offset window (rounded up, so it holds the whole crown)
+    classes = np.ceil(radii / RADIUS_STEP - 1e-9).astype(np.int64)
+    r_tree = radii / px
+    flat = out.reshape(-1)
+    for cls in np.unique(classes):
+        sel = np.flatnonzero(classes == cls)
+        dy, dx = offset_window(cls * RADIUS_STEP / px)
+        step = max(1, CHUNK_ELEMENTS // len(dy))
+        for start in range(0, len(sel), step):
+            t = sel[start:start + step]
+            rr = row0[t, None] + dy[None, :]
+            cc = col0[t, None] + dx[None, :]
+            r_px = r_tree[t, None]
+            dist = np.hypot(rr + 0.5 - row_f[t, None], cc + 0.5 - col_f[t, None])
+            inside = (dist <= r_px) & (rr >= 0) & (rr < rows) & (cc >= 0) & (cc < cols)
+            if profile == "dome":
+                frac = np.clip(dist / r_px, 0, 1)
+                value = heights[t, None] * (crown_base + (1 - crown_base) * np.sqrt(1 - frac ** 2))
+            else:
+                value = np.broadcast_to(heights[t, None], dist.shape)
+            np.maximum.at(flat, rr[inside] * cols + cc[inside], value[inside].astype(np.float32))
+    return out
+
+
+def canopy_area(radii):
+    return np.pi * np.asarray(radii, dtype=np.float64) ** 2
@@ -0,0 +1,105 @@
+import torch
+import torch.nn.functional as F
+from torch.nn import Linear, Parameter
+
+# ----------------------------------------------------------------------------------
+# ⚡ Dense re-expression of TmrtGAT on the regular pixel grid
+# ----------------------------------------------------------------------------------
+# The grid graph built for TmrtGAT only has edges left→right (idx → idx+1) and
+# top→bottom (idx → idx+w). GATConv aggregates source → target and adds self loops,
+# so every pixel attends over a fixed 3-point stencil: itself, its left neighbour
+# and its upper neighbour. Here that stencil is evaluated with shifted dense
+# tensors instead of scatter-based message passing, using the same weights.
+
+NEG_INF = -1e9
+
+
+def _shift(t, dim):
+    # Value of the previous pixel along `dim` (left for W, up for H), zero-padded
+    pad = torch.zeros_like(t.narrow(dim, 0, 1))
+    return torch.cat([pad, t.narrow(dim, 0, t.size(dim) - 1)], dim=dim)
+
+
+class DenseGATLayer(torch.nn.Module):
+    def __init__(self, in_channels, out_channels, heads, concat, negative_slope=0.2):
+        super().__init__()
+        self.heads = heads
+        self.out_channels = out_channels
+        self.concat = concat
+        self.negative_slope = negative_slope
+        self.lin = Linear(in_channels, heads * out_channels, bias=False)
+        self.att_src = Parameter(torch.zeros(heads, out_channels))
+        self.att_dst = Parameter(torch.zeros(heads, out_channels))
+        self.bias = Parameter(torch.zeros(heads * out_channels if concat else out_channels))
+
+    def forward(self, x):
+        # x: (B, H, W, F) → (B, H, W, heads*C) or (B, H, W, C)
+        b, h, w, _ = x.shape
+        feat = self.lin(x).view(b, h, w, self.heads, self.out_channels)
+        a_src = (feat * self.att_src).sum(-1)
+        a_dst = (feat * self.att_dst).sum(-1)
+
+        has_left = (torch.arange(w, device=x.device) > 0).view(1, 1, w, 1)
+        has_up = (torch.arange(h, device=x.device) > 0).view(1, h, 1, 1)
+
+        logits = torch.stack([
+            a_src + a_dst,
+            _shift(a_src, 2) + a_dst,
+            _shift(a_src, 1) + a_dst,
+        ], dim=-1)
+        logits = F.leaky_relu(logits, self.negative_slope)
+        has_self = torch.ones(1, h, w, 1, dtype=torch.bool, device=x.device)
+        valid = torch.stack([has_self, has_self & has_left, has_self & has_up], dim=-1)
+        logits = logits.masked_fill(~valid, NEG_INF)
+        alpha = torch.softmax(logits, dim=-1).unsqueeze(-2)
+
+        out = (
+            alpha[..., 0] * feat
+            + alpha[..., 1] * _shift(feat, 2)
+            + alpha[..., 2] * _shift(feat, 1)
+        )
+        if self.concat:
+            out = out.reshape(b, h, w, self.heads * self.out_channels)
+        else:
+            out = out.mean(dim=3)
+        return out + self.bias
+
+
+class DenseTmrtGAT(torch.nn.Module):
+    def __init__(self, in_channels=8, hidden_channels=32):
+        super().__init__()
+        self.gat1 = DenseGATLayer(in_channels, hidden_channels, heads=4, concat=True)
+        self.gat2 = DenseGATLayer(hidden_channels * 4, hidden_channels, heads=4, concat=False)
+        self.lin = Linear(hidden_channels, 1)
+
+    def forward(self, x):
+        # x: (B, H, W, 8) → (B, H, W)
+        x = F.relu(self.gat1(x))
+        x = F.relu(self.gat2(x))
+        return self.lin(x).squeeze(-1)
+
+
+def convert_state_dict(sparse_state):
+    # Maps TmrtGAT (GATConv) weights onto DenseTmrtGAT. Older PyG stores the shared
+    # projection as lin_src/lin_dst, newer releases as lin.
+    dense_state = {}
+    for layer in ("gat1", "gat2"):
+        weight = sparse_state.get(f"{layer}.lin.weight", sparse_state.get(f"{layer}.lin_src.weight"))
+        if weight is None:
+            raise KeyError(f"No projection weight for {layer} in the GAT state dict")
+        dense_state[f"{layer}.lin.weight"] = weight
+        # GATConv keeps attention vectors as (1, heads, C)
+        for att in ("att_src", "att_dst"):
+            value = sparse_state[f"{layer}.{att}"]
+            dense_state[f"{layer}.{att}"] = value.reshape(value.shape[-2:])
+        dense_state[f"{layer}.bias"] = sparse_state[f"{layer}.bias"]
+    dense_state["lin.weight"] = sparse_state["lin.weight"]
+    dense_state["lin.bias"] = sparse_state["lin.bias"]
+    return dense_state
+
+
+def load_dense_tmrt_gat(path="gnn_tmrt_model.pth"):
+    model = DenseTmrtGAT(in_channels=8, hidden_channels=32)
+    model.load_state_dict(convert_state_dict(torch.load(path, map_location="cpu")))
+    model.eval()
+    return model
@@ -0,0 +1,414 @@
+import json
+import time
+import hashlib
+import argparse
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+import canopy
+import geojson_ingest
+import tiled_inference
+
+# ----------------------------------------------------------------------------------
+# 🧬 Design optimizer: tree placement + building heights vs mean Tmrt and cost
+# ----------------------------------------------------------------------------------
+# Design space (GeoJSON, EPSG:25831):
+#   footprints  "height" (current), optional "min_height" / "max_height" (range the
+#               optimizer may choose from, 0.5 m steps) and "cost_per_m3"
+#   trees       existing trees, always kept
+#   candidates  tree points that may be planted ("height", "radius" / species …,
+#               optional "cost")
+#   budget      max total cost: planted trees + |Δheight| · footprint area · cost_per_m3
+# Search: NSGA-II (μ + λ, binary tournament, uniform crossover, bit-flip / gaussian
+# mutation, budget repair undoing the costliest change first). Every generation is
+# one batched CNN + GAT call over the windows of all new designs
+# (tiled_inference.predict_tiled_stack); designs already seen — in this run or an
+# earlier one on the same space — come from the cache.
+# Stops after the generation limit, the time limit, or when the hypervolume of the
+# Pareto front gained less than TOLERANCE for PATIENCE generations.
+# Objectives (both minimised): mean Tmrt over ground pixels, cost.
+# Usage:
+#   python design_optimizer.py --footprints fp.geojson --candidates cand.geojson --extent ext.geojson --budget 50000 --out pareto.json
+#   python design_optimizer.py --check   (budget repair self-check)
+
+TREE_COST = 1500.0  # € per planted tree
+HEIGHT_COST = 400.0  # € per m³ of added / removed built volume
+HEIGHT_STEP = 0.5  # m
+POPULATION = 32
+GENERATIONS = 40
+TIME_LIMIT = 120.0  # s
+PATIENCE = 5
+TOLERANCE = 1e-3  # relative hypervolume gain
+CACHE_SIZE = 20000  # designs kept across runs
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()  # shared by concurrent jobs (TMRT_JOB_WORKERS > 1)
+
+
+# === Design space
+class DesignSpace:
+    def __init__(self, footprints_str, trees_str, candidates_str, extent_str, pixel_size, budget,
+                 tree_radius=canopy.DEFAULT_RADIUS):
+        from rasterio.features import rasterize
+        from rasterio.transform import from_origin
+
+        extent, self.issues = geojson_ingest.read_extent(extent_str)
+        minx, miny, maxx, maxy = extent.bounds
+        self.shape = tiled_inference.grid_shape(extent.bounds, pixel_size)
+        self.transform = from_origin(minx, maxy, pixel_size, pixel_size)
+        self.budget = float(budget) if budget else float("inf")
+
+        footprints = geojson_ingest.read_layer(footprints_str, "footprints", kind="polygon")
+        props = footprints.properties
+        self.base_height = geojson_ingest.numeric_property(props, "height", 0)
+        self.min_height = np.minimum(geojson_ingest.numeric_property(props, "min_height", np.nan), self.base_height)
+        self.max_height = np.maximum(geojson_ingest.numeric_property(props, "max_height", np.nan), self.base_height)
+        self.min_height = np.where(np.isnan(self.min_height), self.base_height, np.maximum(self.min_height, 0))
+        self.max_height = np.where(np.isnan(self.max_height), self.base_height, self.max_height)
+        self.volume_cost = np.abs(np.asarray([g.area for g in footprints.geometries])) * \
+            geojson_ingest.numeric_property(props, "cost_per_m3", HEIGHT_COST)
+        self.variable = np.flatnonzero(self.max_height - self.min_height >= HEIGHT_STEP)
+        # Footprint index per pixel (0 = none): dsm of a design = heights[index]
+        self.footprint_index = rasterize(
+            [(g, i + 1) for i, g in enumerate(footprints.geometries)], out_shape=self.shape,
+            transform=self.transform, fill=0, dtype="int32") if len(footprints.geometries) \
+            else np.zeros(self.shape, dtype=np.int32)
+        self.buildings = (self.footprint_index == 0).astype(np.float32)  # 1 = ground, as app.py
+
+        trees = geojson_ingest.read_layer(trees_str, "trees", kind="point")
+        xy = geojson_ingest.point_coords(trees)
+        self.base_cdsm = canopy.stamp_canopy(
+            xy[:, 0], xy[:, 1], geojson_ingest.numeric_property(trees.properties, "height", 5),
+            canopy.radii_from_properties(trees.properties, default=tree_radius), self.transform, self.shape)
+
+        candidates = geojson_ingest.read_layer(candidates_str, "candidates", kind="point")
+        self.candidate_xy = geojson_ingest.point_coords(candidates)
+        self.candidate_height = geojson_ingest.numeric_property(candidates.properties, "height", 5)
+        self.candidate_radius = canopy.radii_from_properties(candidates.properties, default=tree_radius)
+        self.tree_cost = geojson_ingest.numeric_property(candidates.properties, "cost", TREE_COST)
+        # One crown stamp per candidate: (flat pixel indices, heights)
+        self.stamps = []
+        for (x, y), h, r in zip(self.candidate_xy, self.candidate_height, self.candidate_radius):
+            crown = canopy.stamp_canopy([x], [y], [h], [r], self.transform, self.shape).reshape(-1)
+            idx = np.flatnonzero(crown)
+            self.stamps.append((idx, crown[idx]))
+        self.issues += footprints.issues + trees.issues + candidates.issues
+        # Stable across processes and restarts (str hash() is salted per process)
+        self.key = hashlib.sha1("\0".join(
+            [footprints_str or "", trees_str or "", candidates_str or "", extent_str or "", repr(float(pixel_size))]
+        ).encode("utf-8")).digest()
+
+    @property
+    def n_trees(self):
+        return len(self.stamps)
+
+    @property
+    def n_heights(self):
+        return len(self.variable)
+
+    def heights(self, genes):
+        h = self.base_height.copy()
+        h[self.variable] = genes
+        return h
+
+    def cost(self, trees, genes):
+        delta = np.abs(genes - self.base_height[self.variable])
+        return float(self.tree_cost[trees].sum() + (delta * self.volume_cost[self.variable]).sum())
+
+    def rasters(self, trees, genes):
+        dsm = np.concatenate([[0.0], self.heights(genes)]).astype(np.float32)[self.footprint_index]
+        cdsm = self.base_cdsm.copy()
+        flat = cdsm.reshape(-1)
+        for k in np.flatnonzero(trees):
+            idx, value = self.stamps[k]
+            np.maximum.at(flat, idx, value)
+        return dsm, cdsm
+
+
+# === Evaluation
+def design_key(space, trees, genes):
+    q = np.round(genes / HEIGHT_STEP).astype(np.int32)
+    return hashlib.sha1(space.key + np.packbits(trees).tobytes() + q.tobytes()).hexdigest()
+
+
+def evaluate(space, backend, trees_pop, genes_pop, stats):
+    """(P, n_trees) bool, (P, n_heights) → objectives (P, 2): mean ground Tmrt, cost."""
+    n = len(trees_pop)
+    out = np.zeros((n, 2))
+    todo = OrderedDict()
+    keys = [design_key(space, trees_pop[i], genes_pop[i]) for i in range(n)]
+    with _cache_lock:
+        for i, key in enumerate(keys):
+            value = _cache.get(key)
+            if value is not None:
+                _cache.move_to_end(key)
+                out[i] = value
+                stats["cache_hits"] += 1
+            else:
+                todo.setdefault(key, []).append(i)
+    if todo:
+        first = [idx[0] for idx in todo.values()]
+        rasters = [space.rasters(trees_pop[i], genes_pop[i]) for i in first]
+        dsm = np.empty((len(first),) + space.shape, dtype=np.float32)
+        cdsm = np.empty_like(dsm)
+        for k, (d, c) in enumerate(rasters):
+            dsm[k], cdsm[k] = tiled_inference.normalise_heights(d, c)
+        t0 = time.perf_counter()
+        _, tmrt = tiled_inference.predict_tiled_stack(dsm, cdsm, space.buildings, backend.predict_svf,
+                                                      backend.predict_tmrt, max_tiles=0)
+        stats["inference_s"] += time.perf_counter() - t0
+        stats["evaluated"] += len(first)
+        ground = space.buildings > 0
+        values = {}
+        for k, (key, idx) in enumerate(todo.items()):
+            values[key] = (float(tmrt[k][ground].mean()) if ground.any() else float("nan"),
+                           space.cost(trees_pop[idx[0]], genes_pop[idx[0]]))
+            out[idx] = values[key]
+        with _cache_lock:
+            _cache.update(values)
+            for key in values:
+                _cache.move_to_end(key)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return out
+
+
+# === NSGA-II
+def non_dominated_ranks(F):
+    dominates = (F[:, None, :] <= F[None, :, :]).all(-1) & (F[:, None, :] < F[None, :, :]).any(-1)
+    counts = dominates.sum(axis=0)
+    ranks = np.full(len(F), -1)
+    rank, front = 0, np.flatnonzero(counts == 0)
+    while len(front):
+        ranks[front] = rank
+        counts = counts - dominates[front].sum(axis=0)
+        counts[ranks >= 0] = -1
+        rank, front = rank + 1, np.flatnonzero(counts == 0)
+    return ranks
+
+
+def crowding(F, ranks):
+    distance = np.zeros(len(F))
+    for r in np.unique(ranks):
+        idx = np.flatnonzero(ranks == r)
+        if len(idx) < 3:
+            distance[idx] = np.inf
+            continue
+        for m in range(F.shape[1]):
+            order = idx[np.argsort(F[idx, m])]
+            span = F[order[-1], m] - F[order[0], m]
+            distance[order[0]] = distance[order[-1]] = np.inf
+            if span > 0:
+                distance[order[1:-1]] += (F[order[2:], m] - F[order[:-2], m]) / span
+    return distance
+
+
+def hypervolume(F, ref):
+    # 2-D, both minimised; F is a non-dominated set
+    F = F[(F[:, 0] < ref[0]) & (F[:, 1] < ref[1])]
+    if not len(F):
+        return 0.0
+    F = F[np.argsort(F[:, 0])]
+    hv, prev = 0.0, ref[1]
+    for f0, f1 in F:
+        if f1 < prev:
+            hv += (ref[0] - f0) * (prev - f1)
+            prev = f1
+    return hv
+
+
+def repair(space, trees, genes, rng):
+    # Undo the change costing most — a planted tree, or one height step back towards
+    # the current height of the footprint — until within budget (random among ties)
+    base = space.base_height[space.variable]
+    volume_cost = space.volume_cost[space.variable]
+    while space.cost(trees, genes) > space.budget:
+        planted = np.flatnonzero(trees)
+        changed = np.flatnonzero(genes != base)
+        if not len(planted) and not len(changed):
+            break
+        cost = np.concatenate([space.tree_cost[planted], np.abs(genes[changed] - base[changed]) * volume_cost[changed]])
+        k = int(np.argmax(cost * (1 + 1e-9 * rng.random(len(cost)))))
+        if k < len(planted):
+            trees[planted[k]] = False
+        else:
+            j = changed[k - len(planted)]
+            delta = genes[j] - base[j]
+            genes[j] = base[j] if abs(delta) <= HEIGHT_STEP else genes[j] - np.sign(delta) * HEIGHT_STEP
+    return trees, genes
+
+
+def check_repair(seed=0):
+    """Repair keeps a feasible mixed design and trims heights before trees."""
+    space = DesignSpace.__new__(DesignSpace)
+    space.variable = np.arange(2)
+    space.base_height = np.array([10.0, 12.0])
+    space.volume_cost = np.array([100.0, 100.0]) * HEIGHT_COST  # 100 m² footprints
+    space.tree_cost = np.full(3, TREE_COST)
+    space.budget = 30000.0
+    rng = np.random.default_rng(seed)
+
+    trees, genes = np.array([True, True, False]), np.array([10.5, 12.0])  # 3000 + 20000 €
+    t, g = repair(space, trees.copy(), genes.copy(), rng)
+    ok = (t == trees).all() and (g == genes).all()
+    print(f"{'✅' if ok else '❌'} feasible mixed design kept ({space.cost(t, g):.0f} €)")
+
+    trees, genes = np.ones(3, dtype=bool), np.array([11.0, 13.0])  # 4500 + 80000 €
+    t, g = repair(space, trees.copy(), genes.copy(), rng)
+    trimmed = space.cost(t, g) <= space.budget and t.all()
+    print(f"{'✅' if trimmed else '❌'} over-budget design trimmed to {space.cost(t, g):.0f} € "
+          f"with {int(t.sum())}/3 trees, heights {g.tolist()}")
+    return bool(ok and trimmed)
+
+
+def quantize(space, genes):
+    lo, hi = space.min_height[space.variable], space.max_height[space.variable]
+    return np.clip(np.round(genes / HEIGHT_STEP) * HEIGHT_STEP, lo, hi)
+
+
+def initial_population(space, size, rng):
+    trees = np.zeros((size, space.n_trees), dtype=bool)
+    genes = np.tile(space.base_height[space.variable], (size, 1))
+    lo, hi = space.min_height[space.variable], space.max_height[space.variable]
+    for i in range(1, size):  # design 0 = current state
+        trees[i] = rng.random(space.n_trees) < (1.0 if i == 1 else rng.random())
+        if space.n_heights and i > 1:
+            genes[i] = quantize(space, rng.uniform(lo, hi))
+        repair(space, trees[i], genes[i], rng)
+    return trees, genes
+
+
+def offspring(space, trees, genes, ranks, dist, size, rng):
+    n = len(trees)
+    lo, hi = space.min_height[space.variable], space.max_height[space.variable]
+
+    def tournament():
+        a, b = rng.integers(n, size=2)
+        better = ranks[a] < ranks[b] or (ranks[a] == ranks[b] and dist[a] > dist[b])
+        return a if better else b
+
+    child_trees = np.zeros((size, space.n_trees), dtype=bool)
+    child_genes = np.zeros((size, space.n_heights))
+    for i in range(size):
+        a, b = tournament(), tournament()
+        take = rng.random(space.n_trees) < 0.5
+        t = np.where(take, trees[a], trees[b])
+        t ^= rng.random(space.n_trees) < 1.0 / max(space.n_trees, 1)
+        g = np.where(rng.random(space.n_heights) < 0.5, genes[a], genes[b])
+        mutate = rng.random(space.n_heights) < 1.0 / max(space.n_heights, 1)
+        g = quantize(space, g + mutate * rng.normal(0, 0.2 * (hi - lo) + HEIGHT_STEP, space.n_heights))
+        child_trees[i], child_genes[i] = repair(space, t, g, rng)
+    return child_trees, child_genes
+
+
+def optimize(space, backend, population=POPULATION, generations=GENERATIONS, time_limit=TIME_LIMIT,
+             patience=PATIENCE, tolerance=TOLERANCE, seed=42, log=None):
+    rng = np.random.default_rng(seed)
+    stats = {"cache_hits": 0, "evaluated": 0, "inference_s": 0.0, "generations": 0, "stopped": "generations"}
+    t0 = time.perf_counter()
+    trees, genes = initial_population(space, population, rng)
+    F = evaluate(space, backend, trees, genes, stats)
+    ref = np.array([np.nanmax(F[:, 0]) + 0.5, max(np.nanmax(F[:, 1]), 1.0) * 1.1])
+    ranks = non_dominated_ranks(F)
+    dist = crowding(F, ranks)
+    best_hv, stale = hypervolume(F[ranks == 0], ref), 0
+
+    for gen in range(1, generations + 1):
+        if time.perf_counter() - t0 > time_limit:
+            stats["stopped"] = "time limit"
+            break
+        child_trees, child_genes = offspring(space, trees, genes, ranks, dist, population, rng)
+        child_F = evaluate(space, backend, child_trees, child_genes, stats)
+        # μ + λ survival: rank, then crowding distance
+        trees, genes = np.concatenate([trees, child_trees]), np.concatenate([genes, child_genes])
+        F = np.concatenate([F, child_F])
+        ranks = non_dominated_ranks(F)
+        dist = crowding(F, ranks)
+        keep = np.lexsort((-dist, ranks))[:population]
+        trees, genes, F = trees[keep], genes[keep], F[keep]
+        ranks = non_dominated_ranks(F)
+        dist = crowding(F, ranks)
+        stats["generations"] = gen
+
+        hv = hypervolume(F[ranks == 0], ref)
+        stale = stale + 1 if hv - best_hv <= tolerance * max(best_hv, 1e-9) else 0
+        best_hv = max(best_hv, hv)
+        if log:
+            log(gen, hv, F[ranks == 0])
+        if stale >= patience:
+            stats["stopped"] = "converged"
+            break
+
+    stats.update({"hypervolume": best_hv, "seconds": round(time.perf_counter() - t0, 2),
+                  "inference_s": round(stats["inference_s"], 2)})
+    return pareto_set(space, trees, genes, F, ranks), stats
+
+
+def pareto_set(space, trees, genes, F, ranks):
+    seen, front = set(), []
+    for i in np.flatnonzero(ranks == 0)[np.argsort(F[ranks == 0, 0])]:
+        key = design_key(space, trees[i], genes[i])
+        if key in seen:
+            continue
+        seen.add(key)
+        front.append({
+            "tmrt_mean": round(float(F[i, 0]), 3),
+            "cost": round(float(F[i, 1]), 2),
+            "trees": np.flatnonzero(trees[i]).tolist(),
+            "heights": {int(k): round(float(h), 2) for k, h in zip(space.variable, genes[i])
+                        if h != space.base_height[k]},
+        })
+    return front
+
+
+def trees_geojson(space, design):
+    features = [{"type": "Feature",
+                 "properties": {"candidate": int(k), "height": float(space.candidate_height[k]),
+                                "radius": float(space.candidate_radius[k])},
+                 "geometry": {"type": "Point", "coordinates": space.candidate_xy[k].tolist()}}
+                for k in design["trees"]]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def main():
+    import os
+    import inference_backends
+
+    parser = argparse.ArgumentParser(description="NSGA-II search over tree placement and building heights")
+    parser.add_argument("--footprints")
+    parser.add_argument("--trees", default=None, help="Existing trees (kept)")
+    parser.add_argument("--candidates", help="Candidate tree points")
+    parser.add_argument("--extent")
+    parser.add_argument("--pixel-size", type=float, default=1.0)
+    parser.add_argument("--budget", type=float, default=None)
+    parser.add_argument("--population", type=int, default=POPULATION)
+    parser.add_argument("--generations", type=int, default=GENERATIONS)
+    parser.add_argument("--time-limit", type=float, default=TIME_LIMIT)
+    parser.add_argument("--backend", default=os.environ.get("TMRT_BACKEND", "dense"))
+    parser.add_argument("--model-dir", default=".")
+    parser.add_argument("--out", default="pareto.json")
+    parser.add_argument("--check", action="store_true", help="Only run the budget repair self-check")
+    args = parser.parse_args()
+    if args.check:
+        return 0 if check_repair() else 1
+    if not (args.footprints and args.candidates and args.extent):
+        parser.error("--footprints, --candidates and --extent are required")
+
+    read = lambda path: open(path, encoding="utf-8").read() if path else ""
+    space = DesignSpace(read(args.footprints), read(args.trees), read(args.candidates), read(args.extent),
+                        args.pixel_size, args.budget)
+    print(f"▶️ {space.n_trees} candidate trees, {space.n_heights} variable footprints, budget {space.budget}")
+    backend = inference_backends.load_backend(args.backend, model_dir=args.model_dir)
+    front, stats = optimize(space, backend, args.population, args.generations, args.time_limit,
+                            log=lambda gen, hv, f: print(f"  gen {gen}: {len(f)} on front, HV {hv:.1f}"))
+    with open(args.out, "w") as f:
+        json.dump({"pareto": front, "stats": stats}, f, indent=1)
+    print(f"✅ {len(front)} Pareto designs ({stats['evaluated']} evaluated, {stats['cache_hits']} cached, "
+          f"stopped: {stats['stopped']}) → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+import tiled_inference
+import inference_backends
+
+# ----------------------------------------------------------------------------------
+# 📦 Export the SVF CNN to ONNX and the Tmrt GAT to TorchScript for the
+#    "portable" / "dense" backends, then check parity against TensorFlow / PyG
+# ----------------------------------------------------------------------------------
+# Exports are written next to the source models, so TMRT_MODEL_DIR serves all backends.
+# Every export ends with the parity check: the measured max / mean |Δ| per backend and
+# the tolerances go to export_parity.json in the model dir, and the script exits 1
+# when a backend is outside the tolerance.
+# Usage:
+#   python export_models.py --model-dir .
+#   python export_models.py --model-dir . --check-only --backends dense --samples 8
+
+
+def export_cnn(model_dir, tile_size, opset):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(os.path.join(model_dir, inference_backends.CNN_H5), compile=False)
+    spec = (tf.TensorSpec((None, tile_size, tile_size, 2), tf.float32, name="dsm_cdsm"),)
+    out_path = os.path.join(model_dir, inference_backends.CNN_ONNX)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=out_path)
+    print(f"✅ CNN exported: {out_path}")
+
+
+def export_gnn(model_dir, tile_size):
+    import torch
+    from tmrt_gat import load_tmrt_gat
+
+    class GridGAT(torch.nn.Module):
+        # Bakes the 4-neighbour grid edges of one tile into the module
+        def __init__(self, model, edge_index):
+            super().__init__()
+            self.model = model
+            self.register_buffer("edge_index", edge_index)
+
+        def forward(self, x):
+            return self.model(x, self.edge_index)
+
+    model = load_tmrt_gat(os.path.join(model_dir, inference_backends.GNN_PTH))
+    edge_index = torch.tensor(tiled_inference.grid_edge_index(tile_size, tile_size), dtype=torch.long)
+    wrapper = GridGAT(model, edge_index).eval()
+    example = torch.rand(tile_size * tile_size, 8)
+    with torch.no_grad():
+        traced = torch.jit.trace(wrapper, example, check_trace=False)
+    out_path = os.path.join(model_dir, inference_backends.GNN_TORCHSCRIPT)
+    traced.save(out_path)
+    print(f"✅ GAT exported: {out_path}")
+
+
+# === Parity check
+def synthetic_rasters(n, tile_size, seed=0):
+    # Random rectangular blocks (buildings) and disks (trees) on an empty grid
+    rng = np.random.default_rng(seed)
+    dsm = np.zeros((n, tile_size, tile_size), dtype=np.float32)
+    cdsm = np.zeros_like(dsm)
+    yy, xx = np.mgrid[0:tile_size, 0:tile_size]
+    for i in range(n):
+        for _ in range(rng.integers(4, 16)):
+            r, c = rng.integers(0, tile_size - 8, size=2)
+            h, w = rng.integers(6, 40, size=2)
+            dsm[i, r:r + h, c:c + w] = rng.uniform(6, 40)
+        for _ in range(rng.integers(0, 30)):
+            r, c = rng.integers(0, tile_size, size=2)
+            disk = (yy - r) ** 2 + (xx - c) ** 2 <= rng.uniform(1.5, 4) ** 2
+            cdsm[i][disk & (dsm[i] == 0)] = rng.uniform(4, 15)
+    return dsm, cdsm
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+PARITY_REPORT = "export_parity.json"
+
+
+def check_parity(model_dir, candidates, samples, tile_size, svf_tol, tmrt_tol):
+    native = inference_backends.load_backend("native", model_dir)
+
+    dsm, cdsm = synthetic_rasters(samples, tile_size)
+    for i in range(samples):
+        dsm[i], cdsm[i] = tiled_inference.normalise_heights(dsm[i], cdsm[i])
+    buildings = (dsm > 0).astype(np.float32)
+    batch = np.stack([dsm, cdsm], axis=-1)
+
+    svf_native, t_svf = timed(native.predict_svf, batch)
+    x = np.stack([
+        tiled_inference.single_tile_features(dsm[i], cdsm[i], svf_native[i], buildings[i])
+        for i in range(samples)
+    ])
+    tmrt_native, t_tmrt = timed(native.predict_tmrt, x)
+    print(f"[native] SVF {1000 * t_svf / samples:.1f} ms/tile  Tmrt {1000 * t_tmrt / samples:.1f} ms/tile")
+
+    ok = True
+    report = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "samples": samples, "tile_size": tile_size,
+              "svf_tol": svf_tol, "tmrt_tol_C": tmrt_tol, "backends": {}}
+    for name in candidates:
+        backend = inference_backends.load_backend(name, model_dir)
+        svf_pred, t_svf = timed(backend.predict_svf, batch)
+        tmrt_pred, t_tmrt = timed(backend.predict_tmrt, x)
+
+        svf_err = np.abs(svf_native - svf_pred)
+        tmrt_err = np.abs(tmrt_native - tmrt_pred)
+        print(f"[{name}] SVF {1000 * t_svf / samples:.1f} ms/tile  Tmrt {1000 * t_tmrt / samples:.1f} ms/tile")
+        print(f"  SVF  max |Δ| = {svf_err.max():.2e}  mean |Δ| = {svf_err.mean():.2e}  (tol {svf_tol:g})")
+        print(f"  Tmrt max |Δ| = {tmrt_err.max():.2e} °C  mean |Δ| = {tmrt_err.mean():.2e} °C  (tol {tmrt_tol:g})")
+        passed = bool(svf_err.max() <= svf_tol and tmrt_err.max() <= tmrt_tol)
+        report["backends"][name] = {
+            "svf_max_abs": float(svf_err.max()), "svf_mean_abs": float(svf_err.mean()),
+            "tmrt_max_abs_C": float(tmrt_err.max()), "tmrt_mean_abs_C": float(tmrt_err.mean()),
+            "ok": passed,
+        }
+        ok = ok and passed
+
+    report["ok"] = ok
+    path = os.path.join(model_dir, PARITY_REPORT)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+    print(("✅ Parity OK" if ok else "❌ Parity check failed") + f" → {path}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export SVF CNN / Tmrt GAT for the portable backend")
+    parser.add_argument("--model-dir", default=".")
+    parser.add_argument("--tile-size", type=int, default=tiled_inference.TILE_SIZE)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--samples", type=int, default=4)
+    parser.add_argument("--backends", nargs="+", default=["portable", "dense"],
+                        help="Backends compared against the native TensorFlow / PyG models")
+    parser.add_argument("--svf-tol", type=float, default=1e-4)
+    parser.add_argument("--tmrt-tol", type=float, default=1e-3)
+    parser.add_argument("--check-only", action="store_true", help="Skip export, only compare backends")
+    args = parser.parse_args()
+
+    if not args.check_only:
+        export_cnn(args.model_dir, args.tile_size, args.opset)
+        export_gnn(args.model_dir, args.tile_size)
+
+    ok = check_parity(args.model_dir, args.backends, args.samples, args.tile_size, args.svf_tol, args.tmrt_tol)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import json
+from collections import namedtuple
+import numpy as np
+import shapely
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ----------------------------------------------------------------------------------
+# 📥 GeoJSON strings → shapely geometry arrays, in bulk
+# ----------------------------------------------------------------------------------
+# For the Hops inputs (footprints, trees, extent, green, pavement):
+#   - parsed with orjson when installed (json otherwise)
+#   - coordinates of every Polygon / MultiPolygon / Point of a layer gathered into one
+#     array and built with shapely.linearrings / polygons / multipolygons / points
+#     (one call per geometry kind, no shape() per feature)
+#   - invalid geometries repaired with one shapely.make_valid call, keeping the
+#     polygonal part
+#   - features that cannot be used (no / unexpected geometry, bad coordinates, empty
+#     after repair) are skipped and listed in Layer.issues instead of failing the call
+# Usage:
+#   layer = geojson_ingest.read_layer(footprints_str, "footprints", kind="polygon")
+#   heights = geojson_ingest.numeric_property(layer.properties, "height", 0)
+
+Layer = namedtuple("Layer", ["name", "geometries", "properties", "issues"])
+
+
+# === Parsing
+def loads(text):
+    if text is None or (isinstance(text, (str, bytes)) and not text.strip()):
+        return {"type": "FeatureCollection", "features": []}
+    if isinstance(text, (dict, list)):
+        return text
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def feature_list(obj):
+    if isinstance(obj, list):
+        return obj
+    kind = obj.get("type")
+    if kind == "FeatureCollection":
+        return obj.get("features") or []
+    if kind == "Feature":
+        return [obj]
+    return [{"type": "Feature", "properties": {}, "geometry": obj}]
+
+
+def coord_array(coords, min_points=1):
+    # Nested coordinate list → (n, 2) float64; extra (z) values are dropped
+    try:
+        a = np.asarray(coords, dtype=np.float64)
+    except (TypeError, ValueError):
+        a = np.asarray([c[:2] for c in coords], dtype=np.float64)
+    if a.ndim == 1 and min_points == 1:
+        a = a[None]
+    if a.ndim != 2 or a.shape[1] < 2 or len(a) < min_points:
+        raise ValueError(f"expected at least {min_points} coordinate pair(s)")
+    a = a[:, :2]
+    if not np.isfinite(a).all():
+        raise ValueError("non-finite coordinate")
+    return a
+
+
+# === Builders
+class _Polygons:
+    # Rings of all polygons of a layer, built in one go at the end
+    def __init__(self):
+        self.coords, self.ring_sizes, self.ring_polygon, self.polygon_feature = [], [], [], []
+
+    def add(self, polygons, feature):
+        # polygons: list of ring lists; all are checked before anything is kept
+        parts = [[coord_array(r, min_points=3) for r in rings] for rings in polygons]
+        if not parts or not all(parts):
+            raise ValueError("polygon without rings")
+        for arrays in parts:
+            for a in arrays:
+                # linearrings closes open rings itself; a closed one needs 4 points
+                if len(a) < 4 and (a[0] == a[-1]).all():
+                    raise ValueError("ring with fewer than 3 distinct points")
+        for arrays in parts:
+            k = len(self.polygon_feature)
+            for a in arrays:
+                self.coords.append(a)
+                self.ring_sizes.append(len(a))
+                self.ring_polygon.append(k)
+            self.polygon_feature.append(feature)
+
+    def build(self):
+        if not self.polygon_feature:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.int64)
+        coords = np.concatenate(self.coords)
+        ring_ids = np.repeat(np.arange(len(self.ring_sizes)), self.ring_sizes)
+        rings = shapely.linearrings(coords, indices=ring_ids)
+        # First ring of each polygon = shell, the rest = holes
+        polygons = shapely.polygons(rings, indices=np.asarray(self.ring_polygon))
+        return polygons, np.asarray(self.polygon_feature)
+
+
+def repair(geometries, names, issues, layer, polygonal):
+    # Bulk make_valid; polygon layers keep only the polygonal part
+    invalid = ~shapely.is_valid(geometries) & ~shapely.is_missing(geometries)
+    if invalid.any():
+        reasons = shapely.is_valid_reason(geometries[invalid])
+        fixed = shapely.make_valid(geometries[invalid])
+        if polygonal:
+            fixed = np.array([polygonal_part(g) for g in fixed], dtype=object)
+        geometries[invalid] = fixed
+        for i, reason in zip(np.flatnonzero(invalid), reasons):
+            issues.append({"layer": layer, "index": int(names[i]), "problem": f"repaired: {reason}"})
+    empty = shapely.is_missing(geometries) | shapely.is_empty(geometries)
+    for i in np.flatnonzero(empty):
+        issues.append({"layer": layer, "index": int(names[i]), "problem": "empty geometry, skipped"})
+    return ~empty
+
+
+def polygonal_part(geom):
+    if geom is None or shapely.get_type_id(geom) in (3, 6):
+        return geom
+    parts = [p for p in shapely.get_parts(geom) if shapely.get_type_id(p) in (3, 6)]
+    return shapely.union_all(parts) if parts else None
+
+
+# === Layers
+def read_layer(text, name="layer", kind="polygon"):
+    """kind "polygon" → Polygon / MultiPolygon features, "point" → Point features."""
+    issues = []
+    try:
+        features = feature_list(loads(text))
+    except Exception as e:
+        return Layer(name, np.empty(0, dtype=object), [], [{"layer": name, "index": -1, "problem": f"unreadable JSON: {e}"}])
+
+    properties = []
+    feature_ids = []
+    polygons = _Polygons()
+    multi_parts = {}  # feature slot → polygon indices
+    point_xy, point_slot = [], []
+
+    for i, f in enumerate(features):
+        geom = f.get("geometry") if isinstance(f, dict) else None
+        gtype = geom.get("type") if isinstance(geom, dict) else None
+        slot = len(feature_ids)
+        try:
+            if kind == "point" and gtype == "Point":
+                point_xy.append(coord_array(geom["coordinates"])[0])
+                point_slot.append(slot)
+            elif kind == "polygon" and gtype == "Polygon":
+                polygons.add([geom["coordinates"]], slot)
+            elif kind == "polygon" and gtype == "MultiPolygon":
+                start = len(polygons.polygon_feature)
+                polygons.add(geom["coordinates"], slot)
+                multi_parts[slot] = (start, len(polygons.polygon_feature))
+            else:
+                raise ValueError(f"unexpected geometry {gtype!r} for a {kind} layer")
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            issues.append({"layer": name, "index": i, "problem": str(e) or type(e).__name__})
+            continue
+        feature_ids.append(i)
+        properties.append((f.get("properties") if isinstance(f, dict) else None) or {})
+
+    geometries = np.full(len(feature_ids), None, dtype=object)
+    if kind == "point" and point_xy:
+        geometries[np.asarray(point_slot)] = shapely.points(np.asarray(point_xy))
+    elif kind == "polygon":
+        polys, slots = polygons.build()
+        single = np.array([s not in multi_parts for s in slots], dtype=bool)
+        geometries[slots[single]] = polys[single]
+        for slot, (start, stop) in multi_parts.items():
+            geometries[slot] = shapely.multipolygons(polys[start:stop])
+
+    names = np.asarray(feature_ids, dtype=np.int64)
+    keep = repair(geometries, names, issues, name, kind == "polygon") if len(geometries) else np.zeros(0, dtype=bool)
+    return Layer(name, geometries[keep], [p for p, k in zip(properties, keep) if k], issues)
+
+
+def read_extent(text):
+    # Bounds of the first (polygon) feature; raises if there is none
+    layer = read_layer(text, "extent", kind="polygon")
+    if not len(layer.geometries):
+        problems = "; ".join(i["problem"] for i in layer.issues) or "no features"
+        raise ValueError(f"Extent has no usable polygon ({problems})")
+    return layer.geometries[0], layer.issues
+
+
+def numeric_property(properties, key, default=0.0):
+    values = np.full(len(properties), float(default), dtype=np.float64)
+    for i, p in enumerate(properties):
+        v = p.get(key)
+        if v is not None:
+            try:
+                values[i] = float(v)
+            except (TypeError, ValueError):
+                pass
+    return values
+
+
+def point_coords(layer):
+    if not len(layer.geometries):
+        return np.empty((0, 2), dtype=np.float64)
+    return shapely.get_coordinates(layer.geometries)
+
+
+def issues_summary(issues, limit=5):
+    if not issues:
+        return ""
+    shown = ", ".join(f"{i['layer']} #{i['index']}: {i['problem']}" for i in issues[:limit])
+    more = f" (+{len(issues) - limit} more)" if len(issues) > limit else ""
+    return f"{len(issues)} feature issue(s): {shown}{more}"
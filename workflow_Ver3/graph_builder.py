@@ -0,0 +1,173 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+# ----------------------------------------------------------------------------------
+# 🕸️ Street–building graphs for every *_with_mrt.json (06_json_graph_WIP, batched)
+# ----------------------------------------------------------------------------------
+# Same graph as the notebook — one street node, one node per building, street ↔
+# building edges weighted by polygon min distance, building ↔ building edges —
+# but built straight into arrays:
+#   - footprints → shapely polygons in one call, centroids / distances vectorized
+#   - building ↔ building edges between all buildings, as the notebook does;
+#     --radius R (m) keeps only pairs with centroids within R (cKDTree.query_pairs,
+#     output_type="ndarray"), for large patches
+#   - PyG Data per patch, the whole set collated into one file
+# Workers only return numpy arrays; torch is only used in the parent to collate.
+# Usage:
+#   python graph_builder.py --base-dir C:/Users/Ardo/Desktop/thesis/processed --out street_graphs.pt
+
+JSON_SUFFIX = "_with_mrt.json"
+PAIR_RADIUS = None  # m between building centroids; None = fully connected (notebook)
+TARGET = "mrt_mean"
+STREET_FEATURES = ["area", "width", "mean_building_height", "lh_ratio", "dir_sin", "dir_cos"]
+# Node features: [is_street, x, y, height, *STREET_FEATURES] (x, y relative to the street centroid)
+NODE_FEATURES = ["is_street", "x", "y", "height"] + STREET_FEATURES
+EDGE_FEATURES = ["distance", "is_street_edge"]
+
+
+def find_jsons(base_dir, suffix=JSON_SUFFIX):
+    paths = []
+    for root, _, files in os.walk(base_dir):
+        paths.extend(os.path.join(root, f) for f in files if f.endswith(suffix))
+    return sorted(paths)
+
+
+def polygons(rings):
+    # List of coordinate rings → polygon array (ragged rings in one shapely call)
+    if not rings:
+        return np.empty(0, dtype=object)
+    coords = np.concatenate([np.asarray(r, dtype=np.float64)[:, :2] for r in rings])
+    ring_ids = np.repeat(np.arange(len(rings)), [len(r) for r in rings])
+    return shapely.polygons(shapely.linearrings(coords, indices=ring_ids))
+
+
+def graph_arrays(path, radius=PAIR_RADIUS):
+    with open(path) as f:
+        data = json.load(f)
+
+    street = shapely.Polygon(np.asarray(data["street"], dtype=np.float64)[:, :2])
+    attrs = data.get("street_attributes", {})
+    buildings = data.get("buildings", [])
+    polys = polygons([b["footprint"] for b in buildings])
+    heights = np.array([float(b.get("height", 0)) for b in buildings], dtype=np.float32)
+    n = len(polys)
+
+    origin = shapely.get_coordinates(shapely.centroid(street))[0]
+    centres = shapely.get_coordinates(shapely.centroid(polys)) - origin if n else np.empty((0, 2))
+
+    # Node 0 = street, nodes 1..n = buildings
+    x = np.zeros((n + 1, len(NODE_FEATURES)), dtype=np.float32)
+    x[0, 0] = 1.0
+    x[0, 4:] = [float(attrs.get(k, 0) or 0) for k in STREET_FEATURES]
+    x[1:, 1:3] = centres
+    x[1:, 3] = heights
+
+    # Street ↔ building (both directions)
+    b_nodes = np.arange(1, n + 1)
+    street_dist = shapely.distance(polys, street).astype(np.float32)
+
+    # Building ↔ building
+    if n > 1:
+        if radius is None:
+            pairs = np.column_stack(np.triu_indices(n, k=1))
+        else:
+            pairs = cKDTree(centres).query_pairs(r=radius, output_type="ndarray")
+    else:
+        pairs = np.empty((0, 2), dtype=np.int64)
+    pair_dist = shapely.distance(polys[pairs[:, 0]], polys[pairs[:, 1]]).astype(np.float32)
+
+    src = np.concatenate([b_nodes, np.zeros(n, dtype=np.int64), pairs[:, 0] + 1, pairs[:, 1] + 1])
+    dst = np.concatenate([np.zeros(n, dtype=np.int64), b_nodes, pairs[:, 1] + 1, pairs[:, 0] + 1])
+    dist = np.concatenate([street_dist, street_dist, pair_dist, pair_dist])
+    is_street_edge = np.concatenate([np.ones(2 * n), np.zeros(2 * len(pairs))]).astype(np.float32)
+
+    return {
+        "name": os.path.basename(os.path.dirname(path)) or os.path.basename(path),
+        "x": x,
+        "edge_index": np.stack([src, dst]).astype(np.int64),
+        "edge_attr": np.column_stack([dist, is_street_edge]).astype(np.float32),
+        "y": np.array([float(attrs.get(TARGET, np.nan))], dtype=np.float32),
+    }
+
+
+def _build(args):
+    path, radius = args
+    try:
+        return graph_arrays(path, radius), None
+    except Exception as e:
+        return None, f"{path}: {e}"
+
+
+def build_graphs(paths, radius=PAIR_RADIUS, workers=None, chunksize=16):
+    graphs, errors = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for arrays, error in pool.map(_build, [(p, radius) for p in paths], chunksize=chunksize):
+            if error:
+                errors.append(error)
+            else:
+                graphs.append(arrays)
+    return graphs, errors
+
+
+def to_data(arrays):
+    import torch
+    from torch_geometric.data import Data
+
+    return Data(
+        x=torch.from_numpy(arrays["x"]),
+        edge_index=torch.from_numpy(arrays["edge_index"]),
+        edge_attr=torch.from_numpy(arrays["edge_attr"]),
+        y=torch.from_numpy(arrays["y"]),
+        name=arrays["name"],
+    )
+
+
+def save_collated(graphs, out_path):
+    import torch
+    from torch_geometric.data import InMemoryDataset
+
+    data, slices = InMemoryDataset.collate([to_data(g) for g in graphs])
+    torch.save({"data": data, "slices": slices, "node_features": NODE_FEATURES, "edge_features": EDGE_FEATURES}, out_path)
+
+
+def load_collated(path):
+    # Returns an InMemoryDataset; dataset[i] is the i-th patch graph
+    import torch
+    from torch_geometric.data import InMemoryDataset
+
+    class StreetGraphs(InMemoryDataset):
+        def __init__(self, saved):
+            super().__init__()
+            self.data, self.slices = saved["data"], saved["slices"]
+
+    return StreetGraphs(torch.load(path, weights_only=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build collated PyG street–building graphs from patch JSONs")
+    parser.add_argument("--base-dir", default=r"C:\Users\Ardo\Desktop\thesis\processed")
+    parser.add_argument("--out", default="street_graphs.pt")
+    parser.add_argument("--suffix", default=JSON_SUFFIX)
+    parser.add_argument("--radius", type=float, default=0, help="Building pair radius (m), e.g. 50; 0 = fully connected as the notebook")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    paths = find_jsons(args.base_dir, args.suffix)
+    print(f"▶️ {len(paths)} JSON files in {args.base_dir}")
+    graphs, errors = build_graphs(paths, args.radius if args.radius and args.radius > 0 else PAIR_RADIUS, args.workers)
+    for error in errors:
+        print(f"❌ {error}")
+
+    save_collated(graphs, args.out)
+    nodes = sum(len(g["x"]) for g in graphs)
+    edges = sum(g["edge_index"].shape[1] for g in graphs)
+    print(f"✅ {len(graphs)} graphs ({nodes} nodes, {edges} edges) saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
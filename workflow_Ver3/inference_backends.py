@@ -0,0 +1,137 @@
+import os
+import numpy as np
+
+import tiled_inference
+
+# ----------------------------------------------------------------------------------
+# 🧠 Inference backends for the SVF CNN and the Tmrt GAT
+# ----------------------------------------------------------------------------------
+# "native"   → TensorFlow (cnn_svf_model.h5) + PyTorch Geometric (gnn_tmrt_model.pth)
+# "portable" → ONNX Runtime (svf_cnn.onnx) + TorchScript GAT traced on the fixed
+#              128×128 grid topology (tmrt_gat_grid.pt); no TensorFlow / PyG import
+# "dense"    → ONNX Runtime CNN + DenseTmrtGAT (dense_gat.py), the stencil form of
+#              the GAT loaded straight from gnn_tmrt_model.pth
+#
+# quantize="int8" is dense only: it loads svf_cnn_int8.onnx (written by
+# quantize_models.py) and gives the dense GAT dynamic int8 Linear layers. The
+# traced TorchScript GAT of "portable" cannot be quantized, so it rejects int8.
+#
+# All expose the same two calls used by tiled_inference.predict_tiled:
+#   predict_svf(batch (N, t, t, 2))  → (N, t, t)
+#   predict_tmrt(x (N, t*t, 8))      → (N, t*t)
+# Heavy frameworks are imported lazily so a server only pays for what it loads.
+
+CNN_H5 = "cnn_svf_model.h5"
+GNN_PTH = "gnn_tmrt_model.pth"
+CNN_ONNX = "svf_cnn.onnx"
+CNN_ONNX_INT8 = "svf_cnn_int8.onnx"
+GNN_TORCHSCRIPT = "tmrt_gat_grid.pt"
+
+
+class NativeBackend:
+    name = "native"
+
+    def __init__(self, model_dir=".", tile_size=tiled_inference.TILE_SIZE, quantize=None):
+        if quantize:
+            raise ValueError("Quantized inference needs the 'dense' backend")
+        import tensorflow as tf
+        import torch
+        from tmrt_gat import load_tmrt_gat
+
+        self.torch = torch
+        self.cnn_model = tf.keras.models.load_model(os.path.join(model_dir, CNN_H5), compile=False)
+        self.gnn_model = load_tmrt_gat(os.path.join(model_dir, GNN_PTH))
+        self.edge_index = tiled_inference.grid_edge_index(tile_size, tile_size)
+
+    def predict_svf(self, batch):
+        return self.cnn_model.predict(batch, verbose=0)[..., 0]
+
+    def predict_tmrt(self, x):
+        # Tiles are stacked as one disjoint graph so the GAT runs once per batch
+        torch = self.torch
+        n_graphs, n_nodes, n_feat = x.shape
+        edge_index = tiled_inference.batch_edge_index(self.edge_index, n_nodes, n_graphs)
+        with torch.no_grad():
+            pred = self.gnn_model(
+                torch.tensor(x.reshape(-1, n_feat), dtype=torch.float),
+                torch.tensor(edge_index, dtype=torch.long)
+            )
+        return pred.cpu().numpy().reshape(n_graphs, n_nodes)
+
+
+class PortableBackend:
+    name = "portable"
+    int8_gnn = False  # True when load_gnn quantizes the GAT
+
+    def __init__(self, model_dir=".", tile_size=tiled_inference.TILE_SIZE, quantize=None):
+        import onnxruntime as ort
+        import torch
+
+        if quantize not in (None, "", "int8"):
+            raise ValueError(f"Unknown quantization mode '{quantize}', expected 'int8'")
+        if quantize and not self.int8_gnn:
+            raise ValueError(f"The '{self.name}' backend cannot quantize its TorchScript GAT; "
+                             f"use the 'dense' backend for int8 (CNN + GAT)")
+        self.torch = torch
+        self.tile_size = tile_size
+        self.quantize = quantize or None
+        cnn_file = CNN_ONNX_INT8 if self.quantize else CNN_ONNX
+        self.cnn_session = ort.InferenceSession(
+            os.path.join(model_dir, cnn_file), providers=["CPUExecutionProvider"]
+        )
+        self.cnn_input = self.cnn_session.get_inputs()[0].name
+        self.gnn_module = self.load_gnn(model_dir)
+
+    def load_gnn(self, model_dir):
+        module = self.torch.jit.load(os.path.join(model_dir, GNN_TORCHSCRIPT), map_location="cpu")
+        return module.eval()
+
+    def predict_svf(self, batch):
+        out = self.cnn_session.run(None, {self.cnn_input: batch.astype(np.float32)})[0]
+        return out[..., 0]
+
+    def predict_tmrt(self, x):
+        # The TorchScript module carries the single-tile edge index, so tiles run one by one
+        torch = self.torch
+        with torch.no_grad():
+            preds = [
+                self.gnn_module(torch.from_numpy(np.ascontiguousarray(tile, dtype=np.float32))).numpy()
+                for tile in x
+            ]
+        return np.stack(preds)
+
+
+class DenseBackend(PortableBackend):
+    name = "dense"
+    int8_gnn = True
+
+    def load_gnn(self, model_dir):
+        from dense_gat import load_dense_tmrt_gat
+        model = load_dense_tmrt_gat(os.path.join(model_dir, GNN_PTH))
+        if self.quantize:
+            model = self.torch.ao.quantization.quantize_dynamic(
+                model, {self.torch.nn.Linear}, dtype=self.torch.qint8
+            )
+        return model
+
+    def predict_tmrt(self, x):
+        # Whole batch in one pass: (N, t*t, 8) → (N, t, t, 8) dense grid
+        torch = self.torch
+        n_graphs, n_nodes, n_feat = x.shape
+        t = self.tile_size
+        grid = torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32).reshape(n_graphs, t, t, n_feat))
+        with torch.no_grad():
+            return self.gnn_module(grid).reshape(n_graphs, n_nodes).numpy()
+
+
+BACKENDS = {
+    NativeBackend.name: NativeBackend,
+    PortableBackend.name: PortableBackend,
+    DenseBackend.name: DenseBackend,
+}
+
+
+def load_backend(name="native", model_dir=".", **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_dir=model_dir, **kwargs)
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ----------------------------------------------------------------------------------
+# 🧵 Background jobs for long Hops requests (SQLite job store + thread pool)
+# ----------------------------------------------------------------------------------
+# submit() stores a job and returns its id at once; the work runs on a worker thread
+# (the models live in this process) and reports progress per phase. A job submitted
+# for a session cancels the older queued / running jobs of that session, so moving a
+# slider only keeps the newest request alive. Cancellation is cooperative: the next
+# progress() call of a cancelled job raises JobCancelled.
+# Jobs left queued / running by a previous server process are marked failed at start.
+# Usage:
+#   runner = jobs.JobRunner("tmrt_jobs.sqlite", workers=1)
+#   job_id = runner.submit("full_svf_pipeline", fn, session="def-1")  # fn(job) → JSON-able result
+#   runner.store.get(job_id)  → {"status", "phase", "progress", "message", "result", ...}
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+JOB_TTL = 24 * 3600  # s, finished jobs older than this are purged on submit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    session TEXT,
+    status TEXT NOT NULL,
+    phase TEXT,
+    progress REAL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session, status);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# === Store
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(os.path.abspath(path)):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def create(self, kind, session=None):
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        self.execute("INSERT INTO jobs (id, kind, session, status, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                     (job_id, kind, session or None, QUEUED, now, now))
+        return job_id
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{k} = ?" for k in fields)
+        self.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def transition(self, job_id, expected, **fields):
+        # Update only while the job is still in the expected status (a cancel in
+        # between wins); returns whether the row changed
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{k} = ?" for k in fields)
+        with self.lock:
+            cursor = self.conn.execute(f"UPDATE jobs SET {columns} WHERE id = ? AND status = ?",
+                                       (*fields.values(), job_id, expected))
+            return cursor.rowcount > 0
+
+    def get(self, job_id):
+        rows = self.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def status(self, job_id):
+        rows = self.execute("SELECT status FROM jobs WHERE id = ?", (job_id,))
+        return rows[0]["status"] if rows else None
+
+    def active_in_session(self, session, exclude=None):
+        rows = self.execute(
+            f"SELECT id FROM jobs WHERE session = ? AND status IN ({', '.join('?' * len(ACTIVE))}) AND id != ?",
+            (session, *ACTIVE, exclude or ""))
+        return [r["id"] for r in rows]
+
+    def cancel(self, job_id, message="cancelled"):
+        # Only active jobs can be cancelled; returns whether the status changed
+        with self.lock:
+            cursor = self.conn.execute(
+                f"UPDATE jobs SET status = ?, message = ?, updated = ? WHERE id = ? AND status IN ({', '.join('?' * len(ACTIVE))})",
+                (CANCELLED, message, time.time(), job_id, *ACTIVE))
+            return cursor.rowcount > 0
+
+    def fail_orphans(self):
+        self.execute(f"UPDATE jobs SET status = ?, message = ?, updated = ? WHERE status IN ({', '.join('?' * len(ACTIVE))})",
+                     (FAILED, "server restarted", time.time(), *ACTIVE))
+
+    def purge(self, ttl=JOB_TTL):
+        self.execute(f"DELETE FROM jobs WHERE status NOT IN ({', '.join('?' * len(ACTIVE))}) AND updated < ?",
+                     (*ACTIVE, time.time() - ttl))
+
+
+# === Running
+class Job:
+    """Handle passed to the work function: progress reporting + cancellation check."""
+
+    def __init__(self, store, job_id, phases=None):
+        self.store = store
+        self.id = job_id
+        self.phases = phases or {}
+        self.progress_value = 0.0
+        self.counts = {}
+
+    def cancelled(self):
+        return self.store.status(self.id) == CANCELLED
+
+    def progress(self, phase, fraction=None, message=None):
+        if self.cancelled():
+            raise JobCancelled(self.id)
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+        if fraction is None:
+            fraction = self.phases.get(phase, self.progress_value)
+        # Never move backwards (phases such as "write" recur)
+        self.progress_value = max(self.progress_value, float(fraction))
+        n = self.counts[phase]
+        self.store.update(self.id, phase=phase, progress=round(self.progress_value, 3),
+                          message=message or (f"{phase} ({n})" if n > 1 else phase))
+
+
+class JobRunner:
+    def __init__(self, path, workers=1, ttl=JOB_TTL):
+        self.store = JobStore(path)
+        self.store.fail_orphans()
+        self.ttl = ttl
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tmrt-job")
+
+    def submit(self, kind, fn, session=None, phases=None, supersede=True):
+        self.store.purge(self.ttl)
+        job_id = self.store.create(kind, session)
+        if session and supersede:
+            for old in self.store.active_in_session(session, exclude=job_id):
+                self.store.cancel(old, message=f"superseded by {job_id}")
+        self.pool.submit(self._run, Job(self.store, job_id, phases), fn)
+        return job_id
+
+    def _run(self, job, fn):
+        if not self.store.transition(job.id, QUEUED, status=RUNNING, phase="start", progress=0.0):
+            return  # cancelled while waiting
+        try:
+            result = fn(job)
+        except JobCancelled:
+            return
+        except Exception as e:
+            self.store.transition(job.id, RUNNING, status=FAILED, message=f"{type(e).__name__}: {e}")
+            return
+        # A cancel that arrived after the last progress() call still wins
+        self.store.transition(job.id, RUNNING, status=DONE, phase="done", progress=1, message="done", result=result)
+
+    def cancel(self, job_id):
+        return self.store.cancel(job_id)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import GroupKFold
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from street_predictor import TARGET, FEATURE_COLUMNS, add_derived_features, feature_matrix, read_streets
+
+# ----------------------------------------------------------------------------------
+# 🔬 Spatially-blocked CV + parallel hyperparameter search for the Tmrt regressors
+# ----------------------------------------------------------------------------------
+# Folds are grouped by district (Distric_D), so a model is always scored on
+# districts it never saw. Fold arrays are cached once as .npy (and XGBoost
+# DMatrix binaries); every (config, fold) job then runs in a process pool and
+# only loads its fold from disk. XGBoost uses early stopping on a random slice of
+# the training fold, never on the scored fold. Results go to a leaderboard CSV.
+# Usage:
+#   python model_selection.py --data BCN_dataset_complete.csv --folds 5 --trials 30
+
+GROUP_COLUMN = "Distric_D"
+EARLY_STOPPING_ROUNDS = 50
+MAX_BOOST_ROUNDS = 3000
+
+XGB_SPACE = {
+    "max_depth": [3, 4, 6, 8],
+    "eta": [0.02, 0.05, 0.1],
+    "subsample": [0.7, 0.8, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+    "min_child_weight": [1, 5, 10],
+    "lambda": [0.5, 1.0, 5.0],
+}
+
+RF_SPACE = {
+    "n_estimators": [100, 300, 600],
+    "max_depth": [None, 12, 20],
+    "min_samples_leaf": [1, 3, 5],
+    "max_features": [1.0, 0.5, "sqrt"],
+}
+
+
+# === Fold cache
+def dataset_key(data_path, folds, feature_columns, valid_fraction, seed):
+    # seed / valid_fraction cut the early-stopping split, so they are part of the cache
+    h = hashlib.sha1()
+    h.update(f"{os.path.abspath(data_path)}|{os.path.getmtime(data_path)}|{folds}|{feature_columns}|"
+             f"{valid_fraction}|{seed}".encode())
+    return h.hexdigest()[:12]
+
+
+def build_fold_cache(data_path, cache_dir, folds, valid_fraction=0.1, seed=42):
+    key = dataset_key(data_path, folds, FEATURE_COLUMNS, valid_fraction, seed)
+    fold_dir = os.path.join(cache_dir, key)
+    manifest_path = os.path.join(fold_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    df = read_streets(data_path).dropna(subset=[TARGET])
+    df = add_derived_features(df)
+    X = feature_matrix(df)
+    y = pd.to_numeric(df[TARGET], errors="coerce").to_numpy(dtype=np.float32)
+    groups = df[GROUP_COLUMN].astype(str).to_numpy()
+    keep = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
+    X, y, groups = X[keep], y[keep], groups[keep]
+
+    os.makedirs(fold_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    entries = []
+    for i, (train_idx, test_idx) in enumerate(GroupKFold(n_splits=folds).split(X, y, groups)):
+        is_valid = rng.random(len(train_idx)) < valid_fraction
+        parts = {
+            "fit": train_idx[~is_valid],
+            "valid": train_idx[is_valid],
+            "train": train_idx,
+            "test": test_idx,
+        }
+        entry = {"fold": i, "test_groups": sorted(set(groups[test_idx]))}
+        for name, idx in parts.items():
+            x_path = os.path.join(fold_dir, f"fold{i}_{name}_X.npy")
+            y_path = os.path.join(fold_dir, f"fold{i}_{name}_y.npy")
+            np.save(x_path, X[idx])
+            np.save(y_path, y[idx])
+            entry[name] = [x_path, y_path]
+        entries.append(entry)
+        write_dmatrix_cache(entry)
+
+    manifest = {"key": key, "rows": int(len(y)), "features": FEATURE_COLUMNS, "folds": entries}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Cached {folds} district-blocked folds ({len(y)} rows) in {fold_dir}")
+    return manifest
+
+
+def write_dmatrix_cache(entry):
+    try:
+        import xgboost as xgb
+    except ImportError:
+        return
+    for name in ("fit", "valid", "test"):
+        x_path, y_path = entry[name]
+        buffer_path = x_path.replace("_X.npy", ".dmatrix")
+        xgb.DMatrix(np.load(x_path), label=np.load(y_path), feature_names=FEATURE_COLUMNS).save_binary(buffer_path)
+        entry[f"{name}_dmatrix"] = buffer_path
+
+
+def load_part(entry, name):
+    x_path, y_path = entry[name]
+    return np.load(x_path, mmap_mode="r"), np.load(y_path)
+
+
+# === Search space
+def sample_configs(space, trials, seed):
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    if trials >= len(grid):
+        return grid
+    rng = np.random.default_rng(seed)
+    return [grid[i] for i in rng.choice(len(grid), size=trials, replace=False)]
+
+
+def scores(y_true, y_pred):
+    return {
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        "r2": float(r2_score(y_true, y_pred)),
+    }
+
+
+# === Workers (one (config, fold) job each)
+def run_xgb(config, entry, seed):
+    import xgboost as xgb
+
+    def dmatrix(name):
+        if f"{name}_dmatrix" in entry:
+            return xgb.DMatrix(entry[f"{name}_dmatrix"])
+        X, y = load_part(entry, name)
+        return xgb.DMatrix(np.asarray(X), label=y, feature_names=FEATURE_COLUMNS)
+
+    dfit, dvalid, dtest = dmatrix("fit"), dmatrix("valid"), dmatrix("test")
+    params = {"objective": "reg:squarederror", "eval_metric": "mae", "nthread": 1, "seed": seed, **config}
+    booster = xgb.train(
+        params, dfit, num_boost_round=MAX_BOOST_ROUNDS, evals=[(dvalid, "valid")],
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False
+    )
+    pred = booster.predict(dtest, iteration_range=(0, booster.best_iteration + 1))
+    result = scores(dtest.get_label(), pred)
+    result["best_iteration"] = int(booster.best_iteration)
+    return result
+
+
+def run_rf(config, entry, seed):
+    from sklearn.ensemble import RandomForestRegressor
+
+    X, y = load_part(entry, "train")
+    X_test, y_test = load_part(entry, "test")
+    model = RandomForestRegressor(random_state=seed, n_jobs=1, **config)
+    model.fit(np.asarray(X), y)
+    return scores(y_test, model.predict(np.asarray(X_test)))
+
+
+def run_linear(config, entry, seed):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    X, y = load_part(entry, "train")
+    X_test, y_test = load_part(entry, "test")
+    model = make_pipeline(StandardScaler(), LinearRegression())
+    model.fit(np.asarray(X), y)
+    return scores(y_test, model.predict(np.asarray(X_test)))
+
+
+RUNNERS = {"xgboost": run_xgb, "random_forest": run_rf, "linear": run_linear}
+
+
+def run_job(family, config_id, config, entry, seed):
+    result = RUNNERS[family](config, entry, seed)
+    result.update(family=family, config_id=config_id, fold=entry["fold"])
+    return result
+
+
+# === Leaderboard
+def leaderboard(results, configs):
+    df = pd.DataFrame(results)
+    if df.empty:
+        return pd.DataFrame(columns=["family", "config_id", "mae_mean", "mae_std", "rmse_mean", "r2_mean", "folds", "params"])
+    agg = df.groupby(["family", "config_id"]).agg(
+        mae_mean=("mae", "mean"), mae_std=("mae", "std"),
+        rmse_mean=("rmse", "mean"), r2_mean=("r2", "mean"),
+        folds=("fold", "count"),
+    ).reset_index()
+    if "best_iteration" in df:
+        iters = df.groupby(["family", "config_id"])["best_iteration"].mean().rename("best_iteration_mean")
+        agg = agg.merge(iters.reset_index(), on=["family", "config_id"], how="left")
+    agg["params"] = [json.dumps(configs[(f, c)]) for f, c in zip(agg["family"], agg["config_id"])]
+    return agg.sort_values("mae_mean").reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="District-blocked CV + hyperparameter search for Tmrt regressors")
+    parser.add_argument("--data", required=True, help="BCN_dataset_complete.csv (or Parquet)")
+    parser.add_argument("--cache-dir", default="cv_cache")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--trials", type=int, default=30, help="Sampled configs per model family")
+    parser.add_argument("--families", nargs="+", default=["xgboost", "random_forest", "linear"], choices=sorted(RUNNERS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="leaderboard.csv")
+    args = parser.parse_args()
+
+    manifest = build_fold_cache(args.data, args.cache_dir, args.folds, seed=args.seed)
+    spaces = {"xgboost": XGB_SPACE, "random_forest": RF_SPACE, "linear": {}}
+
+    configs = {}
+    for family in args.families:
+        for i, config in enumerate(sample_configs(spaces[family], args.trials, args.seed)):
+            configs[(family, i)] = config
+
+    jobs = [(family, cid, config, entry) for (family, cid), config in configs.items() for entry in manifest["folds"]]
+    print(f"▶️ {len(configs)} configs × {len(manifest['folds'])} folds = {len(jobs)} jobs on {args.workers} workers")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_job, family, cid, config, entry, args.seed) for family, cid, config, entry in jobs]
+        for n, future in enumerate(as_completed(futures), 1):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"❌ Job failed: {e}")
+            if n % 50 == 0 or n == len(futures):
+                print(f"  {n}/{len(futures)} jobs done")
+
+    if not results:
+        print("❌ Every job failed, no leaderboard written")
+        return 1
+    board = leaderboard(results, configs)
+    board.to_csv(args.out, index=False)
+    print(board.head(10).to_string(index=False))
+    print(f"✅ Leaderboard saved to: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
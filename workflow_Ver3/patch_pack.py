@@ -0,0 +1,79 @@
+import os
+import argparse
+import numpy as np
+import rasterio
+
+# ----------------------------------------------------------------------------------
+# 📦 Pack simulated patches into a single .npz for calibration / validation
+# ----------------------------------------------------------------------------------
+# Each patch folder from 01_get_urban_notebook holds dsm.tif, cdsm.tif and
+# combined_landuse.tif (2 = building); after UMEP it also holds svf.tif and
+# Tmrt_average.tif. Reading thousands of small GeoTIFFs is slow, so they are
+# stacked once into (N, 128, 128) arrays. Missing targets are stored as NaN.
+
+base_dir = r"C:\Users\Ardo\Desktop\thesis2\patches_combined"
+packed_path = os.path.join(base_dir, "patches_packed.npz")
+
+INPUTS = ("dsm.tif", "cdsm.tif", "combined_landuse.tif")
+TARGETS = {"svf": "svf.tif", "tmrt": "Tmrt_average.tif"}
+
+
+def read_band(path):
+    with rasterio.open(path) as src:
+        return src.read(1)
+
+
+def pack_patches(base_dir, out_path, size=128, limit=None):
+    names, dsm, cdsm, buildings = [], [], [], []
+    targets = {key: [] for key in TARGETS}
+
+    for folder in sorted(os.listdir(base_dir)):
+        folder_path = os.path.join(base_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        if not all(os.path.exists(os.path.join(folder_path, f)) for f in INPUTS):
+            continue
+
+        d = read_band(os.path.join(folder_path, "dsm.tif")).astype(np.float32)
+        if d.shape != (size, size):
+            print(f"⚠️ Skipped {folder}: shape {d.shape}")
+            continue
+        names.append(folder)
+        dsm.append(d)
+        cdsm.append(read_band(os.path.join(folder_path, "cdsm.tif")).astype(np.float32))
+        buildings.append((read_band(os.path.join(folder_path, "combined_landuse.tif")) == 2).astype(np.uint8))
+
+        for key, filename in TARGETS.items():
+            path = os.path.join(folder_path, filename)
+            if os.path.exists(path):
+                targets[key].append(read_band(path).astype(np.float32))
+            else:
+                targets[key].append(np.full((size, size), np.nan, dtype=np.float32))
+
+        if limit and len(names) >= limit:
+            break
+
+    np.savez_compressed(
+        out_path,
+        names=np.array(names),
+        dsm=np.stack(dsm) if dsm else np.zeros((0, size, size), np.float32),
+        cdsm=np.stack(cdsm) if cdsm else np.zeros((0, size, size), np.float32),
+        buildings=np.stack(buildings) if buildings else np.zeros((0, size, size), np.uint8),
+        **{key: np.stack(v) if v else np.zeros((0, size, size), np.float32) for key, v in targets.items()}
+    )
+    print(f"✅ Packed {len(names)} patches → {out_path}")
+    return len(names)
+
+
+def load_packed(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack patch folders into one .npz")
+    parser.add_argument("--base-dir", default=base_dir)
+    parser.add_argument("--out", default=packed_path)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    pack_patches(args.base_dir, args.out, limit=args.limit)
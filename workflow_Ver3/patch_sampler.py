@@ -0,0 +1,247 @@
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+from street_predictor import TARGET, add_derived_features, feature_matrix, read_streets
+
+# ----------------------------------------------------------------------------------
+# 🎯 Patch selection: stratified sampling, fingerprint dedup, active learning
+# ----------------------------------------------------------------------------------
+# Replaces roads_gdf.sample(n=2000, random_state=42) in the patch notebook.
+#   1. Strata: quantile bins of width (Street_Buffer), H/W (Aspect_Ratio),
+#      orientation (ANGLE folded to 0–180°) and canopy (Relative_Canopy, with a
+#      separate "no trees" bin). Samples per stratum ∝ sqrt(stratum size), at
+#      least one each, so rare street types are not drowned by common ones.
+#   2. Fingerprints: building heights (HEIGHT_STEP levels) and canopy presence on a
+#      coarse grid over the 128 m window around the street midpoint, hashed; a
+#      window identical to an already picked one is skipped.
+#   3. Active learning (--labeled): a random forest trained on the simulated
+#      streets scores the rest; the spread over its trees is the uncertainty and
+#      the most uncertain streets are picked, round-robin over strata.
+# Usage:
+#   python patch_sampler.py --features BCN_dataset_complete.parquet --n 2000 --out sampled_c_tram_ids.csv
+#   python patch_sampler.py --features ... --labeled sampled_c_tram_ids.csv --n 200 --out round_02.csv
+
+ROADS_PATH = "C:/Users/Ardo/Desktop/thesis2/BCN_GrafVial_Trams_ETRS89_SHP.shp"
+BUILDINGS_PATH = "C:/Users/Ardo/Desktop/thesis2/Barcelona.geojson"
+TREES_PATH = "C:/Users/Ardo/Desktop/thesis2/bcn_trees.geojson"
+
+STRATA_BINS = {"Street_Buffer": 4, "Aspect_Ratio": 4, "Orientation": 4, "Relative_Canopy": 3}
+WINDOW_SIZE = 128.0  # m, patch window of the notebook
+FINGERPRINT_CELLS = 16  # fingerprint grid per side (8 m cells)
+HEIGHT_STEP = 3.0  # m, roughly one storey
+CANOPY_RADIUS = 3.0  # m, as the patch rasterization
+OVERSAMPLE = 3  # candidates drawn per requested sample, to refill after dedup
+ENSEMBLE_TREES = 200
+
+
+# === Strata
+def quantile_bins(values, bins):
+    ranks = pd.Series(values).rank(method="average", pct=True).to_numpy()
+    return np.minimum((ranks * bins).astype(np.int64), bins - 1)
+
+
+def assign_strata(df, strata_bins=STRATA_BINS):
+    df = add_derived_features(df)
+    angle = df["ANGLE"] if "ANGLE" in df else np.rad2deg(pd.to_numeric(df["ANGLE_rad"], errors="coerce"))
+    angle = pd.to_numeric(angle, errors="coerce").fillna(0).to_numpy()
+    columns = {
+        "Street_Buffer": pd.to_numeric(df["Street_Buffer"], errors="coerce").fillna(0).to_numpy(),
+        "Aspect_Ratio": np.nan_to_num(df["Aspect_Ratio"].to_numpy(dtype=np.float64), posinf=0.0),
+        "Orientation": np.mod(angle, 180.0),
+        "Relative_Canopy": np.nan_to_num(df["Relative_Canopy"].to_numpy(dtype=np.float64), posinf=0.0),
+    }
+    codes = []
+    for name, bins in strata_bins.items():
+        values = columns[name]
+        if name == "Orientation":
+            code = np.minimum((values / (180.0 / bins)).astype(np.int64), bins - 1)
+        elif name == "Relative_Canopy":
+            code = np.zeros(len(values), dtype=np.int64)
+            has = values > 0
+            if has.any():
+                code[has] = 1 + quantile_bins(values[has], bins - 1)
+        else:
+            code = quantile_bins(values, bins)
+        codes.append(code.astype(str))
+    return pd.Series(["-".join(c) for c in zip(*codes)], index=df.index, name="stratum")
+
+
+def allocate(stratum_sizes, n):
+    # sqrt-proportional allocation, ≥ 1 per stratum, capped by stratum size
+    weights = np.sqrt(stratum_sizes.to_numpy(dtype=np.float64))
+    alloc = np.maximum(1, np.floor(weights / weights.sum() * n)).astype(np.int64)
+    alloc = np.minimum(alloc, stratum_sizes.to_numpy())
+    order = np.argsort(-weights)
+    i = 0
+    while alloc.sum() < min(n, stratum_sizes.sum()):
+        k = order[i % len(order)]
+        if alloc[k] < stratum_sizes.iloc[k]:
+            alloc[k] += 1
+        i += 1
+    return pd.Series(alloc, index=stratum_sizes.index)
+
+
+# === Fingerprints
+def window_centres(roads, c_trams):
+    lines = roads.set_index(roads["C_Tram"].astype(str)).geometry
+    lines = lines[~lines.index.duplicated()].reindex(pd.Index(c_trams).astype(str))
+    centres = np.full((len(lines), 2), np.nan)
+    valid = lines.notna().to_numpy()
+    if valid.any():
+        mids = shapely.line_interpolate_point(lines[valid].to_numpy(), 0.5, normalized=True)
+        centres[valid] = shapely.get_coordinates(mids)
+    return centres
+
+
+def fingerprints(centres, buildings, building_heights, trees, window=WINDOW_SIZE, cells=FINGERPRINT_CELLS):
+    # Height / canopy sampled at cell centres of every window in two STRtree queries
+    n = len(centres)
+    step = window / cells
+    offsets = (np.arange(cells) + 0.5) * step - window / 2
+    gx, gy = np.meshgrid(offsets, -offsets)
+    px = (centres[:, 0, None] + gx.ravel()[None, :]).ravel()
+    py = (centres[:, 1, None] + gy.ravel()[None, :]).ravel()
+    ok = np.isfinite(px)
+    points = shapely.points(np.column_stack([np.where(ok, px, 0), np.where(ok, py, 0)]))
+
+    height = np.zeros(len(points), dtype=np.float64)
+    pi, bi = STRtree(buildings).query(points, predicate="within")
+    np.maximum.at(height, pi, building_heights[bi])
+    canopy = np.zeros(len(points), dtype=bool)
+    if len(trees):
+        ti, _ = STRtree(trees).query(points, predicate="dwithin", distance=CANOPY_RADIUS)
+        canopy[ti] = True
+
+    code = (np.round(height / HEIGHT_STEP).astype(np.int16) * 2 + canopy).reshape(n, cells * cells)
+    hashes = np.array([hashlib.blake2b(row.tobytes(), digest_size=8).hexdigest() for row in code])
+    hashes[~np.isfinite(centres).all(axis=1)] = ""
+    return hashes
+
+
+def dedupe(order, hashes, taken=()):
+    # Keep order, drop windows whose fingerprint was already picked (empty = unknown, always kept)
+    seen = set(h for h in taken if h)
+    keep = []
+    for i in order:
+        h = hashes[i]
+        if h and h in seen:
+            continue
+        seen.add(h)
+        keep.append(i)
+    return np.array(keep, dtype=np.int64)
+
+
+# === Selection
+def stratified_candidates(strata, n, rng, oversample=OVERSAMPLE):
+    sizes = strata.value_counts().sort_index()
+    alloc = allocate(sizes, n)
+    picks = []
+    for stratum, k in alloc.items():
+        idx = np.flatnonzero(strata.to_numpy() == stratum)
+        take = min(len(idx), k * oversample)
+        chosen = rng.choice(idx, size=take, replace=False)
+        # Stratum quota first, the rest are reserves for windows lost to dedup
+        picks.append(pd.DataFrame({"row": chosen, "stratum": stratum, "rank": np.arange(take) / max(k, 1)}))
+    return pd.concat(picks).sort_values("rank", kind="stable")["row"].to_numpy()
+
+
+def uncertainty(labeled, pool, n_trees=ENSEMBLE_TREES, seed=42):
+    from sklearn.ensemble import RandomForestRegressor
+
+    X = feature_matrix(add_derived_features(labeled))
+    y = pd.to_numeric(labeled[TARGET], errors="coerce").to_numpy(dtype=np.float32)
+    keep = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
+    model = RandomForestRegressor(n_estimators=n_trees, min_samples_leaf=3, n_jobs=-1, random_state=seed)
+    model.fit(X[keep], y[keep])
+
+    Xp = feature_matrix(pool)
+    valid = ~np.isnan(Xp).any(axis=1)
+    spread = np.full(len(pool), -np.inf)
+    if valid.any():
+        per_tree = np.stack([tree.predict(Xp[valid]) for tree in model.estimators_])
+        spread[valid] = per_tree.std(axis=0)
+    return spread
+
+
+def round_robin(order, strata):
+    # Interleave strata, each in the given order, so one stratum cannot fill the round
+    ranks = pd.Series(np.arange(len(order))).groupby(strata.to_numpy()[order]).cumcount().to_numpy()
+    return order[np.lexsort((np.arange(len(order)), ranks))]
+
+
+def select(df, n, hashes, seed=42, labeled_ids=None, labeled=None):
+    rng = np.random.default_rng(seed)
+    df = add_derived_features(df)  # the uncertainty pool needs the derived columns
+    strata = assign_strata(df)
+    taken_hashes = ()
+    pool = np.arange(len(df))
+    if labeled_ids is not None:
+        is_labeled = df["C_Tram"].astype(str).isin(labeled_ids).to_numpy()
+        taken_hashes = hashes[is_labeled]
+        pool = np.flatnonzero(~is_labeled)
+
+    if labeled is None:
+        order = pool[stratified_candidates(strata.iloc[pool], n, rng)]
+        mode = "stratified"
+    else:
+        score = uncertainty(labeled, df.iloc[pool], seed=seed)
+        ranking = np.argsort(-score, kind="stable")
+        ranked = pool[ranking[np.isfinite(score[ranking])]]
+        order = round_robin(ranked[:n * OVERSAMPLE], strata)
+        mode = "active"
+
+    chosen = dedupe(order, hashes, taken_hashes)[:n]
+    out = pd.DataFrame({
+        "C_Tram": df["C_Tram"].to_numpy()[chosen],
+        "stratum": strata.to_numpy()[chosen],
+        "fingerprint": hashes[chosen],
+        "mode": mode,
+    })
+    if labeled is not None:
+        out["uncertainty"] = score[np.searchsorted(pool, chosen)]
+    return out
+
+
+def main():
+    from street_geometry import read_layer, building_heights
+
+    parser = argparse.ArgumentParser(description="Stratified / active-learning selection of street patches for SOLWEIG")
+    parser.add_argument("--features", required=True, help="Street feature table (street_features.py output)")
+    parser.add_argument("--roads", default=ROADS_PATH)
+    parser.add_argument("--buildings", default=BUILDINGS_PATH)
+    parser.add_argument("--trees", default=TREES_PATH)
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--labeled", help="Already simulated streets (C_Tram + Tmrt_Buildings_Mean) → active-learning round")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="sampled_c_tram_ids.csv")
+    args = parser.parse_args()
+
+    df = read_streets(args.features)
+    df = df[~df["C_Tram"].astype(str).duplicated()].reset_index(drop=True)
+
+    roads = read_layer(args.roads)
+    buildings = read_layer(args.buildings)
+    trees = read_layer(args.trees)
+    centres = window_centres(roads, df["C_Tram"].astype(str))
+    hashes = fingerprints(centres, buildings.geometry.to_numpy(), building_heights(buildings), trees.geometry.to_numpy())
+    print(f"▶️ {len(df)} streets, {len(set(hashes) - {''})} distinct window fingerprints")
+
+    labeled_ids, labeled = None, None
+    if args.labeled:
+        labeled = pd.read_csv(args.labeled)
+        labeled["C_Tram"] = labeled["C_Tram"].astype(str)
+        labeled_ids = set(labeled["C_Tram"])
+        base = df.drop(columns=[TARGET], errors="ignore").assign(C_Tram=df["C_Tram"].astype(str))
+        labeled = base.merge(labeled[["C_Tram", TARGET]], on="C_Tram")
+
+    out = select(df, args.n, hashes, args.seed, labeled_ids, labeled)
+    out.to_csv(args.out, index=False)
+    print(f"✅ {len(out)} streets over {out['stratum'].nunique()} strata saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# ----------------------------------------------------------------------------------
+# ⏱️ Stage / request profiling → JSON-lines log
+# ----------------------------------------------------------------------------------
+# Stage records (batch pipeline): wall and CPU seconds, peak RSS sampled while the
+# stage runs, and bytes read / written by the process, one line per folder and stage.
+# Request records (app.py): wall seconds per phase of one Hops call.
+# Only the standard library is required; psutil is used when installed (needed
+# for RSS / IO on Windows, on Linux /proc is read directly).
+# Usage:
+#   with profiling.stage("svf", unit=folder, log=path): ...
+#   timer = profiling.PhaseTimer("full_svf_pipeline"); with timer.phase("cnn"): ...; timer.finish(path)
+#   python profiling.py summary pipeline_profile.jsonl
+
+SAMPLE_INTERVAL = 0.05  # s between RSS samples
+MB = 1024 * 1024
+
+_write_lock = threading.Lock()
+
+
+# === Process counters
+def rss_bytes():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def io_bytes():
+    if psutil is not None:
+        try:
+            c = psutil.Process().io_counters()
+            return c.read_bytes, c.write_bytes
+        except (AttributeError, psutil.Error):
+            pass
+    try:
+        values = {}
+        with open("/proc/self/io") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                values[key] = int(value)
+        return values.get("rchar", 0), values.get("wchar", 0)
+    except OSError:
+        return 0, 0
+
+
+class RssSampler(threading.Thread):
+    # Polls RSS in the background; peak is the max seen while running
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_bytes()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, rss_bytes())
+        return self.peak
+
+
+# === Log
+def write_record(path, record):
+    if not path:
+        return
+    record.setdefault("ts", time.time())
+    record.setdefault("pid", os.getpid())
+    line = json.dumps(record) + "\n"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@contextmanager
+def stage(name, unit="", log=None, **extra):
+    """Profile one stage on one unit (folder); the record is logged even on failure."""
+    sampler = RssSampler()
+    sampler.start()
+    read0, write0 = io_bytes()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    record = {"kind": "stage", "stage": name, "unit": str(unit), **extra}
+    try:
+        yield record
+        record["ok"] = True
+    except BaseException:
+        record["ok"] = False
+        raise
+    finally:
+        read1, write1 = io_bytes()
+        record.update(
+            wall_s=round(time.perf_counter() - wall0, 4),
+            cpu_s=round(time.process_time() - cpu0, 4),
+            peak_rss_mb=round(sampler.stop() / MB, 1),
+            read_mb=round((read1 - read0) / MB, 3),
+            write_mb=round((write1 - write0) / MB, 3),
+        )
+        write_record(log, record)
+
+
+def stage_timer(log):
+    # Callable handed to stage scripts: timer("svf", unit) → context manager
+    def timer(name, unit=""):
+        return stage(name, unit=unit, log=log)
+    return timer
+
+
+class PhaseTimer:
+    """Wall time per phase of one request; phases with the same name add up.
+
+    on_phase(name) is called as each phase starts (job progress / cancellation).
+    """
+
+    def __init__(self, request, on_phase=None, **extra):
+        self.request = request
+        self.on_phase = on_phase
+        self.extra = extra
+        self.phases = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        if self.on_phase is not None:
+            self.on_phase(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - t0
+
+    def residual(self, outer, inner, name):
+        # Replace an enclosing phase by what is left after its timed inner phases
+        total = self.phases.pop(outer, 0.0)
+        self.phases[name] = self.phases.get(name, 0.0) + max(0.0, total - sum(self.phases.get(p, 0.0) for p in inner))
+
+    def wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return fn(*args, **kwargs)
+        return timed
+
+    def finish(self, log, ok=True):
+        record = {
+            "kind": "request", "request": self.request, "ok": ok,
+            "total_s": round(time.perf_counter() - self.start, 4),
+            "phases": {k: round(v, 4) for k, v in self.phases.items()},
+            **self.extra,
+        }
+        write_record(log, record)
+        return record
+
+
+# === Summary
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(records):
+    stages, requests = {}, {}
+    for r in records:
+        if r.get("kind") == "stage":
+            stages.setdefault(r["stage"], []).append(r)
+        elif r.get("kind") == "request":
+            requests.setdefault(r["request"], []).append(r)
+
+    lines = []
+    if stages:
+        total_wall = sum(r["wall_s"] for rs in stages.values() for r in rs) or 1.0
+        lines.append(f"{'stage':<16}{'n':>7}{'fail':>6}{'wall h':>9}{'share':>7}{'mean s':>9}{'p95 s':>9}"
+                     f"{'cpu/wall':>9}{'peak MB':>9}{'read MB':>10}{'write MB':>10}")
+        for name, rs in sorted(stages.items(), key=lambda kv: -sum(r["wall_s"] for r in kv[1])):
+            wall = [r["wall_s"] for r in rs]
+            cpu = sum(r["cpu_s"] for r in rs)
+            lines.append(
+                f"{name:<16}{len(rs):>7}{sum(not r.get('ok', True) for r in rs):>6}"
+                f"{sum(wall) / 3600:>9.2f}{sum(wall) / total_wall:>7.0%}{sum(wall) / len(wall):>9.2f}"
+                f"{percentile(wall, 0.95):>9.2f}{cpu / max(sum(wall), 1e-9):>9.2f}"
+                f"{max(r['peak_rss_mb'] for r in rs):>9.0f}"
+                f"{sum(r['read_mb'] for r in rs):>10.0f}{sum(r['write_mb'] for r in rs):>10.0f}"
+            )
+    for name, rs in sorted(requests.items()):
+        totals = [r["total_s"] for r in rs]
+        lines.append("")
+        lines.append(f"{name}: {len(rs)} requests, mean {1000 * sum(totals) / len(totals):.0f} ms, "
+                     f"p95 {1000 * percentile(totals, 0.95):.0f} ms")
+        phase_names = sorted({p for r in rs for p in r["phases"]}, key=lambda p: -sum(r["phases"].get(p, 0) for r in rs))
+        for p in phase_names:
+            values = [r["phases"].get(p, 0.0) for r in rs]
+            lines.append(f"  {p:<12}{1000 * sum(values) / len(values):>9.1f} ms{sum(values) / max(sum(totals), 1e-9):>7.0%}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a profiling JSON-lines log")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summary")
+    summary.add_argument("log", nargs="+")
+    args = parser.parse_args()
+
+    records = [r for path in args.log for r in read_records(path)]
+    print(summarize(records) or "No records")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+import tiled_inference
+import inference_backends
+from patch_pack import load_packed
+
+# ----------------------------------------------------------------------------------
+# 🗜️ int8 calibration for the SVF CNN + accuracy report for the int8 mode
+# ----------------------------------------------------------------------------------
+# 1. Static (calibrated on packed patches) or dynamic int8 quantization of
+#    svf_cnn.onnx → svf_cnn_int8.onnx. The dense GAT is quantized dynamically when
+#    the server starts with TMRT_QUANTIZE=int8, so it needs no file.
+# 2. Runs float and int8 backends over the packed patches and reports the MAE
+#    delta on SVF and Tmrt (°C), against the float model and against UMEP.
+# Usage:
+#   python patch_pack.py --base-dir D:/patches_combined --out patches_packed.npz
+#   python quantize_models.py --packed patches_packed.npz --model-dir .
+
+
+def packed_inputs(packed, start=0, limit=None):
+    stop = len(packed["names"]) if limit is None else min(start + limit, len(packed["names"]))
+    dsm = np.empty((stop - start,) + packed["dsm"].shape[1:], dtype=np.float32)
+    cdsm = np.empty_like(dsm)
+    for i in range(start, stop):
+        dsm[i - start], cdsm[i - start] = tiled_inference.normalise_heights(packed["dsm"][i], packed["cdsm"][i])
+    buildings = packed["buildings"][start:stop].astype(np.float32)
+    return dsm, cdsm, buildings
+
+
+def calibration_reader(batch, input_name, batch_size=4):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class PatchReader(CalibrationDataReader):
+        def __init__(self):
+            self.feeds = iter([
+                {input_name: batch[i:i + batch_size]} for i in range(0, len(batch), batch_size)
+            ])
+
+        def get_next(self):
+            return next(self.feeds, None)
+
+    return PatchReader()
+
+
+def quantize_cnn(model_dir, packed, mode, calib_samples):
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    float_path = os.path.join(model_dir, inference_backends.CNN_ONNX)
+    int8_path = os.path.join(model_dir, inference_backends.CNN_ONNX_INT8)
+
+    if mode == "dynamic":
+        quantize_dynamic(float_path, int8_path, weight_type=QuantType.QInt8)
+    else:
+        input_name = ort.InferenceSession(float_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        dsm, cdsm, _ = packed_inputs(packed, 0, calib_samples)
+        batch = np.stack([dsm, cdsm], axis=-1)
+        quantize_static(
+            float_path, int8_path, calibration_reader(batch, input_name),
+            quant_format=QuantFormat.QDQ, per_channel=True,
+            activation_type=QuantType.QInt8, weight_type=QuantType.QInt8
+        )
+    print(f"✅ int8 CNN written ({mode}): {int8_path}")
+
+
+def nan_mae(a, b):
+    return float(np.nanmean(np.abs(a - b)))
+
+
+def predict_all(backend, dsm, cdsm, buildings, batch_size=8):
+    svf, tmrt = [], []
+    for start in range(0, len(dsm), batch_size):
+        d, c, b = dsm[start:start + batch_size], cdsm[start:start + batch_size], buildings[start:start + batch_size]
+        s = backend.predict_svf(np.stack([d, c], axis=-1))
+        x = np.stack([tiled_inference.single_tile_features(d[i], c[i], s[i], b[i]) for i in range(len(d))])
+        svf.append(s)
+        tmrt.append(backend.predict_tmrt(x).reshape(s.shape))
+    return np.concatenate(svf), np.concatenate(tmrt)
+
+
+def accuracy_report(model_dir, backend_name, packed, start, samples):
+    # Evaluated on patches after the calibration set when there are enough of them
+    start = start if len(packed["names"]) > start else 0
+    dsm, cdsm, buildings = packed_inputs(packed, start, samples)
+    n = len(dsm)
+    float_backend = inference_backends.load_backend(backend_name, model_dir)
+    int8_backend = inference_backends.load_backend(backend_name, model_dir, quantize="int8")
+
+    svf_f, tmrt_f = predict_all(float_backend, dsm, cdsm, buildings)
+    svf_q, tmrt_q = predict_all(int8_backend, dsm, cdsm, buildings)
+
+    report = {
+        "backend": backend_name,
+        "patches": n,
+        "svf_mae_int8_vs_float": nan_mae(svf_q, svf_f),
+        "tmrt_mae_int8_vs_float_C": nan_mae(tmrt_q, tmrt_f),
+    }
+    svf_true, tmrt_true = packed["svf"][start:start + n], packed["tmrt"][start:start + n]
+    if np.isfinite(svf_true).any():
+        report["svf_mae_float_vs_umep"] = nan_mae(svf_f, svf_true)
+        report["svf_mae_int8_vs_umep"] = nan_mae(svf_q, svf_true)
+        report["svf_mae_delta"] = report["svf_mae_int8_vs_umep"] - report["svf_mae_float_vs_umep"]
+    if np.isfinite(tmrt_true).any():
+        report["tmrt_mae_float_vs_umep_C"] = nan_mae(tmrt_f, tmrt_true)
+        report["tmrt_mae_int8_vs_umep_C"] = nan_mae(tmrt_q, tmrt_true)
+        report["tmrt_mae_delta_C"] = report["tmrt_mae_int8_vs_umep_C"] - report["tmrt_mae_float_vs_umep_C"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate int8 SVF CNN and report int8 accuracy")
+    parser.add_argument("--packed", required=True, help="Output of patch_pack.py")
+    parser.add_argument("--model-dir", default=".")
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--backend", choices=["dense"], default="dense", help="int8 needs the dense GAT")
+    parser.add_argument("--calib-samples", type=int, default=64)
+    parser.add_argument("--eval-samples", type=int, default=256)
+    parser.add_argument("--report", default="quantization_report.json")
+    parser.add_argument("--report-only", action="store_true")
+    args = parser.parse_args()
+
+    packed = load_packed(args.packed)
+    if not len(packed["names"]):
+        print("❌ No patches in packed file")
+        return 1
+
+    if not args.report_only:
+        quantize_cnn(args.model_dir, packed, args.mode, args.calib_samples)
+
+    report = accuracy_report(args.model_dir, args.backend, packed, args.calib_samples, args.eval_samples)
+    report["mode"] = args.mode
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for key, value in report.items():
+        print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
+    print(f"✅ Report saved to: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
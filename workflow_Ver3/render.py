@@ -0,0 +1,125 @@
+import zlib
+import struct
+from functools import lru_cache
+import numpy as np
+
+# ----------------------------------------------------------------------------------
+# 🎨 Raster → PNG without matplotlib / PIL
+# ----------------------------------------------------------------------------------
+# Colormaps are embedded as control points (ColorBrewer Spectral, as matplotlib
+# builds it) and expanded once per (cmap, entries) into a uint8 LUT; a raster is
+# mapped by one scale-and-clip to integer indices and a LUT take, the same binning
+# as matplotlib's Colormap.__call__ (index = int(norm · N)). PNGs are written with
+# zlib at a low compression level (fast, ~10 % larger than level 6).
+# Other colormap names fall back to matplotlib, imported only then.
+# Usage:
+#   render.save_png("predicted_tmrt.png", tmrt, preset="tmrt", mask=building_mask == 0)
+#   render.legend("svf")  → {"cmap", "vmin", "vmax", "unit", "ticks": [[value, "#rrggbb"], ...]}
+
+LUT_SIZE = 256  # 1024 for smooth gradients on wide value ranges
+PNG_LEVEL = 1  # zlib level: 1 = fastest
+MASK_COLOR = (255, 255, 255)  # buildings
+BAD_COLOR = (0, 0, 0)  # NaN, as matplotlib's default "bad" colour without alpha
+
+CONTROL_POINTS = {
+    # ColorBrewer 11-class Spectral, evenly spaced (matplotlib "Spectral")
+    "Spectral": ["#9e0142", "#d53e4f", "#f46d43", "#fdae61", "#fee08b", "#ffffbf",
+                 "#e6f598", "#abdda4", "#66c2a5", "#3288bd", "#5e4fa2"],
+    "Greys": ["#ffffff", "#000000"],
+}
+
+PRESETS = {
+    "tmrt": {"cmap": "Spectral_r", "vmin": 15.0, "vmax": 40.0, "unit": "°C", "ticks": 6},
+    "svf": {"cmap": "Spectral_r", "vmin": 0.0, "vmax": 1.0, "unit": "", "ticks": 6},
+    "height": {"cmap": "Greys", "vmin": 0.0, "vmax": 40.0, "unit": "m", "ticks": 5},
+}
+
+
+# === LUTs
+def hex_to_rgb(value):
+    value = value.lstrip("#")
+    return [int(value[i:i + 2], 16) / 255.0 for i in (0, 2, 4)]
+
+
+@lru_cache(maxsize=32)
+def lut(cmap="Spectral_r", entries=LUT_SIZE):
+    """(entries, 3) uint8 colours of a colormap; "_r" reverses it."""
+    name, reverse = (cmap[:-2], True) if cmap.endswith("_r") else (cmap, False)
+    x = np.linspace(0, 1, entries)
+    if name in CONTROL_POINTS:
+        points = np.array([hex_to_rgb(c) for c in CONTROL_POINTS[name]])
+        if reverse:
+            points = points[::-1]
+        at = np.linspace(0, 1, len(points))
+        rgb = np.stack([np.interp(x, at, points[:, k]) for k in range(3)], axis=1)
+    else:
+        import matplotlib
+
+        rgb = matplotlib.colormaps[cmap].resampled(entries)(np.arange(entries))[:, :3]
+    table = (rgb * 255).astype(np.uint8)
+    table.setflags(write=False)
+    return table
+
+
+# === Mapping
+def colorize(array, cmap="Spectral_r", vmin=0.0, vmax=1.0, entries=LUT_SIZE, mask=None,
+             mask_color=MASK_COLOR, bad_color=BAD_COLOR):
+    """Float raster → (rows, cols, 3) uint8; mask=True pixels get mask_color."""
+    array = np.asarray(array, dtype=np.float32)
+    scale = np.float32(entries / (vmax - vmin)) if vmax > vmin else np.float32(0)
+    scaled = (array - np.float32(vmin)) * scale
+    bad = ~np.isfinite(scaled)
+    idx = np.clip(np.where(bad, 0, scaled), 0, entries - 1).astype(np.intp)
+    img = lut(cmap, entries).take(idx, axis=0)
+    if bad.any():
+        img[bad] = bad_color
+    if mask is not None:
+        img[np.asarray(mask, dtype=bool)] = mask_color
+    return img
+
+
+def preset_settings(preset=None, **overrides):
+    settings = dict(PRESETS[preset]) if preset else {"cmap": "Spectral_r", "vmin": 0.0, "vmax": 1.0}
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    return settings
+
+
+def legend(preset, entries=LUT_SIZE):
+    settings = preset_settings(preset)
+    values = np.linspace(settings["vmin"], settings["vmax"], settings.get("ticks", 6))
+    colours = colorize(values[None, :], settings["cmap"], settings["vmin"], settings["vmax"], entries)[0]
+    return {
+        "cmap": settings["cmap"], "vmin": settings["vmin"], "vmax": settings["vmax"],
+        "unit": settings.get("unit", ""),
+        "ticks": [[round(float(v), 3), "#%02x%02x%02x" % tuple(int(c) for c in rgb)] for v, rgb in zip(values, colours)],
+    }
+
+
+# === PNG
+def _chunk(kind, data):
+    body = kind + data
+    return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+
+def encode_png(img, level=PNG_LEVEL):
+    """(rows, cols, 3) uint8 → PNG bytes (8-bit RGB, filter type 0 on every row)."""
+    img = np.ascontiguousarray(img, dtype=np.uint8)
+    rows, cols = img.shape[:2]
+    raw = np.zeros((rows, cols * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = img.reshape(rows, cols * 3)
+    header = struct.pack(">IIBBBBB", cols, rows, 8, 2, 0, 0, 0)
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _chunk(b"IHDR", header),
+        _chunk(b"IDAT", zlib.compress(raw.tobytes(), level)),
+        _chunk(b"IEND", b""),
+    ])
+
+
+def save_png(path, array, preset=None, mask=None, cmap=None, vmin=None, vmax=None,
+             entries=LUT_SIZE, level=PNG_LEVEL):
+    settings = preset_settings(preset, cmap=cmap, vmin=vmin, vmax=vmax)
+    img = colorize(array, settings["cmap"], settings["vmin"], settings["vmax"], entries, mask)
+    with open(path, "wb") as f:
+        f.write(encode_png(img, level))
+    return path
@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+import numpy as np
+import shapely
+
+# ----------------------------------------------------------------------------------
+# 🗄️ Tmrt results store: SQLite + R-tree over raster tiles
+# ----------------------------------------------------------------------------------
+# Every simulated (UMEP patch folder) and predicted (Hops request) Tmrt raster is
+# kept in one SQLite file, cut into TILE×TILE px tiles (zlib float32 blobs), each
+# tile indexed by its bounds in an R*Tree. Results carry source, timestamp, model
+# version, climate scenario and footprint (WKB). Point / polygon / street queries
+# only decompress the tiles the R-tree returns, no raster file is opened.
+# Same idea as a GeoPackage (SQLite + R-tree + tiles) with a simpler schema: no GDAL
+# needed to write or read it.
+# Usage:
+#   python results_store.py ingest --db tmrt_results.sqlite --base-dir C:/Users/Ardo/Desktop/thesis/processed --scenario BCN_17Jul
+#   python results_store.py point --db tmrt_results.sqlite --x 430120 --y 4581230
+#   python results_store.py street --db tmrt_results.sqlite --wkt "LINESTRING (...)" --width 12
+#   python results_store.py street --db ... --c-tram T19824V --roads BCN_GrafVial_Trams_ETRS89_SHP.shp
+
+TILE = 128  # px per tile side
+STREET_WIDTH = 10.0  # m, corridor around a street line when no width is given
+SIMULATED, PREDICTED = "simulated", "predicted"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    source TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    model_version TEXT,
+    scenario TEXT,
+    crs TEXT,
+    transform TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    tmrt_mean REAL,
+    tmrt_min REAL,
+    tmrt_max REAL,
+    footprint BLOB,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS results_filter ON results (source, scenario, model_version);
+CREATE TABLE IF NOT EXISTS tiles (
+    id INTEGER PRIMARY KEY,
+    result_id INTEGER NOT NULL REFERENCES results (id) ON DELETE CASCADE,
+    row0 INTEGER NOT NULL,
+    col0 INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tiles_result ON tiles (result_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS tiles_rtree USING rtree (id, minx, maxx, miny, maxy);
+"""
+FILTERS = ("source", "scenario", "model_version")
+
+
+# === Affine helpers (rasterio order: a, b, c, d, e, f)
+def as_affine(transform):
+    return tuple(float(v) for v in tuple(transform)[:6])
+
+
+def pixel_to_world(transform, rows, cols):
+    a, b, c, d, e, f = transform
+    return a * cols + b * rows + c, d * cols + e * rows + f
+
+
+def world_to_pixel(transform, x, y):
+    a, b, c, d, e, f = transform
+    det = a * e - b * d
+    x, y = np.asarray(x, dtype=np.float64) - c, np.asarray(y, dtype=np.float64) - f
+    return (a * y - d * x) / det, (e * x - b * y) / det  # (row, col), fractional
+
+
+def window_bounds(transform, row0, col0, rows, cols):
+    r = np.array([row0, row0, row0 + rows, row0 + rows], dtype=np.float64)
+    c = np.array([col0, col0 + cols, col0, col0 + cols], dtype=np.float64)
+    x, y = pixel_to_world(transform, r, c)
+    return x.min(), x.max(), y.min(), y.max()
+
+
+def encode(array):
+    return zlib.compress(np.ascontiguousarray(array, dtype=np.float32).tobytes(), 1)
+
+
+def decode(blob, rows, cols):
+    return np.frombuffer(zlib.decompress(blob), dtype=np.float32).reshape(rows, cols)
+
+
+# === Store
+class ResultsStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA foreign_keys=ON")
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # --- writing
+    def add(self, tmrt, transform, source, name="", crs=None, timestamp=None, model_version=None,
+            scenario=None, footprint=None, path=None, tile=TILE, replace=False):
+        """Store one raster; footprint defaults to the raster bounds. Returns the result id.
+
+        replace=True first drops the results stored for the same path (the file was
+        rewritten), in the same transaction.
+        """
+        tmrt = np.asarray(tmrt, dtype=np.float32)
+        transform = as_affine(transform)
+        rows, cols = tmrt.shape
+        if footprint is None:
+            minx, maxx, miny, maxy = window_bounds(transform, 0, 0, rows, cols)
+            footprint = shapely.box(minx, miny, maxx, maxy)
+        finite = tmrt[np.isfinite(tmrt)]
+        stats = (float(finite.mean()), float(finite.min()), float(finite.max())) if finite.size else (None, None, None)
+
+        with self.lock, self.conn:
+            if replace and path:
+                self._delete(self._ids_for_path(path))
+            cur = self.conn.execute(
+                "INSERT INTO results (name, source, timestamp, model_version, scenario, crs, transform, rows, cols, "
+                "tmrt_mean, tmrt_min, tmrt_max, footprint, path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, source, timestamp or time.time(), model_version, scenario, str(crs) if crs else None,
+                 json.dumps(transform), rows, cols, *stats, shapely.to_wkb(footprint), str(path) if path else None))
+            result_id = cur.lastrowid
+            for row0 in range(0, rows, tile):
+                for col0 in range(0, cols, tile):
+                    block = tmrt[row0:row0 + tile, col0:col0 + tile]
+                    if not np.isfinite(block).any():
+                        continue
+                    cur = self.conn.execute(
+                        "INSERT INTO tiles (result_id, row0, col0, rows, cols, data) VALUES (?, ?, ?, ?, ?, ?)",
+                        (result_id, row0, col0, block.shape[0], block.shape[1], encode(block)))
+                    self.conn.execute("INSERT INTO tiles_rtree VALUES (?, ?, ?, ?, ?)",
+                                      (cur.lastrowid, *window_bounds(transform, row0, col0, *block.shape)))
+        return result_id
+
+    def add_file(self, path, source, **kwargs):
+        import rasterio
+
+        with rasterio.open(path) as src:
+            tmrt = np.ma.filled(src.read(1, masked=True).astype(np.float32), np.nan)
+            kwargs.setdefault("crs", src.crs.to_string() if src.crs else None)
+            kwargs.setdefault("timestamp", os.path.getmtime(path))
+            return self.add(tmrt, src.transform, source, path=path, **kwargs)
+
+    def remove(self, result_id):
+        with self.lock, self.conn:
+            self._delete([result_id])
+
+    def _ids_for_path(self, path):
+        # Caller holds the lock
+        return [r["id"] for r in self.conn.execute("SELECT id FROM results WHERE path = ?", (str(path),))]
+
+    def _delete(self, result_ids):
+        # Caller holds the lock inside a transaction
+        for result_id in result_ids:
+            self.conn.execute("DELETE FROM tiles_rtree WHERE id IN (SELECT id FROM tiles WHERE result_id = ?)", (result_id,))
+            self.conn.execute("DELETE FROM tiles WHERE result_id = ?", (result_id,))
+            self.conn.execute("DELETE FROM results WHERE id = ?", (result_id,))
+
+    # --- reading
+    def candidate_tiles(self, bounds, filters=None):
+        minx, miny, maxx, maxy = bounds
+        sql = ("SELECT t.id, t.result_id, t.row0, t.col0, t.rows, t.cols, t.data, r.transform "
+               "FROM tiles_rtree x JOIN tiles t ON t.id = x.id JOIN results r ON r.id = t.result_id "
+               "WHERE x.minx <= ? AND x.maxx >= ? AND x.miny <= ? AND x.maxy >= ?")
+        params = [maxx, minx, maxy, miny]
+        for key, value in (filters or {}).items():
+            if key not in FILTERS:
+                raise ValueError(f"Unknown filter {key!r} (use {', '.join(FILTERS)})")
+            if value is not None:
+                sql += f" AND r.{key} = ?"
+                params.append(value)
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def results(self, ids):
+        if not ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, name, source, timestamp, model_version, scenario, path FROM results "
+                f"WHERE id IN ({', '.join('?' * len(ids))})", list(ids)).fetchall()
+        return {r["id"]: dict(r) for r in rows}
+
+    def query_point(self, x, y, filters=None):
+        hits = []
+        for t in self.candidate_tiles((x, y, x, y), filters):
+            transform = tuple(json.loads(t["transform"]))
+            r, c = world_to_pixel(transform, x, y)
+            r, c = int(np.floor(r)) - t["row0"], int(np.floor(c)) - t["col0"]
+            if 0 <= r < t["rows"] and 0 <= c < t["cols"]:
+                value = float(decode(t["data"], t["rows"], t["cols"])[r, c])
+                if np.isfinite(value):
+                    hits.append((t["result_id"], value))
+        meta = self.results({rid for rid, _ in hits})
+        return sorted(({**meta[rid], "tmrt": round(v, 2)} for rid, v in hits), key=lambda h: -h["timestamp"])
+
+    def query_polygon(self, geom, filters=None):
+        # Pixel centres inside geom, pooled per result
+        geom = shapely.from_wkt(geom) if isinstance(geom, str) else geom
+        shapely.prepare(geom)
+        values = {}
+        for t in self.candidate_tiles(shapely.bounds(geom), filters):
+            transform = tuple(json.loads(t["transform"]))
+            rr, cc = np.mgrid[0:t["rows"], 0:t["cols"]]
+            x, y = pixel_to_world(transform, rr + t["row0"] + 0.5, cc + t["col0"] + 0.5)
+            inside = shapely.contains_xy(geom, x, y)
+            if inside.any():
+                block = decode(t["data"], t["rows"], t["cols"])[inside]
+                values.setdefault(t["result_id"], []).append(block[np.isfinite(block)])
+        meta = self.results(values)
+        out = []
+        for rid, parts in values.items():
+            v = np.concatenate(parts)
+            if v.size:
+                out.append({**meta[rid], "n_px": int(v.size), "tmrt_mean": round(float(v.mean()), 2),
+                            "tmrt_min": round(float(v.min()), 2), "tmrt_max": round(float(v.max()), 2),
+                            "tmrt_p90": round(float(np.percentile(v, 90)), 2)})
+        return sorted(out, key=lambda h: -h["timestamp"])
+
+    def query_street(self, line, width=STREET_WIDTH, filters=None):
+        line = shapely.from_wkt(line) if isinstance(line, str) else line
+        return self.query_polygon(shapely.buffer(line, width / 2, cap_style="flat"), filters)
+
+
+def latest(hits):
+    # Newest hit per (source, scenario, model_version); hits are sorted newest first
+    seen, out = set(), []
+    for h in hits:
+        key = (h["source"], h["scenario"], h["model_version"])
+        if key not in seen:
+            seen.add(key)
+            out.append(h)
+    return out
+
+
+# === Ingestion of patch folders
+def ingest_folders(store, base_dir, raster="Tmrt_average.tif", scenario=None, model_version="SOLWEIG"):
+    # Re-ingesting a file replaces its previous result
+    added = 0
+    for path in sorted(Path(base_dir).rglob(raster)):
+        store.add_file(path, SIMULATED, name=path.parent.name, scenario=scenario, model_version=model_version,
+                       replace=True)
+        added += 1
+    return added
+
+
+def street_line(roads_path, c_tram):
+    from street_geometry import read_layer
+
+    roads = read_layer(roads_path)
+    match = roads[roads["C_Tram"].astype(str) == str(c_tram)]
+    if match.empty:
+        raise ValueError(f"No street {c_tram} in {roads_path}")
+    return shapely.union_all(match.geometry.to_numpy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spatially indexed store of simulated / predicted Tmrt")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("ingest", "point", "polygon", "street"):
+        p = sub.add_parser(name)
+        p.add_argument("--db", default="tmrt_results.sqlite")
+        if name != "ingest":
+            p.add_argument("--source", choices=[SIMULATED, PREDICTED])
+            p.add_argument("--scenario")
+            p.add_argument("--model-version")
+            p.add_argument("--latest", action="store_true", help="Only the newest result per source / scenario / model")
+    sub.choices["ingest"].add_argument("--base-dir", default=r"C:/Users/Ardo/Desktop/thesis/processed")
+    sub.choices["ingest"].add_argument("--raster", default="Tmrt_average.tif")
+    sub.choices["ingest"].add_argument("--scenario", default="BCN_17Jul")
+    sub.choices["point"].add_argument("--x", type=float, required=True)
+    sub.choices["point"].add_argument("--y", type=float, required=True)
+    sub.choices["polygon"].add_argument("--wkt", required=True)
+    sub.choices["street"].add_argument("--wkt", help="Street centre line (WKT)")
+    sub.choices["street"].add_argument("--c-tram", help="Street id, looked up in --roads")
+    sub.choices["street"].add_argument("--roads", default="C:/Users/Ardo/Desktop/thesis2/BCN_GrafVial_Trams_ETRS89_SHP.shp")
+    sub.choices["street"].add_argument("--width", type=float, default=STREET_WIDTH)
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.command == "ingest":
+        n = ingest_folders(store, args.base_dir, args.raster, args.scenario)
+        print(f"✅ {n} rasters ingested into: {args.db}")
+        return
+
+    filters = {"source": args.source, "scenario": args.scenario, "model_version": args.model_version}
+    if args.command == "point":
+        hits = store.query_point(args.x, args.y, filters)
+    elif args.command == "polygon":
+        hits = store.query_polygon(args.wkt, filters)
+    else:
+        line = args.wkt or street_line(args.roads, args.c_tram)
+        hits = store.query_street(line, args.width, filters)
+    if args.latest:
+        hits = latest(hits)
+    print(json.dumps(hits, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import json
+import time
+import heapq
+import argparse
+import numpy as np
+
+# ----------------------------------------------------------------------------------
+# 🧭 Thermal-comfort routing over the BCN_GrafVial_Trams street graph
+# ----------------------------------------------------------------------------------
+# build: street segments → CSR graph (nodes = segment ends snapped to SNAP m, both
+#   directions per segment), saved as one .npz with the segment coordinates.
+#   Tmrt per edge is sampled every STEP m along all lines at once (one
+#   line_interpolate_point call) from Tmrt rasters — a city mosaic or the patch
+#   Tmrt_average.tif files — read in row bands; segments without raster cover take
+#   the street-level prediction (street_predictor.py output) of their C_Tram.
+#   exposure = length × max(Tmrt − COMFORT, 0)  [°C·m above the comfort level]
+# queries (A* with the straight-line distance as heuristic, heapq):
+#   shortest   min length
+#   coolest    min length + alpha · exposure
+#   limit      shortest path with exposure ≤ limit: Lagrangian relaxation, bisection
+#              on λ in length + λ · exposure (a few A* runs)
+# Usage:
+#   python routing.py build --tmrt C:/Users/Ardo/Desktop/thesis2/patches_combined --streets BCN_GrafVial_Predicted_new.csv --out bcn_routing.npz
+#   python routing.py route --graph bcn_routing.npz --start 430120 4581230 --end 431010 4582400 --mode coolest --alpha 0.1
+
+SNAP = 0.5  # m, segment ends closer than this share a node
+STEP = 5.0  # m between Tmrt samples along a segment
+COMFORT = 35.0  # °C, Tmrt below this adds no exposure
+ALPHA = 0.1  # m of detour accepted per °C·m of exposure avoided
+LAMBDA_MAX = 100.0
+BISECTIONS = 12
+ROADS_PATH = "C:/Users/Ardo/Desktop/thesis2/BCN_GrafVial_Trams_ETRS89_SHP.shp"
+
+
+# === Graph building
+def segment_lines(roads):
+    # One LineString per row; multi-part streets are split, keeping their C_Tram
+    roads = roads.explode(index_parts=False).reset_index(drop=True)
+    roads = roads[roads.geometry.geom_type == "LineString"].reset_index(drop=True)
+    return roads.geometry.to_numpy(), roads["C_Tram"].astype(str).to_numpy()
+
+
+def build_csr(lines):
+    import shapely
+
+    starts = shapely.get_coordinates(shapely.get_point(lines, 0))
+    ends = shapely.get_coordinates(shapely.get_point(lines, -1))
+    keys = np.round(np.concatenate([starts, ends]) / SNAP).astype(np.int64)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    n = len(lines)
+    u, v = inverse[:n], inverse[n:]
+    # Node position = mean of the snapped ends
+    nodes = np.zeros((len(unique), 2))
+    np.add.at(nodes, inverse, np.concatenate([starts, ends]))
+    nodes /= np.bincount(inverse, minlength=len(unique))[:, None]
+
+    src = np.concatenate([u, v])
+    dst = np.concatenate([v, u])
+    segment = np.concatenate([np.arange(n), np.arange(n)])
+    forward = np.concatenate([np.ones(n, bool), np.zeros(n, bool)])
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(nodes)), out=indptr[1:])
+    return nodes, indptr, dst[order].astype(np.int32), segment[order].astype(np.int32), forward[order]
+
+
+def sample_points(lines, step=STEP):
+    # Sample positions at the middle of every step along each line, all lines in one call
+    import shapely
+
+    lengths = shapely.length(lines)
+    counts = np.maximum(1, np.ceil(lengths / step).astype(np.int64))
+    line_idx = np.repeat(np.arange(len(lines)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    k = np.arange(counts.sum()) - first
+    distance = (k + 0.5) * (lengths / counts)[line_idx]
+    xy = shapely.get_coordinates(shapely.line_interpolate_point(lines[line_idx], distance))
+    return xy, line_idx
+
+
+def raster_paths(source):
+    # A .tif, or a folder searched for Tmrt_average.tif (patch folders)
+    from pathlib import Path
+
+    source = Path(source)
+    return [source] if source.is_file() else sorted(source.rglob("Tmrt_average.tif"))
+
+
+def sample_raster(path, xy, total, count, band_rows=2048):
+    # Adds the valid samples inside the raster to total / count; reads row bands only
+    import rasterio
+    from rasterio.windows import Window
+
+    with rasterio.open(path) as src:
+        rows, cols = rasterio.transform.rowcol(src.transform, xy[:, 0], xy[:, 1])
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        inside = np.flatnonzero((rows >= 0) & (rows < src.height) & (cols >= 0) & (cols < src.width))
+        if not len(inside):
+            return
+        for r0 in range(rows[inside].min(), rows[inside].max() + 1, band_rows):
+            pick = inside[(rows[inside] >= r0) & (rows[inside] < r0 + band_rows)]
+            if not len(pick):
+                continue
+            height = min(band_rows, src.height - r0)
+            band = np.ma.filled(src.read(1, window=Window(0, r0, src.width, height), masked=True).astype(np.float32), np.nan)
+            values = band[rows[pick] - r0, cols[pick]]
+            ok = np.isfinite(values)
+            total[pick[ok]] += values[ok]
+            count[pick[ok]] += 1
+
+
+def edge_tmrt(lines, c_trams, tmrt_sources=(), street_tmrt=None, step=STEP):
+    xy, line_idx = sample_points(lines, step)
+    total, count = np.zeros(len(xy)), np.zeros(len(xy))
+    for source in tmrt_sources:
+        for path in raster_paths(source):
+            sample_raster(path, xy, total, count)
+    ok = count > 0
+    values = np.zeros(len(xy))
+    values[ok] = total[ok] / count[ok]
+    n = len(lines)
+    sums = np.bincount(line_idx[ok], weights=values[ok], minlength=n)
+    hits = np.bincount(line_idx[ok], minlength=n)
+    tmrt = np.where(hits > 0, sums / np.maximum(hits, 1), np.nan)
+    source = np.where(hits > 0, "raster", "").astype(object)
+
+    if street_tmrt:
+        missing = np.isnan(tmrt)
+        fill = np.array([street_tmrt.get(c, np.nan) for c in c_trams[missing]], dtype=np.float64)
+        tmrt[np.flatnonzero(missing)] = fill
+        source[np.flatnonzero(missing)[np.isfinite(fill)]] = "street"
+    missing = np.isnan(tmrt)
+    if missing.any():
+        tmrt[missing] = np.nanmedian(tmrt) if (~missing).any() else COMFORT
+        source[missing] = "median"
+    return tmrt, source, float(ok.mean()) if len(ok) else 0.0
+
+
+def read_street_tmrt(path):
+    from street_predictor import PREDICTION, TARGET, read_streets
+
+    df = read_streets(path)
+    column = PREDICTION if PREDICTION in df else TARGET
+    df = df.dropna(subset=[column])
+    return dict(zip(df["C_Tram"].astype(str), df[column].astype(float)))
+
+
+def build_graph(roads_path, out_path, tmrt_sources=(), streets_path=None, step=STEP):
+    import shapely
+    from street_geometry import read_layer
+
+    lines, c_trams = segment_lines(read_layer(roads_path))
+    nodes, indptr, indices, segment, forward = build_csr(lines)
+    street_tmrt = read_street_tmrt(streets_path) if streets_path else None
+    tmrt, source, coverage = edge_tmrt(lines, c_trams, tmrt_sources, street_tmrt, step)
+    coords, line_of = shapely.get_coordinates(lines, return_index=True)
+    coord_ptr = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(line_of, minlength=len(lines)), out=coord_ptr[1:])
+    np.savez_compressed(
+        out_path, nodes=nodes, indptr=indptr, indices=indices, segment=segment, forward=forward,
+        length=shapely.length(lines), tmrt=tmrt.astype(np.float32), tmrt_source=source.astype(str),
+        c_tram=c_trams.astype(str), coords=coords, coord_ptr=coord_ptr,
+    )
+    print(f"✅ {len(nodes)} nodes, {len(lines)} segments, {coverage:.0%} of Tmrt samples on a raster → {out_path}")
+    return out_path
+
+
+# === Graph + queries
+class StreetGraph:
+    def __init__(self, data, comfort=COMFORT):
+        self.nodes = data["nodes"]
+        self.indptr = data["indptr"]
+        self.indices = data["indices"]
+        self.segment = data["segment"]
+        self.forward = data["forward"]
+        self.length = data["length"]
+        self.tmrt = data["tmrt"].astype(np.float64)
+        self.c_tram = data["c_tram"]
+        self.coords = data["coords"]
+        self.coord_ptr = data["coord_ptr"]
+        # heapq search runs on plain lists: numpy scalar indexing is slower per edge
+        self.adj_ptr = self.indptr.tolist()
+        self.adj = self.indices.tolist()
+        self.xs, self.ys = self.nodes[:, 0].tolist(), self.nodes[:, 1].tolist()
+        self.set_comfort(comfort)
+
+    @classmethod
+    def load(cls, path, comfort=COMFORT):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({key: data[key] for key in data.files}, comfort)
+
+    def set_comfort(self, comfort):
+        self.comfort = comfort
+        self.exposure = self.length * np.maximum(self.tmrt - comfort, 0.0)
+        # Per CSR entry, so the search loop only indexes flat arrays
+        self.edge_length = self.length[self.segment]
+        self.edge_exposure = self.exposure[self.segment]
+
+    def nearest_node(self, x, y):
+        d = (self.nodes[:, 0] - x) ** 2 + (self.nodes[:, 1] - y) ** 2
+        i = int(np.argmin(d))
+        return i, float(np.sqrt(d[i]))
+
+    def astar(self, source, target, lam=0.0):
+        # Edge cost = length + lam · exposure ≥ length, so the straight-line distance is admissible
+        indptr, indices, xs, ys = self.adj_ptr, self.adj, self.xs, self.ys
+        cost = (self.edge_length + lam * self.edge_exposure).tolist()
+        tx, ty = xs[target], ys[target]
+        dist = {source: 0.0}
+        parent = {source: (-1, -1)}
+        done = set()
+        heap = [(0.0, 0.0, source)]
+        while heap:
+            _, g, u = heapq.heappop(heap)
+            if u == target:
+                break
+            if u in done:
+                continue
+            done.add(u)
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                ng = g + cost[k]
+                if ng < dist.get(v, float("inf")):
+                    dist[v] = ng
+                    parent[v] = (u, k)
+                    h = ((xs[v] - tx) ** 2 + (ys[v] - ty) ** 2) ** 0.5
+                    heapq.heappush(heap, (ng + h, ng, v))
+        if target not in parent:
+            return None
+        edges = []
+        node = target
+        while node != source:
+            node, k = parent[node]
+            edges.append(k)
+        return edges[::-1]
+
+    def summary(self, edges):
+        seg = self.segment[edges]
+        length = float(self.length[seg].sum())
+        return {
+            "length_m": round(length, 1),
+            "exposure_Cm": round(float(self.exposure[seg].sum()), 1),
+            "tmrt_mean": round(float((self.tmrt[seg] * self.length[seg]).sum() / length), 2) if length else None,
+            "tmrt_max": round(float(self.tmrt[seg].max()), 2) if len(seg) else None,
+            "segments": int(len(seg)),
+        }
+
+    def coordinates(self, edges):
+        parts = []
+        for k in edges:
+            s = self.segment[k]
+            xy = self.coords[self.coord_ptr[s]:self.coord_ptr[s + 1]]
+            xy = xy if self.forward[k] else xy[::-1]
+            parts.append(xy[1:] if parts else xy)
+        return np.concatenate(parts) if parts else np.empty((0, 2))
+
+    def exposure_limited(self, source, target, limit, lam_max=LAMBDA_MAX, bisections=BISECTIONS):
+        # Lagrangian relaxation: the shortest path if it meets the limit, else bisect λ
+        # for the shortest path found that still meets it
+        shortest = self.astar(source, target, 0.0)
+        if shortest is None or self.summary(shortest)["exposure_Cm"] <= limit:
+            return shortest, 0.0, True
+        best = self.astar(source, target, lam_max)
+        if self.summary(best)["exposure_Cm"] > limit:
+            return best, lam_max, False  # the coolest path still exceeds the limit
+        lo, hi = 0.0, lam_max
+        for _ in range(bisections):
+            mid = (lo + hi) / 2
+            path = self.astar(source, target, mid)
+            if self.summary(path)["exposure_Cm"] <= limit:
+                best, hi = path, mid
+            else:
+                lo = mid
+        return best, hi, True
+
+    def route(self, start, end, mode="coolest", alpha=ALPHA, limit=None):
+        source, snap_a = self.nearest_node(*start)
+        target, snap_b = self.nearest_node(*end)
+        t0 = time.perf_counter()
+        feasible, lam = True, 0.0
+        if mode == "shortest":
+            edges = self.astar(source, target, 0.0)
+        elif mode == "coolest":
+            edges, lam = self.astar(source, target, alpha), alpha
+        elif mode == "limit":
+            if limit is None:
+                raise ValueError("mode 'limit' needs an exposure limit (°C·m)")
+            edges, lam, feasible = self.exposure_limited(source, target, limit)
+        else:
+            raise ValueError(f"Unknown routing mode {mode!r} (use shortest, coolest or limit)")
+        if edges is None:
+            raise ValueError("Start and end are not connected in the street graph")
+        stats = self.summary(edges)
+        stats.update({"mode": mode, "lambda": lam, "feasible": feasible, "comfort_C": self.comfort,
+                      "snap_m": [round(snap_a, 1), round(snap_b, 1)],
+                      "query_ms": round(1000 * (time.perf_counter() - t0), 1)})
+        return edges, stats
+
+    def geojson(self, edges, stats):
+        return {"type": "Feature", "properties": {**stats, "C_Tram": [str(c) for c in self.c_tram[self.segment[edges]]]},
+                "geometry": {"type": "LineString", "coordinates": self.coordinates(edges).round(2).tolist()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tmrt-aware pedestrian routing on the street graph")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("--roads", default=ROADS_PATH)
+    build.add_argument("--tmrt", nargs="*", default=[], help="Tmrt rasters or folders with Tmrt_average.tif")
+    build.add_argument("--streets", help="Street Tmrt table (street_predictor.py output) for segments off the rasters")
+    build.add_argument("--step", type=float, default=STEP)
+    build.add_argument("--out", default="bcn_routing.npz")
+    route = sub.add_parser("route")
+    route.add_argument("--graph", default="bcn_routing.npz")
+    route.add_argument("--start", type=float, nargs=2, required=True, metavar=("X", "Y"))
+    route.add_argument("--end", type=float, nargs=2, required=True, metavar=("X", "Y"))
+    route.add_argument("--mode", choices=["shortest", "coolest", "limit"], default="coolest")
+    route.add_argument("--alpha", type=float, default=ALPHA)
+    route.add_argument("--limit", type=float, help="Max exposure in °C·m (mode limit)")
+    route.add_argument("--comfort", type=float, default=COMFORT)
+    route.add_argument("--out", help="GeoJSON file for the route")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_graph(args.roads, args.out, args.tmrt, args.streets, args.step)
+        return
+
+    graph = StreetGraph.load(args.graph, args.comfort)
+    edges, stats = graph.route(args.start, args.end, args.mode, args.alpha, args.limit)
+    print(json.dumps(stats, indent=1))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"type": "FeatureCollection", "features": [graph.geojson(edges, stats)]}, f)
+        print(f"✅ Route saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
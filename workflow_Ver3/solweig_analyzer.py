@@ -0,0 +1,237 @@
+import os
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import tmrt_aggregation
+
+# ----------------------------------------------------------------------------------
+# 📈 SOLWEIG Analyzer without QGIS: per-patch Tmrt metrics → one Parquet table
+# ----------------------------------------------------------------------------------
+# Replaces processing.run("umep:Outdoor Thermal Comfort: SOLWEIG Analyzer") with the
+# settings of the UMEP scripts (buildings masked, TMRT_THRES_NUM 55, above threshold).
+# Per patch, in one pass over the hourly Tmrt stack — or over Tmrt_summary.tif when
+# the hourly files were already folded by tmrt_aggregation.py:
+#   per pixel: time mean / max / min and % of timesteps above the threshold
+#   per patch: spatial mean / max / min of those over ground pixels (buildings out),
+#              mean and max % of time above, share of ground above the threshold
+# Building mask: buildings.tif (0 = building, as UMEP) → combined_landuse.tif (2) → dsm > 0.
+# Patches run in parallel; rows are merged into the table by patch name (CSV instead of
+# Parquet when neither pyarrow nor fastparquet is installed).
+# Usage:
+#   python solweig_analyzer.py --base-dir C:/Users/Ardo/Desktop/thesis2/patches_combined --out solweig_metrics.parquet
+#   python solweig_analyzer.py --base-dir ... --threshold 55 --rasters   (+ Tmrt_analyzer.tif per patch)
+
+THRESHOLD = 55.0  # °C, TMRT_THRES_NUM
+TABLE_NAME = "solweig_metrics.parquet"
+RASTER_NAME = "Tmrt_analyzer.tif"
+RASTER_BANDS = ["mean", "max", "min", "pct_above"]
+
+
+# === Inputs
+def read_band(path, index=1):
+    import rasterio
+
+    with rasterio.open(path) as src:
+        return np.ma.filled(src.read(index, masked=True).astype(np.float32), np.nan), src.profile
+
+
+def ground_mask(folder, shape):
+    # True where Tmrt counts (not a building)
+    folder = Path(folder)
+    if (folder / "buildings.tif").exists():
+        buildings, _ = read_band(folder / "buildings.tif")
+        return buildings > 0
+    if (folder / "combined_landuse.tif").exists():
+        landuse, _ = read_band(folder / "combined_landuse.tif")
+        return landuse != 2
+    if (folder / "dsm.tif").exists():
+        dsm, _ = read_band(folder / "dsm.tif")
+        return ~(dsm > 0)
+    return np.ones(shape, dtype=bool)
+
+
+def pixel_stats_hourly(paths, threshold):
+    # Time statistics from the hourly rasters (stacked once, reduced along time)
+    stack, profile = [], None
+    for tmrt, prof in tmrt_aggregation.iter_rasters(paths):
+        stack.append(tmrt)
+        profile = profile or prof
+    stack = np.stack(stack)
+    with np.errstate(invalid="ignore"):
+        valid = np.isfinite(stack).sum(axis=0)
+        stats = {
+            "mean": np.nanmean(stack, axis=0),
+            "max": np.nanmax(stack, axis=0),
+            "min": np.nanmin(stack, axis=0),
+            "pct_above": 100.0 * (stack > threshold).sum(axis=0) / np.maximum(valid, 1),
+        }
+    return stats, len(paths), profile
+
+
+def pixel_stats_summary(path, threshold):
+    # Same statistics from Tmrt_summary.tif; the threshold must be one of its bands
+    import rasterio
+
+    with rasterio.open(path) as src:
+        names = list(src.descriptions)
+        band = f"hours_above_{threshold:g}"
+        if band not in names:
+            raise ValueError(f"{path} has no {band} band (bands: {', '.join(n for n in names if n)})")
+        tags = src.tags()
+        steps = int(tags.get("timesteps", 0))
+        step_hours = float(tags.get("step_hours", tmrt_aggregation.STEP_HOURS))
+        read = lambda name: np.ma.filled(src.read(names.index(name) + 1, masked=True).astype(np.float32), np.nan)
+        stats = {
+            "mean": read("mean"),
+            "max": read("max"),
+            "min": read("min"),
+            "pct_above": 100.0 * read(band) / max(steps * step_hours, 1e-9),
+        }
+        return stats, steps, src.profile
+
+
+# === Analysis
+def patch_metrics(stats, ground, threshold):
+    g = ground & np.isfinite(stats["mean"])
+    if not g.any():
+        return {"ground_px": 0}
+    mean = stats["mean"][g]
+    pct = stats["pct_above"][g]
+    tag = f"{threshold:g}"
+    return {
+        "ground_px": int(g.sum()),
+        "tmrt_mean": float(mean.mean()),
+        "tmrt_max": float(np.nanmax(stats["max"][g])),
+        "tmrt_min": float(np.nanmin(stats["min"][g])),
+        "tmrt_mean_max": float(mean.max()),
+        "tmrt_mean_min": float(mean.min()),
+        f"pct_time_above_{tag}": float(pct.mean()),
+        f"pct_time_above_{tag}_max": float(pct.max()),
+        f"pct_area_ever_above_{tag}": float(100.0 * (pct > 0).mean()),
+    }
+
+
+def write_rasters(path, stats, ground, profile):
+    import rasterio
+
+    profile = {**profile, "driver": "GTiff", "count": len(RASTER_BANDS), "dtype": "float32", "nodata": np.nan}
+    with rasterio.open(path, "w", **profile) as dst:
+        for i, name in enumerate(RASTER_BANDS, start=1):
+            dst.write(np.where(ground, stats[name], np.nan).astype(np.float32), i)
+            dst.set_band_description(i, name)
+
+
+def analyze_folder(folder, threshold=THRESHOLD, rasters=False):
+    folder = Path(folder)
+    hourly = tmrt_aggregation.hourly_files(folder)
+    summary = folder / tmrt_aggregation.SUMMARY_NAME
+    if hourly:
+        stats, steps, profile = pixel_stats_hourly(hourly, threshold)
+        source = "hourly"
+    elif summary.exists():
+        stats, steps, profile = pixel_stats_summary(summary, threshold)
+        source = "summary"
+    else:
+        return None
+
+    ground = ground_mask(folder, stats["mean"].shape)
+    if ground.shape != stats["mean"].shape:
+        raise ValueError(f"Building mask {ground.shape} does not match Tmrt {stats['mean'].shape}")
+    if rasters:
+        write_rasters(folder / RASTER_NAME, stats, ground, profile)
+    return {"patch": folder.name, "source": source, "timesteps": steps, "threshold": threshold,
+            **patch_metrics(stats, ground, threshold)}
+
+
+def _analyze(args):
+    folder, threshold, rasters = args
+    try:
+        return analyze_folder(folder, threshold, rasters), None
+    except Exception as e:
+        return None, f"{Path(folder).name}: {e}"
+
+
+def analyze_folders(folders, threshold=THRESHOLD, rasters=False, workers=None):
+    rows, errors = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for row, error in pool.map(_analyze, [(f, threshold, rasters) for f in folders], chunksize=8):
+            if error:
+                errors.append(error)
+            elif row:
+                rows.append(row)
+    return pd.DataFrame(rows), errors
+
+
+# === Table
+def parquet_engine():
+    for name in ("pyarrow", "fastparquet"):
+        try:
+            __import__(name)
+            return name
+        except ImportError:
+            continue
+    return None
+
+
+def table_path(path):
+    # The QGIS Python may have no Parquet engine: fall back to CSV next to it
+    path = str(path)
+    if path.endswith(".parquet") and parquet_engine() is None:
+        return path[:-len(".parquet")] + ".csv"
+    return path
+
+
+def read_table(path):
+    return pd.read_parquet(path) if str(path).endswith(".parquet") else pd.read_csv(path)
+
+
+def write_table(path, df):
+    """Write df atomically as Parquet, or as CSV without an engine; returns the path written."""
+    path = table_path(path)
+    tmp = path + ".tmp"
+    if path.endswith(".parquet"):
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def update_table(path, df):
+    """Merge df into the table at path (Parquet, or CSV without an engine); returns (table, path written)."""
+    # Rows of re-analyzed patches replace the old ones; other patches are kept
+    path = table_path(path)
+    if df.empty:
+        # Nothing analyzed: keep the existing table as it is
+        return (read_table(path) if os.path.exists(path) else df), path
+    if os.path.exists(path):
+        old = read_table(path)
+        df = pd.concat([old[~old["patch"].isin(df["patch"])], df], ignore_index=True)
+    df = df.sort_values("patch").reset_index(drop=True)
+    return df, write_table(path, df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-patch SOLWEIG Tmrt metrics (buildings masked) into a Parquet table")
+    parser.add_argument("--base-dir", default=r"C:/Users/Ardo/Desktop/thesis2/patches_combined")
+    parser.add_argument("--out", default=None, help=f"Parquet table (default: <base-dir>/{TABLE_NAME})")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--rasters", action="store_true", help=f"Also write {RASTER_NAME} per patch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    folders = sorted(p for p in Path(args.base_dir).iterdir() if p.is_dir())
+    out = args.out or os.path.join(args.base_dir, TABLE_NAME)
+    print(f"▶️ {len(folders)} folders in {args.base_dir}")
+    df, errors = analyze_folders(folders, args.threshold, args.rasters, args.workers)
+    for error in errors:
+        print(f"❌ {error}")
+    table, out = update_table(out, df)
+    print(f"✅ {len(df)} patches analyzed, {len(table)} rows in: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os
+import json
+import math
+import argparse
+import numpy as np
+import pandas as pd
+
+import canopy
+from street_predictor import add_derived_features
+
+# ----------------------------------------------------------------------------------
+# 🧱 Street feature table (replaces the chained read_csv / merge cells of 04_csv_creator)
+# ----------------------------------------------------------------------------------
+# Every source is read once with explicit columns and dtypes, reduced to one row
+# per street, indexed by an integer C_Tram and cached as Parquet. Sources whose
+# file did not change since the last run are taken from the cache. The final
+# table is a single index join plus the derived features, written as Parquet.
+# Usage:
+#   python street_features.py --config street_features.json --out BCN_dataset_complete.parquet
+
+CANOPY_RADIUS = 2.0  # m, canopy area assumption of 04_csv_creator (4 m diameter)
+
+DEFAULT_SOURCES = {
+    "streets": r"C:\Users\Andrea\Desktop\thesis\Modified_CSV_Street\BCN_GrafVial_CSV\BCN_GrafVial_Trams_ETRS89_CSV.csv",
+    "heights": r"C:\Users\Andrea\Desktop\thesis\Modified_CSV_Street\25-0902 BCN Data\Road_BuildingHeight.csv",
+    "buffer": r"C:\Users\Andrea\Desktop\thesis\Modified_CSV_Street\25-0902 BCN Data\BufferStreet_Distance.csv",
+    "trees_left": r"C:\Users\Andrea\Desktop\thesis\Modified_CSV_Street\25-0902 BCN Data\Street_Trees_Left.csv",
+    "trees_right": r"C:\Users\Andrea\Desktop\thesis\Modified_CSV_Street\25-0902 BCN Data\Street_Trees_Right.csv",
+    "tmrt": r"D:\sampled_c_tram_ids.csv",
+}
+# Setting "geometry" to a street_geometry.py Parquet replaces the heights, buffer and tree CSVs
+
+
+# === Helpers
+def tram_index(values):
+    # Integer C_Tram when every id is numeric, categorical otherwise
+    numeric = pd.to_numeric(values, errors="coerce")
+    if numeric.notna().all() and (numeric % 1 == 0).all():
+        return pd.Index(numeric.astype(np.int64), name="C_Tram")
+    return pd.CategoricalIndex(values.astype(str), name="C_Tram")
+
+
+def read_table(path, columns, dtypes=None, **kwargs):
+    df = pd.read_csv(path, **kwargs)
+    df.columns = df.columns.str.strip()
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise KeyError(f"{os.path.basename(path)} is missing columns {missing}")
+    df = df[columns]
+    if dtypes:
+        df = df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+    return df
+
+
+def by_tram(df):
+    df = df.copy()
+    df.index = tram_index(df.pop("C_Tram"))
+    return df
+
+
+# === Source loaders: path → one row per C_Tram
+def load_streets(path):
+    """Street graph CSV → one row per C_Tram; of duplicated ids the first row is kept (and reported)."""
+    df = pd.read_csv(path, encoding="latin1", delimiter=";")
+    df.columns = df.columns.str.strip()
+    df = by_tram(df)
+    if "ANGLE" in df.columns:
+        angle = pd.to_numeric(df["ANGLE"], errors="coerce").to_numpy(dtype=np.float64)
+        df["ANGLE_rad"] = np.deg2rad(angle)
+        df["ANGLE_sin"] = np.sin(df["ANGLE_rad"])
+        df["ANGLE_cos"] = np.cos(df["ANGLE_rad"])
+    duplicated = df.index.duplicated()
+    if duplicated.any():
+        ids = pd.unique(np.asarray(df.index[duplicated]).astype(str))
+        shown = ", ".join(ids[:10]) + (f", … (+{len(ids) - 10})" if len(ids) > 10 else "")
+        print(f"⚠️ {os.path.basename(path)}: dropped {int(duplicated.sum())} duplicate rows of "
+              f"{len(ids)} C_Tram ids, first row kept: {shown}")
+    return df[~duplicated]
+
+
+def load_heights(path):
+    df = read_table(path, ["C_Tram", "BuildingHeight_Right", "BuildingHeight_Left"],
+                    {"BuildingHeight_Right": "float32", "BuildingHeight_Left": "float32"})
+    return by_tram(df).groupby(level=0, observed=True).mean()
+
+
+def load_buffer(path):
+    df = read_table(path, ["C_Tram", "Street_Buffer"], {"Street_Buffer": "float32"})
+    return by_tram(df).groupby(level=0, observed=True).first()
+
+
+def load_trees(path):
+    df = read_table(path, ["C_Tram", "source_pke", "height", "circumfere"],
+                    {"height": "float32", "circumfere": "float32"})
+    return by_tram(df)
+
+
+def load_geometry(path):
+    # street_geometry.py output: heights, width and trees already one row per street
+    return by_tram(pd.read_parquet(path))
+
+
+def load_tmrt(path):
+    df = read_table(path, ["C_Tram", "Tmrt_Buildings_Mean"], {"Tmrt_Buildings_Mean": "float32"})
+    return by_tram(df).groupby(level=0, observed=True).mean()
+
+
+LOADERS = {
+    "streets": load_streets,
+    "heights": load_heights,
+    "buffer": load_buffer,
+    "trees_left": load_trees,
+    "trees_right": load_trees,
+    "geometry": load_geometry,
+    "tmrt": load_tmrt,
+}
+
+
+def tree_aggregates(tree_frames, canopy_radius=CANOPY_RADIUS, per_tree_canopy=False):
+    # Left and right sides pooled per street, as in the Merged_Street_Trees cell.
+    # per_tree_canopy sums each tree's own crown (canopy.py radius) instead of
+    # the fixed canopy_radius the trained model was fitted on.
+    trees = pd.concat(tree_frames)
+    grouped = trees.groupby(level=0, observed=True).agg(
+        Number_of_Trees=("source_pke", "count"),
+        Mean_Tree_Height=("height", "mean"),
+        Mean_Tree_Circumfere=("circumfere", "mean"),
+    )
+    if per_tree_canopy:
+        area = pd.Series(canopy.canopy_area(canopy.radii_from_frame(trees, default=canopy_radius)), index=trees.index)
+        grouped["Total_Canopy_Area_m2"] = area.groupby(level=0, observed=True).sum()
+    else:
+        grouped["Total_Canopy_Area_m2"] = grouped["Number_of_Trees"] * (math.pi * canopy_radius ** 2)
+    return grouped
+
+
+# === Cache
+def source_signature(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def load_sources(sources, cache_dir, force=()):
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    frames, rebuilt = {}, []
+    for name, path in sources.items():
+        if not path:
+            continue
+        cache_path = os.path.join(cache_dir, f"{name}.parquet")
+        signature = source_signature(path)
+        if name not in force and manifest.get(name) == signature and os.path.exists(cache_path):
+            frames[name] = pd.read_parquet(cache_path)
+            continue
+        frames[name] = LOADERS[name](path)
+        frames[name].to_parquet(cache_path)
+        manifest[name] = signature
+        rebuilt.append(name)
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return frames, rebuilt
+
+
+# === Build
+def build_feature_table(frames, canopy_radius=CANOPY_RADIUS, per_tree_canopy=False):
+    df = frames["streets"]
+
+    if "geometry" in frames:
+        df = df.join(frames["geometry"], how="left")
+    elif "heights" in frames:
+        df = df.join(frames["heights"], how="left")
+    for col in ("BuildingHeight_Right", "BuildingHeight_Left"):
+        df[col] = df[col].fillna(0.0).round(1) if col in df else 0.0
+    df["BuildingHeight_Mean"] = df[["BuildingHeight_Right", "BuildingHeight_Left"]].mean(axis=1).round(1)
+
+    if "buffer" in frames and "geometry" not in frames:
+        df = df.join(frames["buffer"], how="left")
+    df["Street_Buffer"] = df["Street_Buffer"].fillna(0.0).round(2) if "Street_Buffer" in df else 0.0
+
+    tree_frames = [frames[k] for k in ("trees_left", "trees_right") if k in frames]
+    if tree_frames and "geometry" not in frames:
+        df = df.join(tree_aggregates(tree_frames, canopy_radius, per_tree_canopy), how="left")
+    df["Number_of_Trees"] = df["Number_of_Trees"].fillna(0).astype(np.int32) if "Number_of_Trees" in df else 0
+    for col in ("Mean_Tree_Height", "Mean_Tree_Circumfere", "Total_Canopy_Area_m2"):
+        df[col] = df[col].fillna(0.0).round(2) if col in df else 0.0
+
+    if "tmrt" in frames:
+        df = df.join(frames["tmrt"], how="left")
+
+    return add_derived_features(df).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the street feature table as one Parquet file")
+    parser.add_argument("--config", help="JSON file mapping source name → path (see DEFAULT_SOURCES)")
+    parser.add_argument("--out", default="BCN_dataset_complete.parquet")
+    parser.add_argument("--cache-dir", default="street_features_cache")
+    parser.add_argument("--force", nargs="*", default=[], help="Sources to reload even if unchanged")
+    parser.add_argument("--canopy-radius", type=float, default=CANOPY_RADIUS)
+    parser.add_argument("--per-tree-canopy", action="store_true", help="Canopy area from each tree's circumference / species")
+    args = parser.parse_args()
+
+    sources = dict(DEFAULT_SOURCES)
+    if args.config:
+        with open(args.config) as f:
+            sources.update(json.load(f))
+
+    frames, rebuilt = load_sources(sources, args.cache_dir, set(args.force))
+    print(f"♻️ Reloaded: {', '.join(rebuilt) or 'nothing'}; cached: {', '.join(sorted(set(frames) - set(rebuilt))) or 'nothing'}")
+
+    df = build_feature_table(frames, args.canopy_radius, args.per_tree_canopy)
+    df.to_parquet(args.out, index=False)
+    print(f"✅ {len(df)} streets × {df.shape[1]} columns saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely import STRtree
+
+import canopy
+from street_features import CANOPY_RADIUS
+
+# ----------------------------------------------------------------------------------
+# 📐 Street geometry features straight from the GIS layers
+# ----------------------------------------------------------------------------------
+# Regenerates the columns of Road_BuildingHeight.csv, BufferStreet_Distance.csv
+# and Street_Trees_Left/Right.csv for every BCN_GrafVial_Trams segment:
+#   - left / right single-sided buffers of SIDE_WIDTH around each centreline
+#   - BuildingHeight_Left/Right: mean height of the buildings touching that side
+#   - Street_Buffer: facade-to-facade width, i.e. the distance to the nearest
+#     building on the left plus on the right (SIDE_WIDTH when a side is open)
+#   - tree count / mean height / mean circumference / canopy area over both sides
+#     (fixed radius, or per-tree crowns from canopy.py with --per-tree-canopy)
+# Buildings and trees are matched with one STRtree query per layer and side
+# (vectorized shapely 2, no per-street loops). Districts run in a process pool,
+# each worker only receiving the buildings and trees around its own streets.
+# Usage:
+#   python street_geometry.py --out street_geometry.parquet --workers 8
+#   (then "geometry": "street_geometry.parquet" in the street_features.py config)
+
+SIDE_WIDTH = 25.0  # m searched on each side of the centreline
+DISTRICT_COLUMN = "Distric_D"
+CRS_EPSG = 25831
+
+ROADS_PATH = "C:/Users/Ardo/Desktop/thesis2/BCN_GrafVial_Trams_ETRS89_SHP.shp"
+BUILDINGS_PATH = "C:/Users/Ardo/Desktop/thesis2/Barcelona.geojson"
+TREES_PATH = "C:/Users/Ardo/Desktop/thesis2/bcn_trees.geojson"
+
+GEOMETRY_COLUMNS = [
+    "BuildingHeight_Right",
+    "BuildingHeight_Left",
+    "Street_Buffer",
+    "Number_of_Trees",
+    "Mean_Tree_Height",
+    "Mean_Tree_Circumfere",
+    "Total_Canopy_Area_m2",
+]
+
+
+# === Layers
+def read_layer(path):
+    gdf = gpd.read_file(path)
+    if gdf.crs is None or gdf.crs.to_epsg() != CRS_EPSG:
+        gdf = gdf.to_crs(epsg=CRS_EPSG)
+    return gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty].reset_index(drop=True)
+
+
+def building_heights(buildings):
+    # Same rule as the patch notebook: explicit height, else Z_MAX_VOL - Z_MIN_VOL
+    if "height" in buildings:
+        h = pd.to_numeric(buildings["height"], errors="coerce")
+    elif "Z_MAX_VOL" in buildings and "Z_MIN_VOL" in buildings:
+        h = pd.to_numeric(buildings["Z_MAX_VOL"], errors="coerce") - pd.to_numeric(buildings["Z_MIN_VOL"], errors="coerce")
+    else:
+        h = pd.Series(0.0, index=buildings.index)
+    return h.fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def tree_column(trees, name):
+    if name not in trees:
+        return np.full(len(trees), np.nan)
+    return pd.to_numeric(trees[name], errors="coerce").to_numpy(dtype=np.float64)
+
+
+# === Per-district worker
+def group_mean(index, values, n):
+    # Mean of values per index, ignoring NaN; 0 where a street has no valid value
+    valid = np.isfinite(values)
+    total = np.bincount(index[valid], weights=values[valid], minlength=n)
+    count = np.bincount(index[valid], minlength=n)
+    return np.where(count > 0, total / np.maximum(count, 1), 0.0)
+
+
+def side_buildings(lines, sides, buildings, heights, side_width):
+    n = len(lines)
+    street_idx, building_idx = STRtree(buildings).query(sides, predicate="intersects")
+    mean_height = group_mean(street_idx, heights[building_idx], n)
+    nearest = np.full(n, side_width)
+    np.minimum.at(nearest, street_idx, shapely.distance(lines[street_idx], buildings[building_idx]))
+    return mean_height, np.minimum(nearest, side_width)
+
+
+def extract_district(payload):
+    lines = shapely.from_wkb(payload["lines"])
+    buildings = shapely.from_wkb(payload["buildings"])
+    trees = shapely.from_wkb(payload["trees"])
+    side_width = payload["side_width"]
+    n = len(lines)
+
+    # Positive distance = left of the line direction, negative = right
+    left = shapely.buffer(lines, side_width, single_sided=True)
+    right = shapely.buffer(lines, -side_width, single_sided=True)
+
+    out = pd.DataFrame({"C_Tram": payload["c_tram"]})
+    out["BuildingHeight_Left"], left_dist = side_buildings(lines, left, buildings, payload["heights"], side_width)
+    out["BuildingHeight_Right"], right_dist = side_buildings(lines, right, buildings, payload["heights"], side_width)
+    out["Street_Buffer"] = left_dist + right_dist
+
+    # Trees on either side, a tree counted once per street even where both buffers meet
+    tree_index = STRtree(trees)
+    pairs = np.concatenate([
+        tree_index.query(left, predicate="intersects"),
+        tree_index.query(right, predicate="intersects"),
+    ], axis=1)
+    street_idx, tree_idx = np.unique(pairs, axis=1) if pairs.size else pairs
+    out["Number_of_Trees"] = np.bincount(street_idx, minlength=n).astype(np.int32)
+    out["Mean_Tree_Height"] = group_mean(street_idx, payload["tree_height"][tree_idx], n)
+    out["Mean_Tree_Circumfere"] = group_mean(street_idx, payload["tree_circumference"][tree_idx], n)
+    out["Total_Canopy_Area_m2"] = np.bincount(street_idx, weights=canopy.canopy_area(payload["tree_radius"][tree_idx]), minlength=n)
+    return out
+
+
+# === Driver
+def district_payloads(roads, buildings, trees, side_width, canopy_radius, per_tree_canopy, district_column):
+    # Each district only ships the buildings / trees within reach of its streets
+    building_geoms = buildings.geometry.to_numpy()
+    tree_geoms = trees.geometry.to_numpy()
+    building_index, tree_index = STRtree(building_geoms), STRtree(tree_geoms)
+    heights = building_heights(buildings)
+    tree_height = tree_column(trees, "height")
+    tree_circumference = tree_column(trees, "circumfere")
+    if per_tree_canopy:
+        tree_radius = canopy.radii_from_frame(trees, default=canopy_radius)
+    else:
+        tree_radius = np.full(len(trees), canopy_radius)
+
+    for district, group in roads.groupby(roads[district_column].astype(str)):
+        minx, miny, maxx, maxy = group.total_bounds
+        reach = shapely.box(minx - side_width, miny - side_width, maxx + side_width, maxy + side_width)
+        b = building_index.query(reach)
+        t = tree_index.query(reach)
+        yield district, {
+            "c_tram": group["C_Tram"].to_numpy(),
+            "lines": shapely.to_wkb(group.geometry.to_numpy()),
+            "buildings": shapely.to_wkb(building_geoms[b]),
+            "heights": heights[b],
+            "trees": shapely.to_wkb(tree_geoms[t]),
+            "tree_height": tree_height[t],
+            "tree_circumference": tree_circumference[t],
+            "tree_radius": tree_radius[t],
+            "side_width": side_width,
+        }
+
+
+def extract_features(roads, buildings, trees, side_width=SIDE_WIDTH, canopy_radius=CANOPY_RADIUS,
+                     per_tree_canopy=False, district_column=DISTRICT_COLUMN, workers=None):
+    payloads = district_payloads(roads, buildings, trees, side_width, canopy_radius, per_tree_canopy, district_column)
+    frames = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {district: pool.submit(extract_district, payload) for district, payload in payloads}
+        for district, future in futures.items():
+            frames.append(future.result())
+            print(f"  District {district}: {len(frames[-1])} streets")
+    df = pd.concat(frames, ignore_index=True)
+    df["BuildingHeight_Left"] = df["BuildingHeight_Left"].round(1)
+    df["BuildingHeight_Right"] = df["BuildingHeight_Right"].round(1)
+    for col in ("Street_Buffer", "Mean_Tree_Height", "Mean_Tree_Circumfere", "Total_Canopy_Area_m2"):
+        df[col] = df[col].round(2)
+    return df[["C_Tram"] + GEOMETRY_COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-street building height, width and tree features from GIS layers")
+    parser.add_argument("--roads", default=ROADS_PATH)
+    parser.add_argument("--buildings", default=BUILDINGS_PATH)
+    parser.add_argument("--trees", default=TREES_PATH)
+    parser.add_argument("--out", default="street_geometry.parquet")
+    parser.add_argument("--side-width", type=float, default=SIDE_WIDTH)
+    parser.add_argument("--canopy-radius", type=float, default=CANOPY_RADIUS)
+    parser.add_argument("--per-tree-canopy", action="store_true", help="Canopy area from each tree's circumference / species")
+    parser.add_argument("--district-column", default=DISTRICT_COLUMN)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    roads = read_layer(args.roads)
+    buildings = read_layer(args.buildings)
+    trees = read_layer(args.trees)
+    print(f"▶️ {len(roads)} streets, {len(buildings)} buildings, {len(trees)} trees")
+
+    df = extract_features(roads, buildings, trees, args.side_width, args.canopy_radius,
+                          args.per_tree_canopy, args.district_column, args.workers)
+    df.to_parquet(args.out, index=False)
+    print(f"✅ Geometry features for {len(df)} streets saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+
+# ----------------------------------------------------------------------------------
+# 🛣️ Street-level Tmrt predictor (XGBoost model from 05_regression_Tmrt)
+# ----------------------------------------------------------------------------------
+# The derived features are computed here and nowhere else, and the saved bundle
+# carries the feature list with the model, so training and city-wide scoring
+# always build the same columns in the same order.
+# Usage:
+#   python street_predictor.py --model xgboost_tmrt_model_test.joblib \
+#       --streets BCN_GrafVial_With_Orientation.csv --out BCN_GrafVial_Predicted_new.csv
+
+TARGET = "Tmrt_Buildings_Mean"
+PREDICTION = "Predicted_Tmrt_Buildings_Mean"
+
+BASE_COLUMNS = [
+    "BuildingHeight_Mean",
+    "BuildingHeight_Right",
+    "BuildingHeight_Left",
+    "Street_Buffer",
+    "Number_of_Trees",
+    "Mean_Tree_Height",
+    "Total_Canopy_Area_m2",
+    "ANGLE_sin",
+    "ANGLE_cos",
+    "ANGLE_rad",
+]
+
+FEATURE_COLUMNS = [
+    "BuildingHeight_Mean",
+    "Street_Buffer",
+    "Number_of_Trees",
+    "Mean_Tree_Height",
+    "Total_Canopy_Area_m2",
+    "ANGLE_sin",
+    "ANGLE_cos",
+    "ANGLE_rad",
+    "Aspect_Ratio",
+    "Height_Diff",
+    "Tree_Density",
+    "Relative_Canopy",
+    "Tree_Height_Ratio",
+]
+
+CHUNK_SIZE = 65536
+
+
+def add_derived_features(df):
+    # Same formulas as the feature-engineering cell of 05_regression_Tmrt; returns a
+    # new frame, the caller's df is left untouched
+    df = df.copy()
+    num = {c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64) for c in BASE_COLUMNS if c in df}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["Aspect_Ratio"] = num["BuildingHeight_Mean"] / num["Street_Buffer"]
+        df["Height_Diff"] = np.abs(num["BuildingHeight_Right"] - num["BuildingHeight_Left"])
+        df["Tree_Density"] = num["Number_of_Trees"] / num["Street_Buffer"]
+        df["Relative_Canopy"] = num["Total_Canopy_Area_m2"] / num["Street_Buffer"]
+        df["Tree_Height_Ratio"] = num["Mean_Tree_Height"] / (num["BuildingHeight_Mean"] + 1e-6)
+    return df
+
+
+def feature_matrix(df, feature_columns=FEATURE_COLUMNS):
+    return np.column_stack([
+        pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float32) for c in feature_columns
+    ])
+
+
+class StreetTmrtPredictor:
+    def __init__(self, model, feature_columns=FEATURE_COLUMNS):
+        self.model = model
+        self.feature_columns = list(feature_columns)
+
+    @classmethod
+    def load(cls, path):
+        obj = joblib.load(path)
+        # Bundles carry their feature list; bare models from older notebook runs use the default one
+        if isinstance(obj, dict):
+            return cls(obj["model"], obj.get("feature_columns", FEATURE_COLUMNS))
+        return cls(obj)
+
+    def save(self, path):
+        joblib.dump({"model": self.model, "feature_columns": self.feature_columns}, path)
+
+    def predict(self, df, chunk_size=CHUNK_SIZE):
+        # Rows with any missing feature get NaN, as in the notebook's dropna mask
+        X = feature_matrix(add_derived_features(df), self.feature_columns)
+        valid = ~np.isnan(X).any(axis=1)
+        pred = np.full(len(X), np.nan, dtype=np.float32)
+        idx = np.flatnonzero(valid)
+        for start in range(0, len(idx), chunk_size):
+            rows = idx[start:start + chunk_size]
+            pred[rows] = self.model.predict(X[rows])
+        return pred
+
+
+def read_streets(path):
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path)
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def score_streets(model_path, streets_path, out_path=None, chunk_size=CHUNK_SIZE, predictor=None):
+    predictor = predictor or StreetTmrtPredictor.load(model_path)
+    df = read_streets(streets_path)
+    df[PREDICTION] = predictor.predict(df, chunk_size)
+    if out_path:
+        if out_path.lower().endswith(".parquet"):
+            df.to_parquet(out_path, index=False)
+        else:
+            df.to_csv(out_path, index=False, encoding="utf-8-sig")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every street segment with the XGBoost Tmrt model")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--streets", required=True, help="CSV or Parquet with the street features")
+    parser.add_argument("--out", required=True, help="CSV or Parquet output")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    result = score_streets(args.model, args.streets, args.out, args.chunk_size)
+    scored = int(result[PREDICTION].notna().sum())
+    print(f"✅ Predictions for {scored}/{len(result)} streets saved to: {os.path.abspath(args.out)}")
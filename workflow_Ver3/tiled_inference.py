@@ -0,0 +1,246 @@
+import math
+import numpy as np
+
+# ----------------------------------------------------------------------------------
+# 🧩 Sliding-window inference for extents larger than the 128×128 training patches
+# ----------------------------------------------------------------------------------
+# The CNN (SVF) and GAT (Tmrt) were trained on 128×128 px patches, so any extent is
+# split into overlapping 128×128 windows, each window is predicted as part of a
+# batch and the seams are blended with feathered (linearly ramped) weights.
+
+TILE_SIZE = 128
+TILE_OVERLAP = 32
+MAX_TILES = 256
+MEMORY_LIMIT_MB = 2048
+CONTEXT_PATCH = 8
+
+# Rough peak working set per pixel of a tile: CNN activations plus the GAT
+# messages (3 incoming edges incl. self loop × 4 heads × 32 channels, float32)
+BYTES_PER_PIXEL = 2600
+
+
+# === Grid layout
+def grid_shape(bounds, pixel_size, tile_size=TILE_SIZE):
+    minx, miny, maxx, maxy = bounds
+    cols = int(math.ceil((maxx - minx) / pixel_size - 1e-6))
+    rows = int(math.ceil((maxy - miny) / pixel_size - 1e-6))
+    # Small extents keep the original behaviour of a full 128×128 grid
+    return max(rows, tile_size), max(cols, tile_size)
+
+
+def tile_origins(length, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def plan_tiles(rows, cols, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=MAX_TILES):
+    if not 0 <= overlap < tile_size:
+        raise ValueError(f"Tile overlap must be in [0, {tile_size}), got {overlap}")
+    origins = [
+        (r, c)
+        for r in tile_origins(rows, tile_size, overlap)
+        for c in tile_origins(cols, tile_size, overlap)
+    ]
+    if max_tiles and len(origins) > max_tiles:
+        raise ValueError(
+            f"Extent of {rows}×{cols} px needs {len(origins)} tiles (limit {max_tiles}); "
+            f"increase the pixel size or the tile limit"
+        )
+    return origins
+
+
+def tiles_per_batch(tile_size=TILE_SIZE, memory_limit_mb=MEMORY_LIMIT_MB):
+    per_tile = tile_size * tile_size * BYTES_PER_PIXEL
+    return max(1, int(memory_limit_mb * 1024 * 1024 // per_tile))
+
+
+def feather_weights(tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    # Linear ramp over the overlap band; never zero so tiles at the extent border
+    # (covered by a single window) still normalise cleanly
+    i = np.arange(tile_size, dtype=np.float32)
+    ramp = np.minimum(i + 1, tile_size - i) / (overlap + 1)
+    ramp = np.clip(ramp, 0, 1)
+    return np.outer(ramp, ramp).astype(np.float32)
+
+
+# === Features shared by every tile
+def compute_contextual_features(dsm, buildings, patch_size=CONTEXT_PATCH):
+    h, w = dsm.shape
+    row_starts = np.arange(0, h, patch_size)
+    col_starts = np.arange(0, w, patch_size)
+    row_sizes = np.diff(np.append(row_starts, h))
+    col_sizes = np.diff(np.append(col_starts, w))
+    area = np.outer(row_sizes, col_sizes).astype(np.float32)
+
+    def block_sum(a):
+        return np.add.reduceat(np.add.reduceat(a, row_starts, axis=0), col_starts, axis=1)
+
+    density = block_sum((buildings > 0).astype(np.float32)) / area
+    mean_h = block_sum(dsm.astype(np.float32)) / area
+
+    def expand(blocks):
+        return np.repeat(np.repeat(blocks, row_sizes, axis=0), col_sizes, axis=1).astype(np.float32)
+
+    return expand(density), expand(mean_h)
+
+
+def grid_edge_index(h, w):
+    # Same ordering as the original loop: for each node (row-major) → right, then down
+    idx = np.arange(h * w).reshape(h, w)
+    src = np.stack([idx, idx], axis=-1)
+    dst = np.stack([idx + 1, idx + w], axis=-1)
+    valid = np.stack([
+        np.broadcast_to(np.arange(w) < w - 1, (h, w)),
+        np.broadcast_to((np.arange(h) < h - 1)[:, None], (h, w)),
+    ], axis=-1)
+    return np.stack([src[valid], dst[valid]])
+
+
+def batch_edge_index(edge_index, num_nodes, num_graphs):
+    offsets = np.arange(num_graphs) * num_nodes
+    return np.concatenate([edge_index + o for o in offsets], axis=1)
+
+
+def coordinate_features(h, w):
+    xx, yy = np.meshgrid(np.arange(w), np.arange(h))
+    return (xx / w).astype(np.float32), (yy / h).astype(np.float32)
+
+
+def normalise_heights(dsm, cdsm):
+    # Same scaling as app.full_pipeline: each raster divided by its own maximum
+    dsm = np.nan_to_num(dsm).astype(np.float32)
+    cdsm = np.nan_to_num(cdsm).astype(np.float32)
+    dsm /= np.max(dsm) if np.max(dsm) > 0 else 1
+    cdsm /= np.max(cdsm) if np.max(cdsm) > 0 else 1
+    return dsm, cdsm
+
+
+def single_tile_features(dsm, cdsm, svf, buildings):
+    # Per-pixel GAT input (t*t, 8) for one normalised tile
+    h, w = dsm.shape
+    x_coord, y_coord = coordinate_features(h, w)
+    density_map, mean_height_map = compute_contextual_features(dsm, buildings)
+    svf = np.clip(np.nan_to_num(svf), 0, 1)
+    return np.stack([
+        dsm, cdsm, svf, x_coord, y_coord, buildings, density_map, mean_height_map
+    ], axis=-1).reshape(-1, 8)
+
+
+# === Window batches
+def svf_window_batch(dsm, cdsm, chunk, tile_size=TILE_SIZE):
+    return np.stack([
+        np.stack([dsm[r:r + tile_size, c:c + tile_size], cdsm[r:r + tile_size, c:c + tile_size]], axis=-1)
+        for r, c in chunk
+    ])
+
+
+def tmrt_window_batch(dsm, cdsm, svf, buildings, density_map, mean_height_map, chunk, tile_size=TILE_SIZE):
+    # svf must already be clipped to [0, 1]; x/y coordinates are local to each window
+    x_coord, y_coord = coordinate_features(tile_size, tile_size)
+    return np.stack([
+        np.stack([
+            dsm[r:r + tile_size, c:c + tile_size],
+            cdsm[r:r + tile_size, c:c + tile_size],
+            svf[r:r + tile_size, c:c + tile_size],
+            x_coord, y_coord,
+            buildings[r:r + tile_size, c:c + tile_size],
+            density_map[r:r + tile_size, c:c + tile_size],
+            mean_height_map[r:r + tile_size, c:c + tile_size],
+        ], axis=-1).reshape(-1, 8)
+        for r, c in chunk
+    ])
+
+
+def tiles_touching(mask, origins, tile_size=TILE_SIZE):
+    # Indices of the windows containing at least one True pixel of mask
+    return [
+        i for i, (r, c) in enumerate(origins)
+        if mask[r:r + tile_size, c:c + tile_size].any()
+    ]
+
+
+# === Blending
+def _blend(origins, shape, tile_size, overlap, batch_size, predict_batch):
+    acc = np.zeros(shape, dtype=np.float32)
+    weight_sum = np.zeros(shape, dtype=np.float32)
+    weights = feather_weights(tile_size, overlap)
+    for start in range(0, len(origins), batch_size):
+        chunk = origins[start:start + batch_size]
+        preds = predict_batch(chunk)
+        for (r, c), pred in zip(chunk, preds):
+            acc[r:r + tile_size, c:c + tile_size] += weights * pred
+            weight_sum[r:r + tile_size, c:c + tile_size] += weights
+    return acc / np.maximum(weight_sum, 1e-6)
+
+
+def predict_tiled(dsm, cdsm, buildings, predict_svf, predict_tmrt,
+                  tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                  max_tiles=MAX_TILES, memory_limit_mb=MEMORY_LIMIT_MB):
+    # dsm / cdsm are expected normalised to [0, 1]; buildings is a 0/1 mask.
+    # predict_svf:  (N, t, t, 2) → (N, t, t)
+    # predict_tmrt: (N, t*t, 8)  → (N, t*t)
+    rows, cols = dsm.shape
+    origins = plan_tiles(rows, cols, tile_size, overlap, max_tiles)
+    batch_size = tiles_per_batch(tile_size, memory_limit_mb)
+
+    # 1️⃣ SVF over all windows
+    svf_pred = _blend(origins, (rows, cols), tile_size, overlap, batch_size,
+                      lambda chunk: predict_svf(svf_window_batch(dsm, cdsm, chunk, tile_size)))
+
+    # 2️⃣ Contextual features are computed once for the whole extent and sliced per
+    # window, so overlapping regions are never recomputed
+    svf = np.clip(np.nan_to_num(svf_pred), 0, 1)
+    density_map, mean_height_map = compute_contextual_features(dsm, buildings)
+
+    def tmrt_batch(chunk):
+        x = tmrt_window_batch(dsm, cdsm, svf, buildings, density_map, mean_height_map, chunk, tile_size)
+        return predict_tmrt(x).reshape(len(chunk), tile_size, tile_size)
+
+    tmrt_pred = _blend(origins, (rows, cols), tile_size, overlap, batch_size, tmrt_batch)
+    return svf_pred, tmrt_pred
+
+
+def predict_tiled_stack(dsm, cdsm, buildings, predict_svf, predict_tmrt,
+                        tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                        max_tiles=MAX_TILES, memory_limit_mb=MEMORY_LIMIT_MB):
+    # Same as predict_tiled for a stack of rasters (P, rows, cols) on one grid, e.g.
+    # design variants: windows of all rasters share the model batches.
+    # buildings is (P, rows, cols) or one (rows, cols) mask for all.
+    n, rows, cols = dsm.shape
+    buildings = np.broadcast_to(buildings, dsm.shape)
+    origins = plan_tiles(rows, cols, tile_size, overlap, max_tiles)
+    windows = [(i, r, c) for i in range(n) for r, c in origins]
+    batch_size = tiles_per_batch(tile_size, memory_limit_mb)
+    weights = feather_weights(tile_size, overlap)
+
+    def blend(predict_batch):
+        acc = np.zeros(dsm.shape, dtype=np.float32)
+        weight_sum = np.zeros((rows, cols), dtype=np.float32)
+        for r, c in origins:
+            weight_sum[r:r + tile_size, c:c + tile_size] += weights
+        for start in range(0, len(windows), batch_size):
+            chunk = windows[start:start + batch_size]
+            for (i, r, c), pred in zip(chunk, predict_batch(chunk)):
+                acc[i, r:r + tile_size, c:c + tile_size] += weights * pred
+        return acc / np.maximum(weight_sum, 1e-6)
+
+    svf_pred = blend(lambda chunk: predict_svf(np.concatenate([
+        svf_window_batch(dsm[i], cdsm[i], [(r, c)], tile_size) for i, r, c in chunk
+    ])))
+
+    svf = np.clip(np.nan_to_num(svf_pred), 0, 1)
+    context = [compute_contextual_features(dsm[i], buildings[i]) for i in range(n)]
+
+    def tmrt_batch(chunk):
+        x = np.concatenate([
+            tmrt_window_batch(dsm[i], cdsm[i], svf[i], buildings[i], *context[i], [(r, c)], tile_size)
+            for i, r, c in chunk
+        ])
+        return predict_tmrt(x).reshape(len(chunk), tile_size, tile_size)
+
+    tmrt_pred = blend(tmrt_batch)
+    return svf_pred, tmrt_pred
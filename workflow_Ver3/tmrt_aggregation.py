@@ -0,0 +1,211 @@
+import os
+import re
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# ----------------------------------------------------------------------------------
+# 🌡️ Streaming aggregation of hourly Tmrt → one multi-band summary raster
+# ----------------------------------------------------------------------------------
+# SOLWEIG writes one Tmrt_<year>_<doy>_<hhmm><D|N>.tif per timestep into every patch
+# folder, but later stages only read Tmrt_average.tif. The accumulator takes the
+# hourly rasters one at a time (from those files or straight from a solver) and
+# keeps only per-pixel running arrays:
+#   count / sum / min / max, hours above each threshold, and a fixed-bin histogram
+#   (HIST_STEP °C) from which the percentiles are read (error ≤ half a bin)
+# Output: Tmrt_summary.tif, bands in SUMMARY order (described in the band tags), and
+# Tmrt_average.tif when the solver did not write it. The hourly files can then be
+# deleted (only after the summary was written).
+# Usage:
+#   python tmrt_aggregation.py --base-dir C:/Users/Ardo/Desktop/thesis2/patches_combined --delete-hourly
+#   acc = TmrtAccumulator(shape); for tmrt in solver: acc.add(tmrt); write_summary(path, acc, profile)
+
+SUMMARY_NAME = "Tmrt_summary.tif"
+AVERAGE_NAME = "Tmrt_average.tif"
+HOURLY_RE = re.compile(r"^Tmrt_(\d{4})_(\d{1,3})_(\d{4})([DN])\.tif$")
+THRESHOLDS = (55.0,)  # °C, as the SOLWEIG Analyzer threshold of the UMEP scripts
+PERCENTILES = (50, 90, 95)
+HIST_MIN = -20.0  # °C
+HIST_MAX = 90.0
+HIST_STEP = 0.5
+STEP_HOURS = 1.0  # hours per timestep of the met file
+
+
+# === Hourly files
+def hourly_files(folder):
+    # Sorted by (year, day of year, hhmm); Tmrt_average.tif and others are not matched
+    found = []
+    for name in os.listdir(folder):
+        m = HOURLY_RE.match(name)
+        if m:
+            found.append(((int(m.group(1)), int(m.group(2)), int(m.group(3))), os.path.join(folder, name)))
+    return [path for _, path in sorted(found)]
+
+
+def iter_rasters(paths):
+    import rasterio
+
+    for path in paths:
+        with rasterio.open(path) as src:
+            band = src.read(1, masked=True)
+            yield np.ma.filled(band.astype(np.float32), np.nan), src.profile
+
+
+# === Accumulator
+class TmrtAccumulator:
+    """Running per-pixel statistics over a stream of Tmrt rasters of one shape."""
+
+    def __init__(self, shape, thresholds=THRESHOLDS, percentiles=PERCENTILES,
+                 hist_min=HIST_MIN, hist_max=HIST_MAX, hist_step=HIST_STEP, step_hours=STEP_HOURS):
+        self.shape = tuple(shape)
+        self.thresholds = tuple(float(t) for t in thresholds)
+        self.percentiles = tuple(percentiles)
+        self.hist_min, self.hist_step = hist_min, hist_step
+        self.n_bins = int(np.ceil((hist_max - hist_min) / hist_step))
+        self.step_hours = step_hours
+
+        self.count = np.zeros(self.shape, dtype=np.uint16)
+        self.sum = np.zeros(self.shape, dtype=np.float64)
+        self.min = np.full(self.shape, np.inf, dtype=np.float32)
+        self.max = np.full(self.shape, -np.inf, dtype=np.float32)
+        self.above = np.zeros((len(self.thresholds),) + self.shape, dtype=np.uint16)
+        self.hist = np.zeros((self.n_bins,) + self.shape, dtype=np.uint16) if self.percentiles else None
+        self.steps = 0
+        self._flat = np.arange(int(np.prod(self.shape)))
+
+    def add(self, tmrt):
+        tmrt = np.asarray(tmrt, dtype=np.float32)
+        if tmrt.shape != self.shape:
+            raise ValueError(f"Tmrt raster of shape {tmrt.shape} does not match {self.shape}")
+        valid = np.isfinite(tmrt)
+        values = np.where(valid, tmrt, 0)
+        self.count += valid
+        self.sum += values
+        np.minimum(self.min, np.where(valid, tmrt, np.inf), out=self.min)
+        np.maximum(self.max, np.where(valid, tmrt, -np.inf), out=self.max)
+        for k, t in enumerate(self.thresholds):
+            self.above[k] += valid & (tmrt > t)
+        if self.hist is not None:
+            bins = np.clip(((values - self.hist_min) / self.hist_step).astype(np.int64), 0, self.n_bins - 1)
+            flat = self.hist.reshape(self.n_bins, -1)
+            keep = valid.ravel()
+            flat[bins.ravel()[keep], self._flat[keep]] += 1
+        self.steps += 1
+
+    def percentile(self, q):
+        # Linear interpolation inside the bin holding the q-th value
+        counts = self.hist.reshape(self.n_bins, -1).astype(np.float32)
+        cum = np.cumsum(counts, axis=0)
+        total = cum[-1]
+        target = q / 100.0 * total
+        idx = np.minimum((cum < target[None]).sum(axis=0), self.n_bins - 1)
+        cols = self._flat
+        below = np.where(idx > 0, cum[np.maximum(idx - 1, 0), cols], 0)
+        in_bin = np.maximum(counts[idx, cols], 1)
+        frac = np.clip((target - below) / in_bin, 0, 1)
+        out = self.hist_min + (idx + frac) * self.hist_step
+        out = np.clip(out, self.min.ravel(), self.max.ravel())
+        out[total == 0] = np.nan
+        return out.reshape(self.shape).astype(np.float32)
+
+    def bands(self):
+        # (name, array) in output band order
+        has = self.count > 0
+        mean = np.where(has, self.sum / np.maximum(self.count, 1), np.nan).astype(np.float32)
+        out = [
+            ("mean", mean),
+            ("min", np.where(has, self.min, np.nan).astype(np.float32)),
+            ("max", np.where(has, self.max, np.nan).astype(np.float32)),
+        ]
+        out += [(f"p{q:g}", self.percentile(q)) for q in self.percentiles] if self.hist is not None else []
+        out += [(f"hours_above_{t:g}", (self.above[k] * self.step_hours).astype(np.float32))
+                for k, t in enumerate(self.thresholds)]
+        return out
+
+
+# === Output
+def write_summary(path, acc, profile):
+    import rasterio
+
+    bands = acc.bands()
+    profile = {**profile, "driver": "GTiff", "count": len(bands), "dtype": "float32", "nodata": np.nan}
+    tmp = str(path) + ".tmp"
+    with rasterio.open(tmp, "w", **profile) as dst:
+        for i, (name, array) in enumerate(bands, start=1):
+            dst.write(array, i)
+            dst.set_band_description(i, name)
+        dst.update_tags(timesteps=acc.steps, step_hours=acc.step_hours)
+    os.replace(tmp, path)
+    return [name for name, _ in bands]
+
+
+def write_average(path, acc, profile):
+    import rasterio
+
+    mean = acc.bands()[0][1]
+    profile = {**profile, "driver": "GTiff", "count": 1, "dtype": "float32"}
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(mean, 1)
+
+
+def summarize_stream(stream, out_path, average_path=None, **kwargs):
+    # stream yields (tmrt, profile); the profile of the first raster is used for the output
+    acc, profile = None, None
+    for tmrt, prof in stream:
+        if acc is None:
+            acc, profile = TmrtAccumulator(tmrt.shape, **kwargs), prof
+        acc.add(tmrt)
+    if acc is None:
+        return None
+    write_summary(out_path, acc, profile)
+    if average_path and not os.path.exists(average_path):
+        write_average(average_path, acc, profile)
+    return acc
+
+
+def summarize_folder(folder, delete_hourly=False, **kwargs):
+    folder = Path(folder)
+    paths = hourly_files(folder)
+    if not paths:
+        return 0
+    acc = summarize_stream(iter_rasters(paths), folder / SUMMARY_NAME, folder / AVERAGE_NAME, **kwargs)
+    if delete_hourly and acc is not None and acc.steps == len(paths):
+        for path in paths:
+            os.remove(path)
+    return len(paths)
+
+
+def _summarize(args):
+    folder, delete_hourly, kwargs = args
+    try:
+        return str(folder), summarize_folder(folder, delete_hourly, **kwargs), None
+    except Exception as e:
+        return str(folder), 0, str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate hourly SOLWEIG Tmrt rasters into Tmrt_summary.tif")
+    parser.add_argument("--base-dir", default=r"C:/Users/Ardo/Desktop/thesis2/patches_combined")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=list(THRESHOLDS))
+    parser.add_argument("--percentiles", nargs="*", type=float, default=list(PERCENTILES))
+    parser.add_argument("--step-hours", type=float, default=STEP_HOURS)
+    parser.add_argument("--delete-hourly", action="store_true", help="Remove the hourly files once summarized")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    folders = sorted(p for p in Path(args.base_dir).iterdir() if p.is_dir())
+    kwargs = {"thresholds": args.thresholds, "percentiles": args.percentiles, "step_hours": args.step_hours}
+    print(f"▶️ {len(folders)} folders in {args.base_dir}")
+    done = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for folder, n, error in pool.map(_summarize, [(f, args.delete_hourly, kwargs) for f in folders], chunksize=8):
+            if error:
+                print(f"❌ {os.path.basename(folder)}: {error}")
+            elif n:
+                done += 1
+    print(f"✅ {SUMMARY_NAME} written for {done} folders" + (" (hourly files removed)" if args.delete_hourly else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import torch
+import torch.nn.functional as F
+from torch.nn import Linear
+from torch_geometric.nn import GATConv
+
+
+# === GNN model (Tmrt) ===
+class TmrtGAT(torch.nn.Module):
+    def __init__(self, in_channels=8, hidden_channels=32):
+        super().__init__()
+        self.gat1 = GATConv(in_channels, hidden_channels, heads=4, concat=True)
+        self.gat2 = GATConv(hidden_channels * 4, hidden_channels, heads=4, concat=False)
+        self.lin = Linear(hidden_channels, 1)
+
+    def forward(self, x, edge_index):
+        x = self.gat1(x, edge_index)
+        x = F.relu(x)
+        x = F.dropout(x, p=0.2, training=self.training)
+        x = self.gat2(x, edge_index)
+        x = F.relu(x)
+        x = self.lin(x)
+        return x.view(-1)
+
+
+def load_tmrt_gat(path="gnn_tmrt_model.pth"):
+    model = TmrtGAT(in_channels=8, hidden_channels=32)
+    model.load_state_dict(torch.load(path, map_location="cpu"))
+    model.eval()
+    return model
@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import tiled_inference
+import solweig_analyzer
+
+# ----------------------------------------------------------------------------------
+# ✅ Surrogate vs UMEP: replay the app's inference over every simulated patch
+# ----------------------------------------------------------------------------------
+# Each patch of patches_combined is fed to the CNN (SVF) + GAT (Tmrt) exactly as
+# app.py does it (normalised dsm / cdsm, UMEP building mask 1 = ground) and compared
+# pixel-wise with svf.tif and Tmrt_average.tif on ground pixels:
+#   - per patch: MAE / RMSE / bias for SVF and Tmrt, building and canopy cover
+#   - error maps (prediction − UMEP, SVF + Tmrt bands) per patch with --maps
+#   - per stratum: street strata of patch_sampler.py when --features is given
+#     (patch folders are named patch_<nnnn>_<C_Tram>), cover classes otherwise
+#   - throughput: wall-clock patches/s and read / inference ms per patch
+# Patches are split over worker processes, each loading the backend once and
+# predicting BATCH patches per model call. Several backends (name or name:int8)
+# run one after another, giving the accuracy–latency table to pick a variant from.
+# Usage:
+#   python validate_surrogate.py --base-dir C:/Users/Ardo/Desktop/thesis2/patches_combined --backends native dense dense:int8
+#   python validate_surrogate.py --base-dir ... --backends dense --features BCN_dataset_complete.parquet --maps
+
+BATCH = 16  # patches per model call
+INPUTS = ("dsm.tif", "cdsm.tif")
+TARGETS = {"svf": "svf.tif", "tmrt": "Tmrt_average.tif"}
+MAP_NAME = "surrogate_error_{backend}.tif"
+COVER_BINS = {"building_frac": [0.0, 0.2, 0.4, 0.6, 1.01], "canopy_frac": [0.0, 1e-9, 0.1, 0.25, 1.01]}
+
+worker_backend = None
+
+
+# === Patches
+def patch_folders(base_dir, limit=None):
+    folders = [p for p in sorted(Path(base_dir).iterdir())
+               if p.is_dir() and all((p / f).exists() for f in INPUTS)
+               and any((p / f).exists() for f in TARGETS.values())]
+    return folders[:limit] if limit else folders
+
+
+def c_tram(folder):
+    # patch_<nnnn>_<C_Tram> (01_get_urban_notebook)
+    parts = Path(folder).name.split("_", 2)
+    return parts[2] if len(parts) == 3 and parts[0] == "patch" else Path(folder).name
+
+
+def read_patch(folder):
+    folder = Path(folder)
+    dsm, profile = solweig_analyzer.read_band(folder / "dsm.tif")
+    cdsm, _ = solweig_analyzer.read_band(folder / "cdsm.tif")
+    ground = solweig_analyzer.ground_mask(folder, dsm.shape)
+    targets = {}
+    for key, name in TARGETS.items():
+        if (folder / name).exists():
+            targets[key], _ = solweig_analyzer.read_band(folder / name)
+    return {"folder": folder, "dsm": dsm, "cdsm": cdsm, "ground": ground, "targets": targets, "profile": profile}
+
+
+# === Inference (worker side)
+def init_worker(spec, model_dir, threads):
+    global worker_backend
+    if threads:
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+            os.environ[var] = str(threads)
+    import inference_backends
+
+    name, _, quantize = spec.partition(":")
+    worker_backend = inference_backends.load_backend(name, model_dir=model_dir, quantize=quantize or None)
+
+
+def predict_patches(backend, patches):
+    # Training-size patches share one model call; other shapes go through the tiled path
+    size = tiled_inference.TILE_SIZE
+    out = [None] * len(patches)
+    same = [i for i, p in enumerate(patches) if p["dsm"].shape == (size, size)]
+    if same:
+        dsm, cdsm = zip(*(tiled_inference.normalise_heights(patches[i]["dsm"], patches[i]["cdsm"]) for i in same))
+        dsm, cdsm = np.stack(dsm), np.stack(cdsm)
+        buildings = np.stack([patches[i]["ground"] for i in same]).astype(np.float32)
+        svf = backend.predict_svf(np.stack([dsm, cdsm], axis=-1))
+        x = np.stack([tiled_inference.single_tile_features(dsm[k], cdsm[k], svf[k], buildings[k]) for k in range(len(same))])
+        tmrt = backend.predict_tmrt(x).reshape(svf.shape)
+        for k, i in enumerate(same):
+            out[i] = (svf[k], tmrt[k])
+    for i, p in enumerate(patches):
+        if out[i] is None:
+            dsm, cdsm = tiled_inference.normalise_heights(p["dsm"], p["cdsm"])
+            out[i] = tiled_inference.predict_tiled(dsm, cdsm, p["ground"].astype(np.float32),
+                                                   backend.predict_svf, backend.predict_tmrt, max_tiles=0)
+    return out
+
+
+def error_stats(pred, true, mask, prefix):
+    valid = mask & np.isfinite(true) & np.isfinite(pred)
+    if not valid.any():
+        return {}
+    err = (pred - true)[valid].astype(np.float64)
+    return {f"{prefix}_n_px": int(valid.sum()), f"{prefix}_mae": float(np.abs(err).mean()),
+            f"{prefix}_rmse": float(np.sqrt((err ** 2).mean())), f"{prefix}_bias": float(err.mean()),
+            f"{prefix}_abs_sum": float(np.abs(err).sum()), f"{prefix}_sq_sum": float((err ** 2).sum()),
+            f"{prefix}_sum": float(err.sum())}
+
+
+def write_map(path, profile, svf_err, tmrt_err):
+    import rasterio
+
+    profile = {**profile, "driver": "GTiff", "count": 2, "dtype": "float32", "nodata": np.nan}
+    with rasterio.open(path, "w", **profile) as dst:
+        for i, (name, band) in enumerate((("svf_error", svf_err), ("tmrt_error", tmrt_err)), start=1):
+            dst.write(band.astype(np.float32), i)
+            dst.set_band_description(i, name)
+
+
+def validate_batch(args):
+    folders, spec, maps = args
+    rows, errors = [], []
+    t0 = time.perf_counter()
+    patches = []
+    for folder in folders:
+        try:
+            patches.append(read_patch(folder))
+        except Exception as e:
+            errors.append(f"{Path(folder).name}: {e}")
+    t1 = time.perf_counter()
+    preds = predict_patches(worker_backend, patches) if patches else []
+    t2 = time.perf_counter()
+
+    for p, (svf, tmrt) in zip(patches, preds):
+        ground = p["ground"]
+        row = {"patch": p["folder"].name, "C_Tram": c_tram(p["folder"]),
+               "building_frac": float(1.0 - ground.mean()),
+               "canopy_frac": float((np.nan_to_num(p["cdsm"]) > 0).mean())}
+        nan = np.full(ground.shape, np.nan, dtype=np.float32)
+        err_maps = {}
+        for key, pred in (("svf", svf), ("tmrt", tmrt)):
+            true = p["targets"].get(key)
+            if true is None or true.shape != pred.shape:
+                err_maps[key] = nan
+                continue
+            row.update(error_stats(pred, true, ground, key))
+            err_maps[key] = np.where(ground, pred - true, np.nan)
+        if maps:
+            write_map(p["folder"] / MAP_NAME.format(backend=spec.replace(":", "_")), p["profile"], err_maps["svf"], err_maps["tmrt"])
+        rows.append(row)
+    n = max(len(patches), 1)
+    return rows, errors, {"patches": len(patches), "read_s": t1 - t0, "infer_s": t2 - t1, "per_patch_infer_ms": 1000 * (t2 - t1) / n}
+
+
+def run_backend(spec, folders, model_dir, workers, threads, batch=BATCH, maps=False):
+    chunks = [(folders[i:i + batch], spec, maps) for i in range(0, len(folders), batch)]
+    rows, errors, timings = [], [], []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(spec, model_dir, threads)) as pool:
+        t_ready = None
+        for r, e, t in pool.map(validate_batch, chunks):
+            t_ready = t_ready or time.perf_counter()
+            rows += r
+            errors += e
+            timings.append(t)
+    wall = time.perf_counter() - t0
+    n = sum(t["patches"] for t in timings)
+    throughput = {
+        "backend": spec, "workers": workers, "threads_per_worker": threads, "batch": batch, "patches": n,
+        "wall_s": round(wall, 2),
+        # The first batch includes model loading in every worker
+        "first_batch_s": round((t_ready or time.perf_counter()) - t0, 2),
+        "patches_per_s": round(n / wall, 2) if wall > 0 else None,
+        "read_ms_per_patch": round(1000 * sum(t["read_s"] for t in timings) / max(n, 1), 2),
+        "infer_ms_per_patch": round(1000 * sum(t["infer_s"] for t in timings) / max(n, 1), 2),
+    }
+    return pd.DataFrame(rows), errors, throughput
+
+
+# === Accuracy summaries
+def pooled(df):
+    # Pixel-weighted MAE / RMSE / bias over a group of patches
+    out = {"patches": int(len(df))}
+    for key in TARGETS:
+        n = df.get(f"{key}_n_px")
+        if n is None or not n.sum():
+            continue
+        total = float(n.sum())
+        out[f"{key}_mae"] = round(float(df[f"{key}_abs_sum"].sum()) / total, 4)
+        out[f"{key}_rmse"] = round(float(np.sqrt(df[f"{key}_sq_sum"].sum() / total)), 4)
+        out[f"{key}_bias"] = round(float(df[f"{key}_sum"].sum()) / total, 4)
+    return out
+
+
+def cover_strata(df):
+    codes = [np.clip(np.digitize(df[c].to_numpy(), bins[1:-1]), 0, len(bins) - 2).astype(str)
+             for c, bins in COVER_BINS.items()]
+    return pd.Series(["-".join(c) for c in zip(*codes)], index=df.index, name="stratum")
+
+
+def street_strata(df, features_path):
+    from patch_sampler import assign_strata
+    from street_predictor import read_streets
+
+    streets = read_streets(features_path)
+    streets = streets[~streets["C_Tram"].astype(str).duplicated()].reset_index(drop=True)
+    streets["stratum"] = assign_strata(streets)
+    lookup = dict(zip(streets["C_Tram"].astype(str), streets["stratum"]))
+    return df["C_Tram"].astype(str).map(lookup).fillna("unmatched").rename("stratum")
+
+
+def accuracy_report(df, features_path=None):
+    if df.empty:
+        return {"overall": {"patches": 0}, "strata": {}}
+    strata = street_strata(df, features_path) if features_path else cover_strata(df)
+    return {
+        "overall": pooled(df),
+        "strata_kind": "street" if features_path else "cover (building_frac-canopy_frac bins)",
+        "strata": {s: pooled(g) for s, g in df.groupby(strata)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the SVF / Tmrt surrogate against the UMEP patches")
+    parser.add_argument("--base-dir", default=r"C:/Users/Ardo/Desktop/thesis2/patches_combined")
+    parser.add_argument("--backends", nargs="+", default=["native"], help="Backend names, optionally name:int8")
+    parser.add_argument("--model-dir", default=".")
+    parser.add_argument("--features", help="Street feature table → patch_sampler strata per C_Tram")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads", type=int, default=2, help="Math threads per worker (0 = library default)")
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--maps", action="store_true", help=f"Write {MAP_NAME} into every patch folder")
+    parser.add_argument("--out-dir", default="surrogate_validation")
+    args = parser.parse_args()
+
+    folders = patch_folders(args.base_dir, args.limit)
+    if not folders:
+        print(f"❌ No simulated patches in {args.base_dir}")
+        return 1
+    os.makedirs(args.out_dir, exist_ok=True)
+    print(f"▶️ {len(folders)} patches, {args.workers} workers × {args.threads} threads, batch {args.batch}")
+
+    tradeoff = []
+    for spec in args.backends:
+        df, errors, throughput = run_backend(spec, folders, args.model_dir, args.workers, args.threads, args.batch, args.maps)
+        for error in errors:
+            print(f"❌ {error}")
+        tag = spec.replace(":", "_")
+        solweig_analyzer.write_table(os.path.join(args.out_dir, f"patches_{tag}.parquet"), df)  # CSV without pyarrow
+        report = {"throughput": throughput, **accuracy_report(df, args.features)}
+        with open(os.path.join(args.out_dir, f"report_{tag}.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        tradeoff.append({**throughput, **{k: v for k, v in report["overall"].items() if k != "patches"}})
+        overall = report["overall"]
+        print(f"✅ {spec}: Tmrt MAE {overall.get('tmrt_mae', float('nan')):.2f} °C, "
+              f"SVF MAE {overall.get('svf_mae', float('nan')):.3f}, "
+              f"{throughput['patches_per_s']} patches/s ({throughput['infer_ms_per_patch']} ms inference/patch)")
+
+    table = pd.DataFrame(tradeoff)
+    table.to_csv(os.path.join(args.out_dir, "tradeoff.csv"), index=False)
+    print(table.to_string(index=False))
+    print(f"✅ Reports saved to: {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
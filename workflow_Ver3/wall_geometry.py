@@ -0,0 +1,133 @@
+import os
+import argparse
+from pathlib import Path
+import numpy as np
+
+# ----------------------------------------------------------------------------------
+# 🧱 Wall height and aspect from a DSM (replaces the UMEP "Wall Height and Aspect" call)
+# ----------------------------------------------------------------------------------
+# Same rules as UMEP's wallalgorithms:
+#   height: max of the 4 neighbours (N/E/S/W) − cell, heights below the wall limit
+#           set to 0, the 1 px raster border set to 0 (findwalls)
+#   aspect: compass direction the wall faces, 0 = north, clockwise, only on wall
+#           pixels; taken from the Sobel gradient of the DSM (downhill direction)
+#           instead of UMEP's rotating Goodwin filter, rounded to whole degrees
+# Everything is array slicing on (N, rows, cols) stacks (NumPy only, so it also runs
+# in the QGIS Python of run_pipeline.py), many patches of one size per call.
+# Rasters are written as float32 GeoTIFFs with the DSM's grid and CRS, as SOLWEIG
+# reads them (INPUT_HEIGHT / INPUT_ASPECT).
+# Usage:
+#   python wall_geometry.py --base-dir C:/Users/Ardo/Desktop/thesis2/patches_combined --limit 3
+
+WALL_LIMIT = 3.0  # m, UMEP INPUT_LIMIT used by the UMEP scripts
+BATCH_SIZE = 64  # DSMs per call
+
+
+# === Core (arrays)
+def as_stack(a):
+    a = np.asarray(a, dtype=np.float32)
+    return a[None] if a.ndim == 2 else a
+
+
+def wall_height(dsm, limit=WALL_LIMIT):
+    stack = as_stack(dsm)
+    p = np.pad(stack, ((0, 0), (1, 1), (1, 1)), mode="edge")
+    neighbours = np.maximum(np.maximum(p[:, :-2, 1:-1], p[:, 2:, 1:-1]), np.maximum(p[:, 1:-1, :-2], p[:, 1:-1, 2:]))
+    walls = neighbours - stack
+    walls[walls < limit] = 0
+    walls[:, 0, :] = walls[:, -1, :] = 0
+    walls[:, :, 0] = walls[:, :, -1] = 0
+    return walls[0] if np.ndim(dsm) == 2 else walls
+
+
+def sobel(p):
+    # 3×3 Sobel on an edge-padded stack → (d/dcol, d/drow) of the unpadded cells
+    smooth_rows = p[:, :-2] + 2 * p[:, 1:-1] + p[:, 2:]
+    smooth_cols = p[:, :, :-2] + 2 * p[:, :, 1:-1] + p[:, :, 2:]
+    d_col = smooth_rows[:, :, 2:] - smooth_rows[:, :, :-2]
+    d_row = smooth_cols[:, 2:] - smooth_cols[:, :-2]
+    return d_col, d_row
+
+
+def wall_aspect(dsm, walls):
+    stack = as_stack(dsm)
+    d_col, d_row = sobel(np.pad(stack, ((0, 0), (1, 1), (1, 1)), mode="edge"))
+    # Rows run south, so north = −row gradient; the wall faces downhill (away from the roof)
+    d_east, d_north = d_col, -d_row
+    aspect = np.mod(np.round(np.degrees(np.arctan2(-d_east, -d_north))), 360).astype(np.float32)
+    aspect[as_stack(walls) <= 0] = 0
+    return aspect[0] if np.ndim(dsm) == 2 else aspect
+
+
+def wall_height_aspect(dsm, limit=WALL_LIMIT):
+    walls = wall_height(dsm, limit)
+    return walls, wall_aspect(dsm, walls)
+
+
+# === Files
+def read_dsm(path):
+    import rasterio
+
+    with rasterio.open(path) as src:
+        return src.read(1).astype(np.float32), src.profile
+
+
+def write_raster(path, array, profile):
+    import rasterio
+
+    profile = {**profile, "driver": "GTiff", "count": 1, "dtype": "float32", "nodata": None}
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(array.astype(np.float32), 1)
+
+
+def write_walls(dsm_path, height_path, aspect_path, limit=WALL_LIMIT):
+    # One folder; drop-in for processing.run("umep:Urban Geometry: Wall Height and Aspect", ...)
+    dsm, profile = read_dsm(dsm_path)
+    walls, aspect = wall_height_aspect(dsm, limit)
+    write_raster(height_path, walls, profile)
+    write_raster(aspect_path, aspect, profile)
+    return walls, aspect
+
+
+def batch_write_walls(folders, limit=WALL_LIMIT, batch_size=BATCH_SIZE,
+                      dsm_name="dsm.tif", height_name="wall_height.tif", aspect_name="wall_aspect.tif"):
+    # DSMs are grouped by shape and stacked, one array call per batch
+    groups = {}
+    skipped = []
+    for folder in folders:
+        path = Path(folder) / dsm_name
+        if not path.exists():
+            skipped.append(str(folder))
+            continue
+        dsm, profile = read_dsm(path)
+        groups.setdefault(dsm.shape, []).append((Path(folder), dsm, profile))
+
+    done = 0
+    for items in groups.values():
+        for start in range(0, len(items), batch_size):
+            chunk = items[start:start + batch_size]
+            walls, aspect = wall_height_aspect(np.stack([dsm for _, dsm, _ in chunk]), limit)
+            for (folder, _, profile), h, a in zip(chunk, walls, aspect):
+                write_raster(folder / height_name, h, profile)
+                write_raster(folder / aspect_name, a, profile)
+            done += len(chunk)
+    return done, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wall height and aspect rasters for every patch folder")
+    parser.add_argument("--base-dir", default=r"C:/Users/Ardo/Desktop/thesis2/patches_combined")
+    parser.add_argument("--limit", type=float, default=WALL_LIMIT, help="Minimum wall height (m)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    folders = sorted(p for p in Path(args.base_dir).iterdir() if p.is_dir())
+    print(f"▶️ {len(folders)} folders in {args.base_dir}")
+    done, skipped = batch_write_walls(folders, args.limit, args.batch_size)
+    for folder in skipped:
+        print(f"⚠️ Skipped {os.path.basename(folder)}: dsm.tif not found")
+    print(f"✅ Wall height and aspect written for {done} folders")
+
+
+if __name__ == "__main__":
+    main()